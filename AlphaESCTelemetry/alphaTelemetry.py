@@ -1,5 +1,8 @@
 import logging
-from typing import Union
+import struct
+from typing import List, NamedTuple, Optional, Sequence, Union
+
+import numpy
 
 # Set logger name to be "AlphaTelemetry"
 logger = logging.getLogger("AlphaTelemetry")
@@ -40,10 +43,160 @@ temp_table = {
 }
 # fmt: on
 
+# Temperature of every possible code, 130 °C for the codes missing from temp_table
+TEMP_LUT = numpy.array([temp_table.get(code, 130) for code in range(256)], dtype=numpy.float64)
+TEMP_LUT_INT = TEMP_LUT.astype(numpy.int64)
+# Same tables as python values, faster to index for a single code
+_TEMP_DECODE = tuple(temp_table.get(code, 130) for code in range(256))
+_TEMP_DECODE_INT = tuple(int(temp) for temp in _TEMP_DECODE)
+
 ALPHA_ESC_B1 = 0x9B  # byte 1 - header
 ALPHA_ESC_B2 = 0x16  # byte 2 - packet size
 ALPHA_ESC_PACKET_SIZE = 24  # 22 byte packet + 2 byte checksum
 ALPHA_ESC_BAUD = 19200  # fixed baudrate
+ALPHA_ESC_INITIAL_VALUE = 18258690  # `initialValue` of a valid packet (0x9B 0x16 0x01 0x02)
+
+# Packet layout: 4 header bytes, 7 big-endian words, 2 temperature codes, the status word and the
+# checksum, stored as two bytes since it is little-endian
+PACKET_STRUCT = struct.Struct(">4B7H2BH2B")
+
+
+class TelemetryFrame(NamedTuple):
+    """Decoded telemetry packet. A batch of packets is a structured array of telemetry_dtype(), with the same fields."""
+
+    initialValue: int
+    baleNumber: int
+    rxThrottle: float
+    outputThrottle: float
+    rpm: float
+    busbarVoltage: float
+    busbarCurrent: float
+    phaseWireCurrent: float
+    mosfetTemp: Union[int, float]
+    capacitorTemp: Union[int, float]
+    statusCode: int
+    fault: bool
+
+
+# Fields decoded from a packet, in the order returned by AlphaTelemetry.decodeBuffer
+TELEMETRY_FIELDS = TelemetryFrame._fields
+
+
+def telemetry_dtype(integer_only: bool = True) -> numpy.dtype:
+    """Structured dtype of a batch of decoded packets (see AlphaTelemetry.decodeFrames)
+
+    Args:
+        integer_only (bool, optional): Temperatures are stored as integers. Defaults to True.
+
+    Returns:
+        numpy.dtype: One field per entry of TELEMETRY_FIELDS
+    """
+    temperature = numpy.int64 if integer_only else numpy.float64
+    return numpy.dtype(
+        [
+            ("initialValue", numpy.int64),
+            ("baleNumber", numpy.int64),
+            ("rxThrottle", numpy.float64),
+            ("outputThrottle", numpy.float64),
+            ("rpm", numpy.float64),
+            ("busbarVoltage", numpy.float64),
+            ("busbarCurrent", numpy.float64),
+            ("phaseWireCurrent", numpy.float64),
+            ("mosfetTemp", temperature),
+            ("capacitorTemp", temperature),
+            ("statusCode", numpy.int64),
+            ("fault", numpy.bool_),
+        ]
+    )
+
+
+def frames_to_array(frames: Sequence[TelemetryFrame], integer_only: bool = True) -> numpy.ndarray:
+    """Pack decoded packets into a batch
+
+    Args:
+        frames (list): Decoded packets
+        integer_only (bool, optional): Temperatures are stored as integers. Defaults to True.
+
+    Returns:
+        numpy.ndarray: Structured array of telemetry_dtype()
+    """
+    return numpy.array(frames, dtype=telemetry_dtype(integer_only))
+
+
+def unwrap_bale_number(baleNumber) -> numpy.ndarray:
+    """Unwrap the 16 bits packet counter of the ESC into a monotonic counter
+
+    Args:
+        baleNumber (array_like): Successive baleNumber values
+
+    Returns:
+        numpy.ndarray: Counter increased by 65536 at every wrap around
+    """
+    baleNumber = numpy.asarray(baleNumber, dtype=numpy.int64)
+    wraps = numpy.cumsum(numpy.diff(baleNumber, prepend=baleNumber[:1]) < -(1 << 15))
+    return baleNumber + (wraps << 16)
+
+
+def _follow_chain(candidates: numpy.ndarray) -> numpy.ndarray:
+    """Candidates reached by a scan starting on the first one, each one skipping the next ALPHA_ESC_PACKET_SIZE bytes"""
+    if candidates.size == 0:
+        return candidates
+
+    # Index of the next header scanned after each candidate. The extra last node is a sink.
+    jump = numpy.searchsorted(candidates, candidates + ALPHA_ESC_PACKET_SIZE)
+    jump = numpy.append(jump, candidates.size)
+
+    # The scan follows the chain 0 -> jump[0] -> ... Collect it by pointer doubling:
+    # after i iterations, `selected` holds the first 2**i nodes of the chain.
+    selected = numpy.zeros(candidates.size + 1, dtype=bool)
+    selected[0] = True
+    while jump[0] != candidates.size:
+        selected[jump[selected]] = True
+        jump = jump[jump]
+
+    return candidates[selected[:-1]]
+
+
+def find_frames(data, stop: Optional[int] = None) -> numpy.ndarray:
+    """Locate the packets of a raw capture buffer in a single pass.
+
+    Same scan as `decode_binary`: every ALPHA_ESC_B1 byte starts a packet, and the
+    scan resumes right after the ALPHA_ESC_PACKET_SIZE bytes of that packet, whether
+    the packet turns out to be valid or not.
+
+    Args:
+        data: Raw capture (bytes, bytearray, memoryview, mmap or uint8 array)
+        stop (int, optional): Only report packets starting before this offset. Defaults to the end of data.
+
+    Returns:
+        numpy.ndarray: Offsets of the complete packets, in increasing order
+    """
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    stop = buf.size if stop is None else min(stop, buf.size)
+    offsets = _follow_chain(numpy.flatnonzero(buf[:stop] == ALPHA_ESC_B1))
+    # A header too close to the end of the buffer is not a packet
+    return offsets[offsets + ALPHA_ESC_PACKET_SIZE <= buf.size]
+
+
+def find_feed_frames(data, stop: Optional[int] = None) -> numpy.ndarray:
+    """Locate the packets of the state machine of `AlphaTelemetry.feed` in a single pass.
+
+    Starting idle on the first byte of data, the state machine takes any byte as the first
+    byte of a packet (only stored when it is ALPHA_ESC_B1), then skips the bytes up to
+    ALPHA_ESC_B2, followed by the rest of the packet, and is idle again after it.
+
+    Args:
+        data: Raw capture (bytes, bytearray, memoryview, mmap or uint8 array)
+        stop (int, optional): Only report packets starting before this offset. Defaults to the end of data.
+
+    Returns:
+        numpy.ndarray: Offsets of the complete packets (the byte before their ALPHA_ESC_B2), in increasing order
+    """
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    stop = buf.size if stop is None else min(stop, buf.size)
+    # The first ALPHA_ESC_B2 is looked for after the first byte, the next ones after each packet
+    offsets = _follow_chain(numpy.flatnonzero(buf[1 : stop + 1] == ALPHA_ESC_B2))
+    return offsets[offsets + ALPHA_ESC_PACKET_SIZE <= buf.size]
 
 
 class AlphaTelemetry:
@@ -61,73 +214,68 @@ class AlphaTelemetry:
         self.POLES_N = POLES_N
         self.buf_len = 0
         self.rxbuf = bytearray(ALPHA_ESC_PACKET_SIZE)
-        self._baleNumber = 0
-        self._rxThrottle = 0
-        self._outputThrottle = 0
-        self._rpm = 0
-        self._busbarVoltage = 0
-        self._busbarCurrent = 0
-        self._phaseWireCurrent = 0
-        self._mosfetTemp = 0
-        self._capacitorTemp = 0
-        self._statusCode = 0
-        self._fault = False
+        self._frame = TelemetryFrame(0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, False)
         self._ready = False
 
+    @property
+    def frame(self) -> TelemetryFrame:
+        """Last valid packet received"""
+        return self._frame
+
     @property
     def baleNumber(self) -> int:
         """Number of telemetry packets sent by the ESC since start-up"""
-        return self._baleNumber
+        return self._frame.baleNumber
 
     @property
     def rxThrottle(self) -> Union[int, float]:
         """Percentage of throttle input"""
-        return self._rxThrottle
+        return self._frame.rxThrottle
 
     @property
     def outputThrottle(self) -> Union[int, float]:
         """Percentage of throttle output"""
-        return self._outputThrottle
+        return self._frame.outputThrottle
 
     @property
     def rpm(self) -> Union[int, float]:
         """Mechanical rotor speed"""
-        return self._rpm
+        return self._frame.rpm
 
     @property
     def busbarVoltage(self) -> Union[int, float]:
         """Input busbarVoltage of the ESC"""
-        return self._busbarVoltage
+        return self._frame.busbarVoltage
 
     @property
     def busbarCurrent(self) -> Union[int, float]:
         """Current drawn in the busbar"""
-        return self._busbarCurrent
+        return self._frame.busbarCurrent
 
     @property
     def phaseWireCurrent(self) -> Union[int, float]:
         """Current drawn in the phase"""
-        return self._phaseWireCurrent
+        return self._frame.phaseWireCurrent
 
     @property
     def mosfetTemp(self) -> int:
         """MOSFETs temperature"""
-        return self._mosfetTemp
+        return self._frame.mosfetTemp
 
     @property
     def capacitorTemp(self) -> int:
         """Capacitor temperature"""
-        return self._capacitorTemp
+        return self._frame.capacitorTemp
 
     @property
     def statusCode(self) -> int:
         """ESC status code"""
-        return self._statusCode
+        return self._frame.statusCode
 
     @property
     def fault(self) -> bool:
         """ESC fault state"""
-        return self._fault
+        return self._frame.fault
 
     @property
     def ready(self) -> bool:
@@ -149,13 +297,23 @@ class AlphaTelemetry:
         Returns:
             int: Real temperature in Celsius
         """
-        if temp_raw in temp_table.keys():
-            if integer_only:
-                return int(temp_table[temp_raw])
-            return temp_table[temp_raw]
+        if 0 <= temp_raw < 256:
+            return _TEMP_DECODE_INT[temp_raw] if integer_only else _TEMP_DECODE[temp_raw]
 
         return 130
 
+    @classmethod
+    def temperature_decode_array(cls, temp_raw, integer_only: bool = True) -> numpy.ndarray:
+        """Vectorized temperature_decode, a single lookup in TEMP_LUT
+
+        Args:
+            temp_raw (array_like): uint8 temperature codes
+
+        Returns:
+            numpy.ndarray: Real temperatures in Celsius
+        """
+        return (TEMP_LUT_INT if integer_only else TEMP_LUT)[numpy.asarray(temp_raw, dtype=numpy.uint8)]
+
     @classmethod
     def calc_checksum(cls, data: bytearray) -> int:
         """Calculate bale checksum
@@ -167,10 +325,7 @@ class AlphaTelemetry:
         Returns:
             int: Computed checksum
         """
-        checksum = 0
-        for d in data[: ALPHA_ESC_PACKET_SIZE - 2]:
-            checksum += d
-        return checksum
+        return sum(data[: ALPHA_ESC_PACKET_SIZE - 2])
 
     def capture(self, rxbit: int) -> None:
         """Telemetry acquisition process. Initially focuses on finding the two
@@ -201,65 +356,172 @@ class AlphaTelemetry:
         else:
             self.buf_len += 1
 
-    def processBuffer(self) -> None:
+    def feed(self, data: bytes, ends: Optional[List[int]] = None) -> List[TelemetryFrame]:
+        """Telemetry acquisition process for a buffer of received bytes.
+        Same state machine as calling capture() for every byte, the partial
+        packet at the end of the buffer is kept for the next call.
+
+        Args:
+            data (bytes): Bytes received, of any length
+            ends (list, optional): Receives the offset in data just after the last byte of each
+                packet returned, e.g. to timestamp the packets of a chunk. Defaults to None.
+
+        Returns:
+            list: Every valid packet completed by data
+        """
+        frames = []
+        rxbuf = self.rxbuf
+        buf_len = self.buf_len
+        i = 0
+        n = len(data)
+        while i < n:
+            if buf_len >= 2:
+                # Header found, copy the body of the packet at once
+                count = min(ALPHA_ESC_PACKET_SIZE - buf_len, n - i)
+                rxbuf[buf_len : buf_len + count] = data[i : i + count]
+                buf_len += count
+                i += count
+                if buf_len == ALPHA_ESC_PACKET_SIZE:
+                    res = self.processBuffer()
+                    if res is not None:
+                        frames.append(res)
+                        if ends is not None:
+                            ends.append(i)
+                    buf_len = 0
+                continue
+
+            rxbit = data[i]
+            i += 1
+            if buf_len == 0:
+                if rxbit == ALPHA_ESC_B1:
+                    rxbuf[0] = rxbit
+                buf_len = 1
+            elif rxbit == ALPHA_ESC_B2:
+                rxbuf[1] = rxbit
+                buf_len = 2
+
+        self.buf_len = buf_len
+        return frames
+
+    def processBuffer(self) -> Optional[TelemetryFrame]:
         """Process the buffer and decodes values stored in packet.
         This function should not be called manually.
+
+        Returns:
+            TelemetryFrame: Decoded packet, None if the packet is invalid
         """
 
         res = self.decodeBuffer(self.rxbuf, poles=self.POLES_N, integer_only=False)
         if res is not None:
-            self._initialValue = res[0]
-            self._baleNumber = res[1]
-            self._rxThrottle = res[2]
-            self._outputThrottle = res[3]
-            self._rpm = res[4]
-            self._busbarVoltage = res[5]
-            self._busbarCurrent = res[6]
-            self._phaseWireCurrent = res[7]
-            self._mosfetTemp = res[8]
-            self._capacitorTemp = res[9]
-            self._statusCode = res[10]
-            self._fault = res[10] != 0x0
+            self._frame = res
             self._ready = True
+        return res
 
     @classmethod
-    def decodeBuffer(cls, buffer, poles: int = 1, integer_only: bool = True):
+    def decodeBuffer(cls, buffer, poles: int = 1, integer_only: bool = True) -> Optional[TelemetryFrame]:
+        """Decode a raw packet
+
+        Args:
+            buffer (bytes): ALPHA_ESC_PACKET_SIZE bytes of the packet
+            poles (int, optional): Number of pole pairs. Defaults to 1.
+            integer_only (bool, optional): Round temperatures to integers. Defaults to True.
+
+        Returns:
+            TelemetryFrame: Decoded packet, None if the checksum is invalid
+        """
+        (
+            b0,
+            b1,
+            b2,
+            b3,
+            _baleNumber,
+            _rxThrottle,
+            _outputThrottle,
+            _rpm,
+            _busbarVoltage,
+            _busbarCurrent,
+            _phaseWireCurrent,
+            _mosfetTemp,
+            _capacitorTemp,
+            _statusCode,
+            checksum_low,
+            checksum_high,
+        ) = PACKET_STRUCT.unpack_from(buffer)
+
         # check packet integrity
-        checksum_received = (buffer[23] << 8) + buffer[22]
+        checksum_received = (checksum_high << 8) + checksum_low
         checksum_calculated = cls.calc_checksum(buffer)
 
-        if checksum_received == checksum_calculated:
-            _initialValue = (buffer[0] << 8) + (buffer[1] << 16) + (buffer[2] << 24) + buffer[3]
-            _baleNumber = (buffer[4] << 8) + buffer[5]
-            _rxThrottle = int((buffer[6] << 8) + buffer[7]) * 100.0 / 1024.0
-            _outputThrottle = int((buffer[8] << 8) + buffer[9]) * 100.0 / 1024.0
-            _rpm = int((buffer[10] << 8) + buffer[11]) * 10.0 / poles
-            _busbarVoltage = int((buffer[12] << 8) + buffer[13]) / 10.0
-            _busbarCurrent = int((buffer[14] << 8) + buffer[15]) / 64.0
-            _phaseWireCurrent = int((buffer[16] << 8) + buffer[17]) / 64.0
-            _mosfetTemp = cls.temperature_decode(buffer[18], integer_only)
-            _capacitorTemp = cls.temperature_decode(buffer[19], integer_only)
-            _statusCode = (buffer[20] << 8) + buffer[21]
-
-            # Check data (These are arbitrary checks to ensure data integrity)
-            _rxThrottle = 0.0 if _rxThrottle > 100 else _rxThrottle
-            _outputThrottle = 0.0 if _outputThrottle > 100 else _outputThrottle
-            _busbarCurrent = 0.0 if _busbarCurrent > 150 else _busbarCurrent
-            _phaseWireCurrent = 0.0 if _phaseWireCurrent > 150 else _phaseWireCurrent
-
-            return [
-                _initialValue,
-                _baleNumber,
-                _rxThrottle,
-                _outputThrottle,
-                _rpm,
-                _busbarVoltage,
-                _busbarCurrent,
-                _phaseWireCurrent,
-                _mosfetTemp,
-                _capacitorTemp,
-                _statusCode,
-            ]
-        else:
+        if checksum_received != checksum_calculated:
             logger.error("Checksum differs. Received: {} / Computed: {}".format(checksum_received, checksum_calculated))
             return None
+
+        _rxThrottle = _rxThrottle * 100.0 / 1024.0
+        _outputThrottle = _outputThrottle * 100.0 / 1024.0
+        _busbarCurrent = _busbarCurrent / 64.0
+        _phaseWireCurrent = _phaseWireCurrent / 64.0
+
+        # Check data (These are arbitrary checks to ensure data integrity)
+        return TelemetryFrame(
+            (b0 << 8) + (b1 << 16) + (b2 << 24) + b3,
+            _baleNumber,
+            0.0 if _rxThrottle > 100 else _rxThrottle,
+            0.0 if _outputThrottle > 100 else _outputThrottle,
+            _rpm * 10.0 / poles,
+            _busbarVoltage / 10.0,
+            0.0 if _busbarCurrent > 150 else _busbarCurrent,
+            0.0 if _phaseWireCurrent > 150 else _phaseWireCurrent,
+            cls.temperature_decode(_mosfetTemp, integer_only),
+            cls.temperature_decode(_capacitorTemp, integer_only),
+            _statusCode,
+            _statusCode != 0x0,
+        )
+
+    @classmethod
+    def decodeFrames(cls, frames, poles: int = 1, integer_only: bool = True) -> numpy.ndarray:
+        """Vectorized counterpart of decodeBuffer, decoding a batch of packets at once.
+
+        Args:
+            frames (numpy.ndarray): (N, ALPHA_ESC_PACKET_SIZE) uint8 array of raw packets
+            poles (int, optional): Number of pole pairs. Defaults to 1.
+            integer_only (bool, optional): Round temperatures to integers. Defaults to True.
+
+        Returns:
+            numpy.ndarray: Packets with a valid checksum, as a structured array of telemetry_dtype
+        """
+        frames = numpy.asarray(frames, dtype=numpy.uint8).reshape(-1, ALPHA_ESC_PACKET_SIZE)
+
+        # check packets integrity
+        checksum_received = (frames[:, 23].astype(numpy.int64) << 8) + frames[:, 22]
+        checksum_calculated = frames[:, : ALPHA_ESC_PACKET_SIZE - 2].sum(axis=1, dtype=numpy.int64)
+        valid = checksum_received == checksum_calculated
+        if not valid.all():
+            # Called once per chunk: the callers report the total of the decode
+            logger.debug("Checksum differs for {} packet(s) out of {}".format(numpy.count_nonzero(~valid), len(frames)))
+            frames = frames[valid]
+
+        def byte(i):
+            return frames[:, i].astype(numpy.int64)
+
+        def word(i):
+            return (byte(i) << 8) + frames[:, i + 1]
+
+        out = numpy.empty(len(frames), dtype=telemetry_dtype(integer_only))
+        out["initialValue"] = (byte(0) << 8) + (byte(1) << 16) + (byte(2) << 24) + frames[:, 3]
+        out["baleNumber"] = word(4)
+        out["rxThrottle"] = word(6) * 100.0 / 1024.0
+        out["outputThrottle"] = word(8) * 100.0 / 1024.0
+        out["rpm"] = word(10) * 10.0 / poles
+        out["busbarVoltage"] = word(12) / 10.0
+        out["busbarCurrent"] = word(14) / 64.0
+        out["phaseWireCurrent"] = word(16) / 64.0
+        out["mosfetTemp"] = cls.temperature_decode_array(frames[:, 18], integer_only)
+        out["capacitorTemp"] = cls.temperature_decode_array(frames[:, 19], integer_only)
+        out["statusCode"] = word(20)
+        out["fault"] = out["statusCode"] != 0x0
+
+        # Check data (These are arbitrary checks to ensure data integrity)
+        for key, limit in (("rxThrottle", 100), ("outputThrottle", 100), ("busbarCurrent", 150), ("phaseWireCurrent", 150)):
+            out[key][out[key] > limit] = 0.0
+
+        return out
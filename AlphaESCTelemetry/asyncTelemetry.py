@@ -0,0 +1,157 @@
+"""
+asyncio interface to Alpha T-Motor ESC telemetry: an ESC stream as an async iterator of decoded
+packets, so that one event loop can follow several ESCs along with other tasks.
+
+The serial port is read in non-blocking mode when the event loop reports it readable
+(loop.add_reader, POSIX only), and the bytes are decoded by the streaming parser
+(AlphaTelemetry.feed): no thread and no blocking read are involved.
+
+Usage:
+    python asyncTelemetry.py /dev/ttyUSB0 [/dev/ttyUSB1 ...]
+"""
+
+import argparse
+import asyncio
+import errno
+import logging
+import os
+import sys
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+import serial
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, AlphaTelemetry, TelemetryFrame
+
+
+class AsyncTelemetryReader:
+    """Async iterator of the packets decoded from a serial port"""
+
+    def __init__(self, port, poles: int = 21, baudrate: int = ALPHA_ESC_BAUD, queue_size: int = 1024) -> None:
+        """AsyncTelemetryReader initialization, call `open()` (or use `async with`) to start reading.
+
+        Args:
+            port: Device path of the serial port (e.g. one end of a pty), open serial.Serial, or file
+                descriptor already configured (raw mode and baudrate, e.g. with tty.setraw)
+            poles (int, optional): Number of poles of the motor. Defaults to 21.
+            baudrate (int, optional): Baudrate, when `port` is a path. Defaults to ALPHA_ESC_BAUD.
+            queue_size (int, optional): Maximum number of chunks of packets waiting to be consumed, further
+                chunks are dropped. Defaults to 1024.
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.telemetry = AlphaTelemetry(POLES_N=poles)
+        self.queue_size = queue_size
+        self.bytes_read = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.fd: Optional[int] = None
+        self._serial: Optional[serial.Serial] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._frames: List[TelemetryFrame] = []  # Rest of the chunk being iterated
+
+    async def open(self) -> "AsyncTelemetryReader":
+        """Open the port and start reading it from the running event loop"""
+        if isinstance(self.port, int):
+            self.fd = self.port
+        else:
+            if isinstance(self.port, str):
+                self._serial = serial.Serial(self.port, baudrate=self.baudrate, timeout=0)
+            self.fd = (self._serial or self.port).fileno()
+        os.set_blocking(self.fd, False)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._loop.add_reader(self.fd, self._read)
+        return self
+
+    def _read(self) -> None:
+        """Event loop callback: read and decode what was received"""
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if e.errno != errno.EIO:  # EIO: other end of a pty closed
+                logging.error("Telemetry read failed: {}".format(e))
+            data = b""
+        if not data:
+            self._end()
+            return
+
+        self.bytes_read += len(data)
+        frames = self.telemetry.feed(data)
+        if not frames:
+            return
+        self.frames_decoded += len(frames)
+        if self._queue.qsize() >= self.queue_size:
+            self.frames_dropped += len(frames)
+            return
+        self._queue.put_nowait((time.time(), frames))
+
+    def _end(self) -> None:
+        if self._loop is not None and self.fd is not None:
+            self._loop.remove_reader(self.fd)
+            self._queue.put_nowait(None)
+            self._loop = None
+
+    async def batches(self) -> AsyncIterator[Tuple[float, List[TelemetryFrame]]]:
+        """Yield (time.time() of the read, packets) for every chunk holding packets, until the port is closed"""
+        if self._queue is None:
+            await self.open()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                self._queue.put_nowait(None)  # Stay at the end
+                return
+            yield item
+
+    def __aiter__(self) -> "AsyncTelemetryReader":
+        return self
+
+    async def __anext__(self) -> TelemetryFrame:
+        if not self._frames:
+            if self._queue is None:
+                await self.open()
+            item = await self._queue.get()
+            if item is None:
+                self._queue.put_nowait(None)
+                raise StopAsyncIteration
+            self._frames = list(reversed(item[1]))
+        return self._frames.pop()
+
+    def close(self) -> None:
+        """Stop reading, and close the port when it was opened from a path"""
+        self._end()
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+    async def __aenter__(self) -> "AsyncTelemetryReader":
+        return await self.open()
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+
+async def _print_port(port: str, poles: int) -> None:
+    async with AsyncTelemetryReader(port, poles=poles) as reader:
+        async for frame in reader:
+            print("{}: {}".format(port, frame))
+
+
+async def _main(ports: List[str], poles: int) -> None:
+    await asyncio.gather(*(_print_port(port, poles) for port in ports))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Print the telemetry of one or more Alpha T-Motor ESCs from a single event loop")
+    ap.add_argument("ports", type=str, nargs="+", help="Serial ports.")
+    ap.add_argument("-p", "--poles", type=int, dest="poles", default=21, help="Number of poles of the motor.")
+    args = ap.parse_args()
+
+    try:
+        asyncio.run(_main(args.ports, args.poles))
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
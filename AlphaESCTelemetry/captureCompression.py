@@ -0,0 +1,254 @@
+"""
+Compressed captures: the bytes of a capture file (plain or timestamped container) compressed in
+independent zlib or lzma blocks, so that any part of it can be read by decompressing one block.
+
+Layout (little-endian):
+    header:  COMPRESSED_MAGIC (8 bytes), version (u16), codec (u16)
+    blocks:  compressed size (u32), uncompressed size (u32), compressed bytes
+    index:   block of uncompressed size 0 holding the file offset and uncompressed offset of
+             every block (int64 pairs), followed by its own file offset (u64) and INDEX_MAGIC
+
+Blocks hold `block_size` bytes, or less when the writer is flushed before the block is full, so
+that a flushed capture can be read while it is being written. The index is written when the file
+is closed. Without it (e.g. after a crash), it is rebuilt by walking the block headers, and the
+last incomplete block is ignored.
+"""
+
+import io
+import lzma
+import os
+import struct
+import zlib
+from typing import Optional
+
+import numpy
+
+COMPRESSED_MAGIC = b"\x89AESZ\r\n\x1a"
+COMPRESSED_VERSION = 1
+INDEX_MAGIC = b"AESZIDX\x00"
+HEADER_STRUCT = struct.Struct("<8sHH")
+BLOCK_STRUCT = struct.Struct("<II")
+FOOTER_STRUCT = struct.Struct("<Q8s")
+
+CODECS = {"zlib": 1, "lzma": 2}
+_COMPRESS = {1: zlib.compress, 2: lzma.compress}
+_DECOMPRESS = {1: zlib.decompress, 2: lzma.decompress}
+
+
+def is_compressed(file_path: str) -> bool:
+    """Whether a file is a compressed capture"""
+    with open(file_path, "rb") as f:
+        return f.read(len(COMPRESSED_MAGIC)) == COMPRESSED_MAGIC
+
+
+def open_file(file_path: str):
+    """Open a capture file for reading, decompressing it transparently
+
+    Returns:
+        Binary file object (seekable) of the uncompressed bytes
+    """
+    return io.BufferedReader(BlockReader(file_path)) if is_compressed(file_path) else open(file_path, "rb")
+
+
+class CompressedWriter:
+    """Binary file object compressing what is written to it in independent blocks"""
+
+    def __init__(self, f, codec: str = "zlib", block_size: int = 1 << 18, level: Optional[int] = None) -> None:
+        """CompressedWriter initialization, writes the header.
+
+        Args:
+            f: Binary file object, opened for writing
+            codec (str, optional): "zlib" or "lzma". Defaults to "zlib".
+            block_size (int, optional): Uncompressed bytes per block. Defaults to 256 KiB.
+            level (int, optional): Compression level (zlib) or preset (lzma). Defaults to the codec default.
+        """
+        if codec not in CODECS:
+            raise ValueError("Unknown compression codec: {}".format(codec))
+        self.f = f
+        self.codec = CODECS[codec]
+        self.block_size = block_size
+        self.level = level
+        self.closed = False
+        self._pending = bytearray()
+        self._blocks = []  # File offset and uncompressed offset of each block
+        self._size = 0  # Uncompressed bytes in the written blocks
+        self.f.write(HEADER_STRUCT.pack(COMPRESSED_MAGIC, COMPRESSED_VERSION, self.codec))
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.level is None:
+            return _COMPRESS[self.codec](data)
+        if self.codec == CODECS["lzma"]:
+            return lzma.compress(data, preset=self.level)
+        return zlib.compress(data, self.level)
+
+    def _write_block(self, data: bytes) -> None:
+        compressed = self._compress(data)
+        self._blocks.append((self.f.tell(), self._size))
+        self.f.write(BLOCK_STRUCT.pack(len(compressed), len(data)) + compressed)
+        self._size += len(data)
+
+    def write(self, data: bytes) -> int:
+        """Buffer `data`, writing every complete block"""
+        self._pending += data
+        while len(self._pending) >= self.block_size:
+            self._write_block(bytes(self._pending[: self.block_size]))
+            del self._pending[: self.block_size]
+        return len(data)
+
+    def flush(self) -> None:
+        """Write the current block, even if short, and flush the file: everything written so far can be read back"""
+        if self._pending:
+            self._write_block(bytes(self._pending))
+            self._pending.clear()
+        self.f.flush()
+
+    def fileno(self) -> int:
+        return self.f.fileno()
+
+    def close(self) -> None:
+        """Write the current block and the block index. The underlying file is left open."""
+        if self.closed:
+            return
+        self.flush()
+        index = numpy.array(self._blocks, dtype="<i8").reshape(-1, 2).tobytes()
+        position = self.f.tell()
+        self.f.write(BLOCK_STRUCT.pack(len(index), 0) + index + FOOTER_STRUCT.pack(position, INDEX_MAGIC))
+        self.f.flush()
+        self.closed = True
+
+
+class BlockReader(io.RawIOBase):
+    """Seekable binary file object of the uncompressed bytes of a compressed capture"""
+
+    def __init__(self, file_path: str) -> None:
+        """BlockReader initialization, loads (or rebuilds) the block index.
+
+        Args:
+            file_path (str): File path to the compressed capture
+        """
+        super().__init__()
+        self.file_path = file_path
+        self._f = open(file_path, "rb")
+        magic, version, self.codec = HEADER_STRUCT.unpack(self._f.read(HEADER_STRUCT.size))
+        if magic != COMPRESSED_MAGIC:
+            raise ValueError("Not a compressed capture: {}".format(file_path))
+        if version > COMPRESSED_VERSION:
+            raise ValueError("Unsupported compressed capture version: {}".format(version))
+
+        blocks = self._read_index()
+        # File offset of each block, and uncompressed offset of its start and of the end of the data
+        self._positions = blocks[:, 0]
+        self._starts = blocks[:, 1]
+        self.size = int(self._starts[-1])
+        self._position = 0
+        self._cached = -1
+        self._cache = b""
+
+    def _read_index(self) -> numpy.ndarray:
+        """Block index, with a last row for the end of the data"""
+        file_size = os.fstat(self._f.fileno()).st_size
+        if file_size >= HEADER_STRUCT.size + FOOTER_STRUCT.size:
+            self._f.seek(file_size - FOOTER_STRUCT.size)
+            position, magic = FOOTER_STRUCT.unpack(self._f.read(FOOTER_STRUCT.size))
+            if magic == INDEX_MAGIC:
+                self._f.seek(position)
+                length, _ = BLOCK_STRUCT.unpack(self._f.read(BLOCK_STRUCT.size))
+                blocks = numpy.frombuffer(self._f.read(length), dtype="<i8").reshape(-1, 2).astype(numpy.int64)
+                end = self._f.tell() - length - BLOCK_STRUCT.size
+                if len(blocks) == 0:
+                    return numpy.array([[end, 0]], dtype=numpy.int64)
+                self._f.seek(blocks[-1, 0])
+                _, last = BLOCK_STRUCT.unpack(self._f.read(BLOCK_STRUCT.size))
+                return numpy.concatenate((blocks, [[end, blocks[-1, 1] + last]]))
+
+        # No index: walk the block headers
+        blocks, position, size = [], HEADER_STRUCT.size, 0
+        while position + BLOCK_STRUCT.size <= file_size:
+            self._f.seek(position)
+            length, uncompressed = BLOCK_STRUCT.unpack(self._f.read(BLOCK_STRUCT.size))
+            if uncompressed == 0 or position + BLOCK_STRUCT.size + length > file_size:
+                break
+            blocks.append((position, size))
+            position += BLOCK_STRUCT.size + length
+            size += uncompressed
+        blocks.append((position, size))
+        return numpy.array(blocks, dtype=numpy.int64)
+
+    def _block(self, block: int) -> bytes:
+        """Uncompressed bytes of a block, the last one read being cached"""
+        if block != self._cached:
+            self._f.seek(self._positions[block])
+            length, _ = BLOCK_STRUCT.unpack(self._f.read(BLOCK_STRUCT.size))
+            self._cache = _DECOMPRESS[self.codec](self._f.read(length))
+            self._cached = block
+        return self._cache
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        count = 0
+        while count < len(view) and self._position < self.size:
+            block = int(numpy.searchsorted(self._starts, self._position, side="right")) - 1
+            data = self._block(block)
+            start = self._position - int(self._starts[block])
+            size = min(len(view) - count, len(data) - start)
+            if size <= 0:  # Block shorter than its header states
+                break
+            view[count : count + size] = data[start : start + size]
+            count += size
+            self._position += size
+        return count
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+class BlockParser:
+    """Incremental parser of a compressed capture being written: feed the bytes of the file, get the uncompressed bytes"""
+
+    def __init__(self) -> None:
+        self.codec: Optional[int] = None  # Known once the header is parsed
+        self._pending = b""
+        self._done = False  # Index reached
+
+    def feed(self, data: bytes) -> bytes:
+        """Decompress the blocks completed by `data`"""
+        buf = self._pending + bytes(data)
+        pos = 0
+        if self.codec is None:
+            if len(buf) < HEADER_STRUCT.size:
+                self._pending = buf
+                return b""
+            _, _, self.codec = HEADER_STRUCT.unpack_from(buf)
+            pos = HEADER_STRUCT.size
+
+        output = []
+        while not self._done and pos + BLOCK_STRUCT.size <= len(buf):
+            length, uncompressed = BLOCK_STRUCT.unpack_from(buf, pos)
+            if uncompressed == 0:
+                self._done = True
+                break
+            if pos + BLOCK_STRUCT.size + length > len(buf):
+                break
+            pos += BLOCK_STRUCT.size
+            output.append(_DECOMPRESS[self.codec](buf[pos : pos + length]))
+            pos += length
+        self._pending = b"" if self._done else buf[pos:]
+        return b"".join(output)
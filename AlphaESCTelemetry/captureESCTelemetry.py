@@ -2,13 +2,21 @@
 Capture, process and store decoded and raw telemetry packets from an Alpha T-Motor ESC.
 Generates two files:
     1. One CSV file containing decoded state packets
-    2. One BIN file containing raw telemetry data
+    2. One BIN file containing raw telemetry data, timestamped by chunk (see captureFormat)
+With --segment-size or --segment-duration, both are split in segments listed by a session
+manifest (see captureSession). With --format, the decoded packets are saved as one typed table
+(see telemetryTable) when the capture is stopped, instead of the CSV file. With --shm, the
+decoded packets are also published to other processes in a shared memory ring (see telemetryRing),
+and with --serve, to the subscribers of a local socket (see telemetryServer).
+With several ESCs (--port repeated, or --all-ports), each one gets its own files, numbered by
+motor, or one merged CSV file with --merged (see multiCapture).
 
 Usage:
     python captureeESCTelemetry.py ./file.bin
 """
 
 import argparse
+import contextlib
 import datetime
 import logging
 import os
@@ -17,7 +25,42 @@ import time
 
 import serial
 import serial.tools.list_ports as port_list
-from alphaTelemetry import ALPHA_ESC_BAUD, AlphaTelemetry
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD
+from AlphaESCTelemetry.captureCompression import CODECS, CompressedWriter
+from AlphaESCTelemetry.captureFormat import CaptureWriter
+from AlphaESCTelemetry.captureSession import FSYNC_POLICIES, SessionWriter
+from AlphaESCTelemetry.multiCapture import MultiCapture
+from AlphaESCTelemetry.telemetryRing import RingPublisher
+from AlphaESCTelemetry.telemetryServer import TelemetryServer, parse_address
+from AlphaESCTelemetry.telemetryTable import TABLE_FORMATS, TableRecorder, resolve_format
+
+
+def _open_outputs(stack: contextlib.ExitStack, args: argparse.Namespace, base: str, csv: bool, origin: float):
+    """Raw and decoded (CSV, or None) outputs of one ESC, at `base` + extension"""
+    if args.segment_size is not None or args.segment_duration is not None:
+        session = stack.enter_context(
+            SessionWriter(
+                base + ".json",
+                max_bytes=None if args.segment_size is None else int(args.segment_size * (1 << 20)),
+                max_seconds=args.segment_duration,
+                fsync=args.fsync,
+                timed=not args.raw,
+                csv=csv,
+                compress=args.compress,
+                baudrate=ALPHA_ESC_BAUD,
+                origin=origin,
+            )
+        )
+        return session, session.csv_file
+
+    f_bin = stack.enter_context(open(base + ".bin", "wb"))
+    f_csv = stack.enter_context(open(base + ".csv", "w+")) if csv else None
+    if args.compress is not None:
+        f_bin = CompressedWriter(f_bin, args.compress)
+        stack.callback(f_bin.close)  # Last block and block index
+    return (f_bin if args.raw else CaptureWriter(f_bin, ALPHA_ESC_BAUD, origin)), f_csv
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -25,77 +68,149 @@ if __name__ == "__main__":
         Generates one binary file containing raw telemetry data and one CSV file containing decoded state packets."""
     )
     parser.add_argument("poles", metavar="poles", type=int, nargs="?", default=21, help="number of poles")
+    parser.add_argument("--queue-size", type=int, default=1024, help="number of chunks buffered between reading and writing")
+    parser.add_argument(
+        "--block",
+        action="store_true",
+        help="pause reading when the buffer is full instead of dropping data (relies on the serial driver buffer)",
+    )
+    parser.add_argument("--raw", action="store_true", help="write the raw bytes only, without the host timestamps")
+    parser.add_argument("--compress", choices=list(CODECS), default=None, help="compress the binary file by blocks")
+    parser.add_argument("--segment-size", type=float, default=None, help="start a new segment every N MiB of raw data")
+    parser.add_argument("--segment-duration", type=float, default=None, help="start a new segment every N seconds")
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default="segment",
+        help="when segments are forced to disk: never, when closed (default) or at every write",
+    )
+    parser.add_argument(
+        "--format",
+        choices=TABLE_FORMATS,
+        default="csv",
+        help="format of the decoded packets: CSV written during the capture (default), or a table saved when stopped "
+        + "(parquet and feather need pyarrow, npz otherwise)",
+    )
+    parser.add_argument(
+        "--shm",
+        type=str,
+        default=None,
+        metavar="NAME",
+        help="publish the decoded packets in the shared memory ring NAME, read with telemetryRing.RingReader",
+    )
+    parser.add_argument("--shm-size", type=int, default=1 << 16, help="number of packets kept in the shared memory ring")
+    parser.add_argument(
+        "--serve",
+        type=str,
+        default=None,
+        metavar="ADDRESS",
+        help="publish the decoded packets on the Unix domain socket ADDRESS (or localhost:port), "
+        "read with telemetryServer.TelemetryClient",
+    )
+    parser.add_argument(
+        "--port",
+        action="append",
+        dest="ports",
+        default=None,
+        help="serial port of an ESC, repeated for several ESCs (default: the last FTDI adapter found)",
+    )
+    parser.add_argument("--all-ports", action="store_true", help="capture every FTDI adapter found, one ESC each")
+    parser.add_argument(
+        "--merged",
+        action="store_true",
+        help="write the decoded packets of all the ESCs in one CSV file, with a motor column, instead of one file per ESC",
+    )
     args = parser.parse_args()
+    table_format = resolve_format(args.format)
+    if args.serve is not None:
+        try:
+            parse_address(args.serve)
+        except ValueError as e:
+            parser.error(str(e))
 
-    # Auto detect FTDI cable
-    ports = list(port_list.comports())
-    port = None
-    for p in ports:
+    # Auto detect FTDI cables
+    ftdi = []
+    for p in port_list.comports():
         logging.info(f"Device: {p.device}, {p.name}, {p.product}, {p.serial_number}, {p.manufacturer}")
         if p.manufacturer == "FTDI":
-            port = p.device
-    if port is None:
+            ftdi.append(p.device)
+    devices = args.ports or (ftdi if args.all_ports else ftdi[-1:])
+    if not devices:
         logging.error("No FTDI adapter found")
         sys.exit(1)
+    if len(devices) > 1 and (args.shm is not None or args.serve is not None):
+        parser.error("--shm and --serve publish the packets of a single ESC")
+    if args.merged and table_format != "csv":
+        parser.error("--merged writes CSV only")
 
-    serialPort = serial.Serial(
-        port=port,
-        baudrate=ALPHA_ESC_BAUD,
-        bytesize=8,
-        timeout=1,
-        stopbits=serial.STOPBITS_ONE,
-    )
-
-    # Pass argv integer to set number of poles
-    # Default to 21 poles
-    ae = AlphaTelemetry(POLES_N=args.poles)
-
-    _init = True
-    _escTelem = {}
+    serialPorts = [
+        serial.Serial(
+            port=device,
+            baudrate=ALPHA_ESC_BAUD,
+            bytesize=8,
+            timeout=1,
+            stopbits=serial.STOPBITS_ONE,
+        )
+        for device in devices
+    ]
 
     # Create data directory if it does not exist
     if not os.path.isdir(os.path.join(os.path.dirname(__file__), "data")):
         os.makedirs(os.path.join(os.path.dirname(__file__), "data"))
 
-    bin_file = os.path.join(
+    # Files of each ESC, numbered by motor when there are several
+    base = os.path.join(
         os.path.dirname(__file__),
         "data",
-        "{}_AlphaTelemetry.bin".format(datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")),
-    )
-    csv_file = os.path.join(
-        os.path.dirname(__file__),
-        "data",
-        "{}_AlphaTelemetry.csv".format(datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")),
+        "{}_AlphaTelemetry".format(datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")),
     )
+    motors = list(range(len(devices)))
+    bases = [base if len(devices) == 1 else "{}_M{}".format(base, motor) for motor in motors]
+    for motor, device in zip(motors, devices):
+        logging.info("Motor {}: {}".format(motor, device))
+    # Same clock for the packets of all the ESCs
+    origin = time.time() - time.monotonic()
+
+    with contextlib.ExitStack() as stack:
+        outputs = [_open_outputs(stack, args, path, table_format == "csv" and not args.merged, origin) for path in bases]
+        merged_file = stack.enter_context(open(base + ".csv", "w+")) if args.merged else None
 
-    with open(bin_file, "wb") as f_bin, open(csv_file, "w+") as f_csv:
+        # Pass argv integer to set number of poles
+        # Default to 21 poles
+        capture = MultiCapture(
+            serialPorts,
+            motors,
+            poles=args.poles,
+            bin_files=[f_raw for f_raw, _ in outputs],
+            csv_files=[f_csv for _, f_csv in outputs],
+            merged_file=merged_file,
+            origin=origin,
+            queue_size=args.queue_size,
+            block=args.block,
+        )
+        engines = list(capture.engines.values())
+        if table_format != "csv":
+            tables = [TableRecorder() for _ in engines]
+            for engine, table in zip(engines, tables):
+                engine.add_listener(table)
+        if args.shm is not None:
+            engines[0].add_listener(stack.enter_context(RingPublisher(args.shm, args.shm_size)))
+        if args.serve is not None:
+            server = stack.enter_context(TelemetryServer(args.serve))
+            engines[0].add_listener(server)
+        capture.start()
         try:
             while True:
-                r = serialPort.read(1)
-                if r:
-                    ae.capture(int(r.hex(), 16))
-                    # Store raw telemetry data directly to binary file
-                    f_bin.write(r)
-
-                    if ae.ready:
-                        _escTelem["time"] = time.time()
-                        _escTelem["baleNumber"] = ae.baleNumber
-                        _escTelem["rxThrottle"] = ae.rxThrottle
-                        _escTelem["outputThrottle"] = ae.outputThrottle
-                        _escTelem["rpm"] = ae.rpm
-                        _escTelem["busbarVoltage"] = ae.busbarVoltage
-                        _escTelem["busbarCurrent"] = ae.busbarCurrent
-                        _escTelem["phaseWireCurrent"] = ae.phaseWireCurrent
-                        _escTelem["mosfetTemp"] = ae.mosfetTemp
-                        _escTelem["capacitorTemp"] = ae.capacitorTemp
-                        _escTelem["statusCode"] = ae.statusCode
-                        _escTelem["fault"] = int(ae.fault)
-
-                        # Store decoded telemetry data to CSV file
-                        if _init:
-                            f_csv.write(",".join(_escTelem.keys()) + "\n")
-                            _init = False
-                        f_csv.write(",".join([str(_escTelem[k]) for k in _escTelem.keys()]) + "\n")
+                time.sleep(10)
+                logging.info("Capture: {}".format(capture.stats))
+                if args.serve is not None:
+                    logging.info("Server: {}".format(server.stats))
         except KeyboardInterrupt:
-            serialPort.close()
+            capture.stop()
+            for serialPort in serialPorts:
+                serialPort.close()
+            if table_format != "csv":
+                for path, table in zip(bases, tables):
+                    table.save(path + "." + table_format, table_format)
+            logging.info("Capture: {}".format(capture.stats))
             sys.exit(0)
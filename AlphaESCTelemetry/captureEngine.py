@@ -0,0 +1,277 @@
+"""
+Threaded capture pipeline for an Alpha T-Motor ESC telemetry stream.
+
+A reader thread drains the serial port in large chunks into a bounded queue, and a writer
+thread decodes the chunks and writes the raw and decoded data by batches. At 19200 baud a read
+returns a few bytes only, so the reads are coalesced into chunks of up to `read_interval`
+seconds. Every chunk is timestamped with the monotonic clock when its last bytes are read; the
+raw data is written either as plain bytes or, through a CaptureWriter or SessionWriter, with
+these timestamps. Each packet gets its own time, from the position of its last byte in the
+chunk (see captureFormat.interpolate_times). The serial port can be any object with the
+`read(size)` method and the `in_waiting` and `timeout` attributes of pyserial, e.g. a
+serial.Serial opened on one end of a pty for testing.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, TextIO, Tuple
+
+import numpy
+
+from AlphaESCTelemetry.alphaTelemetry import (
+    ALPHA_ESC_BAUD,
+    ALPHA_ESC_PACKET_SIZE,
+    TELEMETRY_FIELDS,
+    AlphaTelemetry,
+    TelemetryFrame,
+)
+from AlphaESCTelemetry.captureFormat import interpolate_times
+
+# Header of the decoded CSV output
+CSV_HEADER = ",".join(("time",) + TELEMETRY_FIELDS[1:]) + "\n"
+
+
+def csv_row(timestamp: float, frame: TelemetryFrame) -> str:
+    """Format a decoded packet as a line of the CSV output"""
+    return ",".join(map(str, (timestamp,) + frame[1:-1] + (int(frame.fault),))) + "\n"
+
+
+class CaptureEngine:
+    """Reader thread -> bounded queue -> decoding and batched writing thread"""
+
+    def __init__(
+        self,
+        port,
+        poles: int = 21,
+        bin_file=None,
+        csv_file: Optional[TextIO] = None,
+        queue_size: int = 1024,
+        block: bool = False,
+        flush_interval: float = 1.0,
+        flush_bytes: int = 1 << 16,
+        read_interval: float = 0.05,
+        read_size: int = 1 << 12,
+    ) -> None:
+        """CaptureEngine initialization.
+
+        Args:
+            port: Serial port (serial.Serial or any object with read(), in_waiting and a settable timeout),
+                opened with a read timeout
+            poles (int, optional): Number of poles of the motor. Defaults to 21.
+            bin_file (optional): Binary file object, CaptureWriter or SessionWriter receiving the raw data.
+                Defaults to None.
+            csv_file (TextIO, optional): Text file object receiving the decoded packets. Defaults to None.
+            queue_size (int, optional): Maximum number of chunks waiting to be decoded. Defaults to 1024.
+            block (bool, optional): When the queue is full, stop reading until there is room (the
+                serial driver buffers the data meanwhile) instead of dropping the chunk. Defaults to False.
+            flush_interval (float, optional): Maximum time in seconds before a batch is written. Defaults to 1.0.
+            flush_bytes (int, optional): Size of raw data triggering a batch write. Defaults to 64 KiB.
+            read_interval (float, optional): Maximum time in seconds spent coalescing the reads into a
+                chunk, the time resolution of the raw capture. Defaults to 0.05.
+            read_size (int, optional): Size of a chunk ending the coalescing early. Defaults to 4 KiB.
+        """
+        self.port = port
+        self.telemetry = AlphaTelemetry(POLES_N=poles)
+        self.bin_file = bin_file
+        self.csv_file = csv_file
+        self.block = block
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.read_interval = read_interval
+        self.read_size = read_size
+        self.listeners: List[Callable[[List[float], List[TelemetryFrame]], None]] = []
+        # Wall-clock time of the origin of the monotonic clock, shared with the raw capture
+        self.origin = getattr(bin_file, "origin", time.time() - time.monotonic())
+        self.baudrate = getattr(port, "baudrate", ALPHA_ESC_BAUD)
+
+        # Counters
+        self.bytes_read = 0
+        self.bytes_dropped = 0
+        self.chunks_dropped = 0
+        self.queue_full = 0  # Number of times the reader found the queue full
+        self.queue_peak = 0
+        self.frames_decoded = 0
+        self.batches_written = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._raw: List[Tuple[int, bytes]] = []
+        self._raw_size = 0
+        self._rows: List[str] = []
+        self._received = 0  # Bytes decoded so far
+        self._previous: Optional[float] = None  # Time of the previous chunk
+        self._reader = threading.Thread(target=self._read, name="AlphaTelemetryReader", daemon=True)
+        self._writer = threading.Thread(target=self._write, name="AlphaTelemetryWriter", daemon=True)
+
+    def add_listener(self, callback: Callable[[List[float], List[TelemetryFrame]], None]) -> None:
+        """Call `callback(times, frames)` from the writer thread for every chunk holding packets, `times` being
+        the wall-clock time of each packet"""
+        self.listeners.append(callback)
+
+    def start(self) -> "CaptureEngine":
+        """Start the reader and writer threads"""
+        if self.csv_file is not None:
+            self.csv_file.write(CSV_HEADER)
+        self._writer.start()
+        self._reader.start()
+        return self
+
+    def halt(self) -> None:
+        """Ask the reader thread to stop, without waiting for it"""
+        self._stop.set()
+
+    def stop(self) -> None:
+        """Stop reading, then decode and write everything already read"""
+        self.halt()
+        self._reader.join()
+        self._queue.put(None)
+        self._writer.join()
+
+    def __enter__(self) -> "CaptureEngine":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def stats(self) -> dict:
+        """Counters of the pipeline"""
+        return {
+            "bytes_read": self.bytes_read,
+            "bytes_dropped": self.bytes_dropped,
+            "chunks_dropped": self.chunks_dropped,
+            "queue_full": self.queue_full,
+            "queue_peak": self.queue_peak,
+            "frames_decoded": self.frames_decoded,
+            "batches_written": self.batches_written,
+        }
+
+    def _read_chunk(self) -> Tuple[int, bytes]:
+        """Wait (up to the port timeout) for data, then coalesce the bytes received within `read_interval`
+
+        The reads block until data arrives, with the port timeout set to the time left before the end of
+        the chunk, so that the port is never polled.
+
+        Returns:
+            tuple: time.monotonic_ns() of the last read, and the bytes read (empty on timeout)
+        """
+        # Everything received so far, or wait for at least one byte
+        data = self.port.read(self.port.in_waiting or 1)
+        timestamp_ns = time.monotonic_ns()
+        if not data:
+            return timestamp_ns, data
+        chunk = bytearray(data)
+        deadline = timestamp_ns + int(self.read_interval * 1e9)
+        timeout = self.port.timeout
+        try:
+            while len(chunk) < self.read_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic_ns()
+                if remaining <= 0:
+                    break
+                # Blocks until the chunk is full or the time is up (pyserial), or until some data arrives
+                self.port.timeout = remaining / 1e9
+                data = self.port.read(self.read_size - len(chunk))
+                if not data:
+                    break
+                chunk += data
+                timestamp_ns = time.monotonic_ns()
+        finally:
+            self.port.timeout = timeout
+        return timestamp_ns, bytes(chunk)
+
+    def _read(self) -> None:
+        """Reader thread: drain the serial port into the queue"""
+        while not self._stop.is_set():
+            item = self._read_chunk()
+            data = item[1]
+            if not data:
+                continue
+            self.bytes_read += len(data)
+
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.queue_full += 1
+                if not self.block:
+                    self.chunks_dropped += 1
+                    self.bytes_dropped += len(data)
+                    continue
+                # Backpressure: wait for the writer, still checking for stop requests
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                else:
+                    self.chunks_dropped += 1
+                    self.bytes_dropped += len(data)
+            self.queue_peak = max(self.queue_peak, self._queue.qsize())
+
+    def _write(self) -> None:
+        """Writer thread: decode the chunks and write them by batches"""
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+
+            if item:
+                self._decode(*item)
+
+            if self._raw_size >= self.flush_bytes or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+        self._flush()
+
+    def _decode(self, timestamp_ns: int, data: bytes) -> None:
+        """Decode stage: parse a chunk and queue its output for the next batch"""
+        self._raw.append((timestamp_ns, data))
+        self._raw_size += len(data)
+
+        ends: List[int] = []
+        frames = self.telemetry.feed(data, ends)
+        timestamp = self.origin + timestamp_ns / 1e9
+        start, self._received = self._received, self._received + len(data)
+        previous, self._previous = self._previous, timestamp
+        if not frames:
+            return
+        # Each packet at the time its last byte was received, not before the previous chunk
+        offsets = start + numpy.array(ends, dtype=numpy.int64) - ALPHA_ESC_PACKET_SIZE
+        if previous is None:
+            times = interpolate_times(offsets, [self._received], [timestamp], self.baudrate)
+        else:
+            times = interpolate_times(offsets, [start, self._received], [previous, timestamp], self.baudrate)
+        times = times.tolist()
+
+        self.frames_decoded += len(frames)
+        if self.csv_file is not None:
+            self._rows.extend(csv_row(packet_time, frame) for packet_time, frame in zip(times, frames))
+        for callback in self.listeners:
+            try:
+                callback(times, frames)
+            except Exception:
+                logging.exception("Telemetry listener failed")
+
+    def _flush(self) -> None:
+        """Write the pending batch"""
+        if self._raw and self.bin_file is not None:
+            if hasattr(self.bin_file, "write_chunks"):
+                self.bin_file.write_chunks(self._raw)
+            else:
+                self.bin_file.write(b"".join(data for _, data in self._raw))
+            self.bin_file.flush()
+        if self._rows and self.csv_file is not None:
+            self.csv_file.write("".join(self._rows))
+            self.csv_file.flush()
+        if self._raw or self._rows:
+            self.batches_written += 1
+        self._raw.clear()
+        self._raw_size = 0
+        self._rows.clear()
@@ -0,0 +1,248 @@
+"""
+Versioned container for raw telemetry captures, storing the host time of every chunk read
+from the serial port alongside the raw bytes.
+
+Layout (little-endian):
+    header:  CAPTURE_MAGIC (8 bytes), version (u16), baudrate (u32),
+             wall-clock time of the origin of the monotonic clock (f64)
+    records: monotonic time of the read in ns (i64), length (u32), raw bytes
+
+Plain binary captures, holding the raw bytes only, are read transparently by CaptureReader, as
+well as compressed captures of either format (see captureCompression).
+"""
+
+import os
+import struct
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, ALPHA_ESC_PACKET_SIZE
+from AlphaESCTelemetry.captureCompression import open_file
+
+CAPTURE_MAGIC = b"\x89AESC\r\n\x1a"
+CAPTURE_VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sHId")
+RECORD_STRUCT = struct.Struct("<qI")
+
+
+def is_capture(file_path: str) -> bool:
+    """Whether a file uses the timestamped container format"""
+    with open_file(file_path) as f:
+        return f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+
+def parse_header(header: bytes) -> Tuple[int, float]:
+    """Check a container header
+
+    Returns:
+        tuple: Baudrate and wall-clock time of the monotonic clock origin
+    """
+    magic, version, baudrate, origin = HEADER_STRUCT.unpack_from(header)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError("Not a telemetry capture container")
+    if version > CAPTURE_VERSION:
+        raise ValueError("Unsupported capture container version: {}".format(version))
+    return baudrate, origin
+
+
+def interpolate_times(offsets, ends, times, baudrate: int = ALPHA_ESC_BAUD) -> numpy.ndarray:
+    """Host time of packets, interpolated from the read times and the byte duration on the link
+
+    A read returns right after its last byte is received, the previous bytes of the chunk
+    being received one byte duration apart, but not before the previous read.
+
+    Args:
+        offsets (array_like): Stream offsets of the packets
+        ends (array_like): Stream offset of the end of each chunk read
+        times (array_like): Wall-clock time of each chunk read
+        baudrate (int, optional): Baudrate of the serial link. Defaults to ALPHA_ESC_BAUD.
+
+    Returns:
+        numpy.ndarray: Wall-clock time at which the last byte of each packet was received
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    ends = numpy.asarray(ends, dtype=numpy.int64)
+    times = numpy.asarray(times, dtype=numpy.float64)
+    if len(ends) == 0:
+        return numpy.full(len(offsets), numpy.nan)
+
+    last = offsets + ALPHA_ESC_PACKET_SIZE - 1
+    chunk = numpy.searchsorted(ends, last, side="right").clip(0, len(ends) - 1)
+    byte_time = 10.0 / baudrate  # start bit, 8 data bits and stop bit
+    # Nothing is known before the first read
+    previous = numpy.where(chunk > 0, times[numpy.maximum(chunk - 1, 0)], -numpy.inf)
+    return numpy.maximum(times[chunk] - (ends[chunk] - 1 - last) * byte_time, previous)
+
+
+class CaptureParser:
+    """Incremental parser of a container being written: feed the bytes of the file, get the chunks"""
+
+    def __init__(self) -> None:
+        self.baudrate = ALPHA_ESC_BAUD
+        self.origin: Optional[float] = None  # Known once the header is parsed
+        self._pending = b""
+
+    def feed(self, data: bytes) -> List[Tuple[float, bytes]]:
+        """Parse the records completed by `data`
+
+        Returns:
+            list: Wall-clock time and raw bytes of each chunk
+        """
+        buf = self._pending + bytes(data)
+        pos = 0
+        if self.origin is None:
+            if len(buf) < HEADER_STRUCT.size:
+                self._pending = buf
+                return []
+            self.baudrate, self.origin = parse_header(buf)
+            pos = HEADER_STRUCT.size
+
+        chunks = []
+        while pos + RECORD_STRUCT.size <= len(buf):
+            timestamp_ns, length = RECORD_STRUCT.unpack_from(buf, pos)
+            if pos + RECORD_STRUCT.size + length > len(buf):
+                break
+            pos += RECORD_STRUCT.size
+            chunks.append((self.origin + timestamp_ns / 1e9, buf[pos : pos + length]))
+            pos += length
+        self._pending = buf[pos:]
+        return chunks
+
+
+class CaptureWriter:
+    """Write raw chunks with their monotonic read time to a binary file object"""
+
+    def __init__(self, f, baudrate: int = ALPHA_ESC_BAUD, origin: Optional[float] = None) -> None:
+        """CaptureWriter initialization, writes the container header.
+
+        Args:
+            f: Binary file object, opened for writing
+            baudrate (int, optional): Baudrate of the serial link. Defaults to ALPHA_ESC_BAUD.
+            origin (float, optional): Wall-clock time of the monotonic clock origin. Defaults to now.
+        """
+        self.f = f
+        self.origin = time.time() - time.monotonic() if origin is None else origin
+        self.f.write(HEADER_STRUCT.pack(CAPTURE_MAGIC, CAPTURE_VERSION, baudrate, self.origin))
+
+    def write(self, data: bytes, timestamp_ns: Optional[int] = None) -> None:
+        """Write one chunk
+
+        Args:
+            data (bytes): Raw bytes
+            timestamp_ns (int, optional): time.monotonic_ns() when the chunk was read. Defaults to now.
+        """
+        self.write_chunks([(time.monotonic_ns() if timestamp_ns is None else timestamp_ns, data)])
+
+    def write_chunks(self, chunks: Iterable[Tuple[int, bytes]]) -> None:
+        """Write a batch of (time.monotonic_ns(), raw bytes) chunks at once"""
+        self.f.write(b"".join(RECORD_STRUCT.pack(timestamp_ns, len(data)) + data for timestamp_ns, data in chunks if data))
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+class CaptureReader:
+    """Logical raw byte stream of a capture, plain or in the timestamped container"""
+
+    def __init__(self, file_path: str) -> None:
+        """CaptureReader initialization, indexes the records of a container.
+
+        Args:
+            file_path (str): File path to the capture
+        """
+        self.file_path = file_path
+        self.timed = is_capture(file_path)
+        self.baudrate = ALPHA_ESC_BAUD
+
+        with open_file(file_path) as f:
+            file_size = f.seek(0, os.SEEK_END)
+        if not self.timed:
+            self.size = file_size
+            return
+
+        # Position of each record payload in the file, end of each record in the stream and read time
+        positions, lengths, timestamps = [], [], []
+        with open_file(file_path) as f:
+            self.baudrate, origin = parse_header(f.read(HEADER_STRUCT.size))
+            while len(record := f.read(RECORD_STRUCT.size)) == RECORD_STRUCT.size:
+                timestamp_ns, length = RECORD_STRUCT.unpack(record)
+                positions.append(f.tell())
+                lengths.append(length)
+                timestamps.append(timestamp_ns)
+                f.seek(length, os.SEEK_CUR)
+        self._positions = numpy.array(positions, dtype=numpy.int64)
+        self._ends = numpy.cumsum(numpy.array(lengths, dtype=numpy.int64))
+        if len(self._ends) and positions[-1] + lengths[-1] > file_size:
+            # Interrupted while writing the last record
+            self._ends[-1] -= positions[-1] + lengths[-1] - file_size
+        self._times = origin + numpy.array(timestamps, dtype=numpy.int64) / 1e9
+        self.size = int(self._ends[-1]) if len(self._ends) else 0
+
+    def iter_blocks(self, block_size: int = 1 << 22) -> Iterator[bytes]:
+        """Read the stream sequentially
+
+        Args:
+            block_size (int, optional): Approximate size of the blocks. Defaults to 4 MiB.
+
+        Yields:
+            bytes: Consecutive blocks of the stream
+        """
+        with open_file(self.file_path) as f:
+            if not self.timed:
+                while block := f.read(block_size):
+                    yield block
+                return
+
+            block, size = [], 0
+            starts = numpy.concatenate(([0], self._ends[:-1]))
+            for position, start, end in zip(self._positions, starts, self._ends):
+                f.seek(position)
+                block.append(f.read(end - start))
+                size += end - start
+                if size >= block_size:
+                    yield b"".join(block)
+                    block, size = [], 0
+            if block:
+                yield b"".join(block)
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> bytes:
+        """Read the bytes [start, stop) of the stream"""
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return b""
+        with open_file(self.file_path) as f:
+            if not self.timed:
+                f.seek(start)
+                return f.read(stop - start)
+
+            data = []
+            record = int(numpy.searchsorted(self._ends, start, side="right"))
+            position = start
+            while position < stop:
+                record_start = self._ends[record - 1] if record else 0
+                f.seek(self._positions[record] + position - record_start)
+                data.append(f.read(min(stop, self._ends[record]) - position))
+                position = min(stop, self._ends[record])
+                record += 1
+            return b"".join(data)
+
+    def chunk_times(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Stream offset of the end and wall-clock time of each chunk read, empty for plain captures"""
+        if not self.timed:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0)
+        return self._ends, self._times
+
+    def packet_times(self, offsets) -> numpy.ndarray:
+        """Host time of packets, see `interpolate_times`
+
+        Args:
+            offsets (array_like): Stream offsets of the packets
+
+        Returns:
+            numpy.ndarray: Wall-clock time at which the last byte of each packet was received, NaN for plain captures
+        """
+        if not self.timed:
+            return numpy.full(len(offsets), numpy.nan)
+        return interpolate_times(offsets, self._ends, self._times, self.baudrate)
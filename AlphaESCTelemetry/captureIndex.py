@@ -0,0 +1,194 @@
+"""
+Byte-offset index of the packets of a binary capture, to decode a window without decoding the whole file.
+
+The index is stored next to the capture, as `<file>.bin.idx`. It maps the packet number (row of
+`decode_binary`), the unwrapped `baleNumber` and the host time (from the timestamped container,
+or from the companion CSV written by captureESCTelemetry when available) to the offset of each
+valid packet in the raw byte stream.
+
+Usage:
+    python captureIndex.py ./file.bin
+"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import Optional, Tuple
+
+import numpy
+import pandas
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_PACKET_SIZE, unwrap_bale_number
+from AlphaESCTelemetry.captureSession import capture_stat, open_capture
+from AlphaESCTelemetry.decodeESCTelemetry import DECODER_VERSION, decode_bytes, iter_located_packets
+
+
+class CaptureIndex:
+    """Byte offset, unwrapped baleNumber and host time of every valid packet of a capture"""
+
+    def __init__(self, offset: numpy.ndarray, bale: numpy.ndarray, time: numpy.ndarray, source: Tuple[int, int]) -> None:
+        """CaptureIndex initialization, see `build` and `load`.
+
+        Args:
+            offset (numpy.ndarray): Stream offset of each packet
+            bale (numpy.ndarray): Unwrapped baleNumber of each packet
+            time (numpy.ndarray): Host time of each packet, NaN when unknown
+            source (tuple): Size and modification time (ns) of the indexed file, or session
+        """
+        self.offset = offset
+        self.bale = bale
+        self.time = time
+        self.source = source
+
+    def __len__(self) -> int:
+        return len(self.offset)
+
+    @staticmethod
+    def _source(file_path: str) -> Tuple[int, int]:
+        return capture_stat(file_path)
+
+    @classmethod
+    def build(cls, file_path: str) -> "CaptureIndex":
+        """Index a binary capture
+
+        Args:
+            file_path (str): File path to the binary file or session manifest
+
+        Returns:
+            CaptureIndex: Index of the capture
+        """
+        reader = open_capture(file_path)
+        offsets, bales = [numpy.empty(0, dtype=numpy.int64)], [numpy.empty(0, dtype=numpy.int64)]
+        for offset, decoded in iter_located_packets(file_path):
+            offsets.append(offset)
+            bales.append(decoded["baleNumber"])
+        offset = numpy.concatenate(offsets)
+        bale = unwrap_bale_number(numpy.concatenate(bales))
+
+        # Host time of the packets from the container, or from the companion CSV matched by baleNumber
+        time = reader.packet_times(offset)
+        csv_file = file_path.replace(".bin", ".csv")
+        if not reader.timed and csv_file != file_path and os.path.isfile(csv_file) and len(bale):
+            csv = pandas.read_csv(csv_file, usecols=lambda key: key in ("time", "baleNumber"), dtype=float)
+            if "time" in csv and len(csv):
+                csv_bale = unwrap_bale_number(csv["baleNumber"].to_numpy())
+                csv_bale += int(numpy.round((bale[0] - csv_bale[0]) / 65536)) << 16  # Same wrap count
+                order = numpy.argsort(csv_bale, kind="stable")
+                found = numpy.searchsorted(csv_bale[order], bale).clip(0, len(csv_bale) - 1)
+                match = csv_bale[order][found] == bale
+                time[match] = csv["time"].to_numpy()[order][found[match]]
+
+        return cls(offset, bale, time, cls._source(file_path))
+
+    def save(self, index_path: str) -> None:
+        """Save the index to a sidecar file"""
+        with open(index_path, "wb") as f:
+            numpy.savez(
+                f,
+                offset=self.offset,
+                bale=self.bale,
+                time=self.time,
+                source=numpy.array(self.source, dtype=numpy.int64),
+                version=numpy.array(DECODER_VERSION),
+            )
+
+    @classmethod
+    def load(cls, file_path: str, rebuild: bool = False) -> "CaptureIndex":
+        """Load the index of a capture from its sidecar file, (re)building it when missing or stale
+
+        Args:
+            file_path (str): File path to the binary file or session manifest
+            rebuild (bool, optional): Always rebuild the index. Defaults to False.
+
+        Returns:
+            CaptureIndex: Index of the capture
+        """
+        index_path = file_path + ".idx"
+        if not rebuild and os.path.isfile(index_path):
+            with numpy.load(index_path) as data:
+                index = cls(data["offset"], data["bale"], data["time"], tuple(data["source"].tolist()))
+                if index.source == cls._source(file_path) and data["version"] == DECODER_VERSION:
+                    return index
+            logging.info("Index outdated, rebuilding: {}".format(index_path))
+
+        index = cls.build(file_path)
+        index.save(index_path)
+        return index
+
+    def select(
+        self, start: Optional[float] = None, stop: Optional[float] = None, by: Optional[str] = "frame"
+    ) -> Tuple[int, int]:
+        """Range of packets within [start, stop)
+
+        Args:
+            start (float, optional): First value included. Defaults to the start of the capture.
+            stop (float, optional): First value excluded. Defaults to the end of the capture.
+            by (str, optional): Key of the range: "frame" (packet number), "bale" (unwrapped baleNumber),
+                "time" (host time) or "elapsed" (seconds since the first timed packet), or None for "elapsed"
+                when the capture has host times and "frame" otherwise. Defaults to "frame".
+
+        Returns:
+            tuple: First and last (excluded) packet numbers
+        """
+        if by is None:
+            by = "frame" if numpy.isnan(self.time).all() else "elapsed"
+        if by == "frame":
+            key = numpy.arange(len(self))
+        elif by == "bale":
+            key = numpy.maximum.accumulate(self.bale)
+        elif by in ("time", "elapsed"):
+            if numpy.isnan(self.time).all():
+                raise ValueError("Capture has no host time, select packets by frame or bale instead")
+            # Packets without time inherit the time of the previous one
+            key = numpy.fmax.accumulate(self.time)
+            key[numpy.isnan(key)] = key[numpy.isfinite(key)][0]
+            if by == "elapsed":
+                key = key - key[0]
+        else:
+            raise ValueError("Unknown index key: {}".format(by))
+
+        first = 0 if start is None else int(numpy.searchsorted(key, start, side="left"))
+        last = len(self) if stop is None else int(numpy.searchsorted(key, stop, side="left"))
+        return first, max(first, last)
+
+
+def decode_window(
+    file_path: str, start: Optional[float] = None, stop: Optional[float] = None, by: Optional[str] = "frame", poles=21
+) -> pandas.DataFrame:
+    """Decode only the packets of a capture within [start, stop), seeking with its index
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        start (float, optional): First value included. Defaults to the start of the capture.
+        stop (float, optional): First value excluded. Defaults to the end of the capture.
+        by (str, optional): Key of the range, see `CaptureIndex.select`. Defaults to "frame".
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+
+    Returns:
+        pandas.DataFrame: Same rows as `decode_binary`, plus the host "time" column when known
+    """
+    index = CaptureIndex.load(file_path)
+    first, last = index.select(start, stop, by)
+    if first == last:
+        return pandas.DataFrame()
+
+    # The scan started on a packet follows the same packets as the scan of the whole file
+    df = decode_bytes(open_capture(file_path).read(index.offset[first], index.offset[last - 1] + ALPHA_ESC_PACKET_SIZE), poles)
+
+    if not numpy.isnan(index.time[first:last]).all():
+        df.insert(0, "time", index.time[first:last])
+    return df
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Build the byte-offset index of binary captures")
+    ap.add_argument("bin_files", type=str, nargs="+", help="Binary files to index.")
+    args = ap.parse_args()
+
+    for bin_file in args.bin_files:
+        if not os.path.isfile(bin_file):
+            print("Error: file `{}` does not exist".format(bin_file))
+            sys.exit(1)
+        index = CaptureIndex.load(bin_file, rebuild=True)
+        print("{}: {} packets indexed".format(bin_file, len(index)))
@@ -0,0 +1,285 @@
+"""
+Capture sessions: the output of a capture split in segments, rotated by size or duration, and
+listed in order by a JSON manifest. The decoders read a session as one raw byte stream.
+
+The manifest `<session>.json` is rewritten atomically whenever a segment is opened or closed:
+    {
+        "version": 1,
+        "timed": true,          # Segments in the timestamped container format (see captureFormat)
+        "closed": false,        # The capture is over
+        "segments": [{"bin": "<session>_0000.bin", "csv": "<session>_0000.csv", "start": 1700000000.0,
+                      "stop": 1700000600.0, "size": 1152000}, ...]
+    }
+File names are relative to the manifest, times are wall-clock times, sizes count raw bytes.
+After a crash, the size of the last segment is stale: the readers rely on the files themselves.
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD
+from AlphaESCTelemetry.captureCompression import CompressedWriter
+from AlphaESCTelemetry.captureFormat import CaptureReader, CaptureWriter, interpolate_times
+
+SESSION_VERSION = 1
+FSYNC_POLICIES = ("never", "segment", "batch")
+
+
+def is_session(file_path: str) -> bool:
+    """Whether a file is the manifest of a capture session"""
+    if not file_path.endswith(".json") or not os.path.isfile(file_path):
+        return False
+    try:
+        return "segments" in load_manifest(file_path)
+    except ValueError:
+        return False
+
+
+def load_manifest(file_path: str) -> dict:
+    """Read the manifest of a session"""
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def session_files(file_path: str) -> List[str]:
+    """Binary files holding the raw stream of a capture, in order: the segments of a session, or the file itself"""
+    if not is_session(file_path):
+        return [file_path]
+    directory = os.path.dirname(file_path)
+    return [os.path.join(directory, segment["bin"]) for segment in load_manifest(file_path)["segments"]]
+
+
+def capture_stat(file_path: str) -> Tuple[int, int]:
+    """Total size and last modification time (ns) of the files of a capture or session"""
+    files = [file_path] + (session_files(file_path) if is_session(file_path) else [])
+    stats = [os.stat(path) for path in files]
+    return sum(stat.st_size for stat in stats), max(stat.st_mtime_ns for stat in stats)
+
+
+class SessionReader:
+    """Logical raw byte stream of a session, see CaptureReader"""
+
+    def __init__(self, file_path: str) -> None:
+        """SessionReader initialization, indexes the segments.
+
+        Args:
+            file_path (str): File path to the session manifest
+        """
+        self.file_path = file_path
+        self.segments = [CaptureReader(path) for path in session_files(file_path)]
+        self.timed = bool(self.segments) and all(segment.timed for segment in self.segments)
+        self.baudrate = self.segments[0].baudrate if self.segments else ALPHA_ESC_BAUD
+        # Stream offset of the start of each segment, and of the end of the stream
+        self._starts = numpy.concatenate(([0], numpy.cumsum([segment.size for segment in self.segments], dtype=numpy.int64)))
+        self.size = int(self._starts[-1])
+
+    def iter_blocks(self, block_size: int = 1 << 22) -> Iterator[bytes]:
+        """Read the stream sequentially, segment after segment, see `CaptureReader.iter_blocks`"""
+        for segment in self.segments:
+            yield from segment.iter_blocks(block_size)
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> bytes:
+        """Read the bytes [start, stop) of the stream"""
+        stop = self.size if stop is None else min(stop, self.size)
+        data = []
+        for segment, first, last in zip(self.segments, self._starts[:-1], self._starts[1:]):
+            if start < last and stop > first:
+                data.append(segment.read(max(start, first) - first, min(stop, last) - first))
+        return b"".join(data)
+
+    def chunk_times(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Stream offset of the end and wall-clock time of each chunk read, empty when not timed"""
+        if not self.timed:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0)
+        chunks = [segment.chunk_times() for segment in self.segments]
+        ends = numpy.concatenate([ends + first for (ends, _), first in zip(chunks, self._starts)])
+        return ends, numpy.concatenate([times for _, times in chunks])
+
+    def packet_times(self, offsets) -> numpy.ndarray:
+        """Host time of packets, see `interpolate_times`"""
+        if not self.timed:
+            return numpy.full(len(offsets), numpy.nan)
+        return interpolate_times(offsets, *self.chunk_times(), self.baudrate)
+
+
+def open_capture(file_path: str) -> Union[CaptureReader, SessionReader]:
+    """Raw byte stream of a binary capture, timestamped container or session"""
+    return SessionReader(file_path) if is_session(file_path) else CaptureReader(file_path)
+
+
+class _SegmentText:
+    """Text output of a session, rotated with the raw output.
+
+    The first line written (the CSV header) is repeated at the top of every segment.
+    """
+
+    def __init__(self, session: "SessionWriter") -> None:
+        self.session = session
+        self.header: Optional[str] = None
+
+    def write(self, text: str) -> None:
+        if self.header is None:
+            self.header = text.partition("\n")[0] + "\n"
+        self.session._csv.write(text)
+
+    def flush(self) -> None:
+        self.session._csv.flush()
+        if self.session.fsync == "batch":
+            os.fsync(self.session._csv.fileno())
+
+
+class SessionWriter:
+    """Raw (and decoded) output of a capture, split in segments listed by a manifest.
+
+    Has the interface of a CaptureWriter, and `csv_file` for the decoded output, so that
+    both can be given to a CaptureEngine.
+    """
+
+    def __init__(
+        self,
+        manifest_path: str,
+        max_bytes: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        fsync: str = "segment",
+        timed: bool = True,
+        csv: bool = True,
+        compress: Optional[str] = None,
+        baudrate: int = ALPHA_ESC_BAUD,
+        origin: Optional[float] = None,
+    ) -> None:
+        """SessionWriter initialization, opens the first segment.
+
+        Args:
+            manifest_path (str): File path to the session manifest, segments are written next to it
+            max_bytes (int, optional): Raw bytes per segment. Defaults to None (no limit).
+            max_seconds (float, optional): Duration of a segment. Defaults to None (no limit).
+            fsync (str, optional): When the data is forced to disk: "never" (left to the OS),
+                "segment" (when a segment is closed) or "batch" (every flush). Defaults to "segment".
+            timed (bool, optional): Write the timestamped container format. Defaults to True.
+            csv (bool, optional): Also write a CSV segment with each raw segment. Defaults to True.
+            compress (str, optional): Compress the raw segments, with "zlib" or "lzma" (see captureCompression).
+                Defaults to None.
+            baudrate (int, optional): Baudrate of the serial link. Defaults to ALPHA_ESC_BAUD.
+            origin (float, optional): Wall-clock time of the origin of the monotonic clock. Defaults to now.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError("Unknown fsync policy: {}".format(fsync))
+        self.manifest_path = manifest_path
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.fsync = fsync
+        self.timed = timed
+        self.compress = compress
+        self.baudrate = baudrate
+        self.origin = time.time() - time.monotonic() if origin is None else origin
+        self.csv_file = _SegmentText(self) if csv else None
+        self.segments: List[dict] = []
+        self.closed = False
+
+        self._file = None  # Raw segment file, under the compression layer
+        self._bin = None
+        self._csv = None
+        self._writer: Optional[CaptureWriter] = None
+        self._opened_ns = 0
+        self._open_segment(time.monotonic_ns())
+
+    def _segment_path(self, extension: str) -> str:
+        return "{}_{:04d}{}".format(os.path.splitext(self.manifest_path)[0], len(self.segments), extension)
+
+    def _open_segment(self, timestamp_ns: int) -> None:
+        segment = {"bin": os.path.basename(self._segment_path(".bin"))}
+        self._file = self._bin = open(self._segment_path(".bin"), "wb")
+        if self.compress is not None:
+            self._bin = CompressedWriter(self._file, self.compress)
+        if self.timed:
+            self._writer = CaptureWriter(self._bin, self.baudrate, self.origin)
+        if self.csv_file is not None:
+            segment["csv"] = os.path.basename(self._segment_path(".csv"))
+            self._csv = open(self._segment_path(".csv"), "w+")
+            if self.csv_file.header is not None:
+                self._csv.write(self.csv_file.header)
+        segment.update(start=self.origin + timestamp_ns / 1e9, stop=self.origin + timestamp_ns / 1e9, size=0)
+        self.segments.append(segment)
+        self._opened_ns = timestamp_ns
+        self._write_manifest()
+
+    def _close_segment(self) -> None:
+        if isinstance(self._bin, CompressedWriter):
+            self._bin.close()
+        for f in (self._file, self._csv):
+            if f is not None:
+                f.flush()
+                if self.fsync != "never":
+                    os.fsync(f.fileno())
+                f.close()
+        self._file = self._bin = self._csv = self._writer = None
+
+    def _write_manifest(self) -> None:
+        """Replace the manifest atomically"""
+        manifest = {"version": SESSION_VERSION, "timed": self.timed, "closed": self.closed, "segments": self.segments}
+        directory = os.path.dirname(os.path.abspath(self.manifest_path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+            json.dump(manifest, f, indent=4)
+            f.flush()
+            if self.fsync != "never":
+                os.fsync(f.fileno())
+        os.replace(f.name, self.manifest_path)
+
+    def _rotate(self, timestamp_ns: int) -> None:
+        self._close_segment()
+        self._open_segment(timestamp_ns)
+
+    def write(self, data: bytes, timestamp_ns: Optional[int] = None) -> None:
+        """Write one chunk, see `CaptureWriter.write`"""
+        self.write_chunks([(time.monotonic_ns() if timestamp_ns is None else timestamp_ns, data)])
+
+    def write_chunks(self, chunks: Iterable[Tuple[int, bytes]]) -> None:
+        """Write a batch of (time.monotonic_ns(), raw bytes) chunks, in a new segment when a limit is reached
+
+        Segments are only rotated between batches, so that the CSV rows written after a batch (see
+        CaptureEngine) go to the segment of its chunks. A segment may exceed its limits by one batch.
+        """
+        batch = [(timestamp_ns, data) for timestamp_ns, data in chunks if data]
+        if not batch:
+            return
+        size = sum(len(data) for _, data in batch)
+        segment = self.segments[-1]
+        if segment["size"] and (
+            (self.max_bytes is not None and segment["size"] + size > self.max_bytes)
+            or (self.max_seconds is not None and batch[0][0] - self._opened_ns >= self.max_seconds * 1e9)
+        ):
+            self._rotate(batch[0][0])
+            segment = self.segments[-1]
+        self._write_batch(batch)
+        segment["size"] += size
+        segment["stop"] = self.origin + batch[-1][0] / 1e9
+
+    def _write_batch(self, batch: List[Tuple[int, bytes]]) -> None:
+        if self._writer is not None:
+            self._writer.write_chunks(batch)
+        else:
+            self._bin.write(b"".join(data for _, data in batch))
+
+    def flush(self) -> None:
+        self._bin.flush()
+        if self.fsync == "batch":
+            os.fsync(self._bin.fileno())
+
+    def close(self) -> None:
+        """Close the last segment and mark the session as complete"""
+        if self.closed:
+            return
+        self._close_segment()
+        self.closed = True
+        self._write_manifest()
+
+    def __enter__(self) -> "SessionWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
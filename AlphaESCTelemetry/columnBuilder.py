@@ -0,0 +1,80 @@
+"""
+Growable column store used to accumulate decoded telemetry packets before building a table.
+"""
+
+from typing import Dict, Mapping, Sequence, Union
+
+import numpy
+import pandas
+
+
+class ColumnBuilder:
+    """Preallocated, growable table with one typed array per field"""
+
+    def __init__(self, dtype: Union[numpy.dtype, Sequence], capacity: int = 4096) -> None:
+        """ColumnBuilder initialization.
+
+        Args:
+            dtype (numpy.dtype): Structured dtype describing the fields, e.g. telemetry_dtype()
+            capacity (int, optional): Initial number of rows allocated. Defaults to 4096.
+        """
+        self.dtype = numpy.dtype(dtype)
+        self.fields = self.dtype.names
+        self._size = 0
+        self._capacity = max(1, capacity)
+        self._columns = {key: numpy.empty(self._capacity, dtype=self.dtype[key]) for key in self.fields}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, size: int) -> None:
+        """Grow every column so that it can hold `size` rows"""
+        if size <= self._capacity:
+            return
+        while self._capacity < size:
+            self._capacity *= 2
+        for key, column in self._columns.items():
+            grown = numpy.empty(self._capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            self._columns[key] = grown
+
+    def append(self, row: Union[Mapping, Sequence]) -> None:
+        """Append one row
+
+        Args:
+            row (Mapping or Sequence): Values keyed by field name, or listed in field order
+        """
+        self._reserve(self._size + 1)
+        if isinstance(row, Mapping):
+            for key in self.fields:
+                self._columns[key][self._size] = row[key]
+        else:
+            for key, value in zip(self.fields, row):
+                self._columns[key][self._size] = value
+        self._size += 1
+
+    def extend(self, rows: Union[numpy.ndarray, Mapping]) -> None:
+        """Append a batch of rows
+
+        Args:
+            rows (numpy.ndarray or Mapping): Structured array, or arrays keyed by field name
+        """
+        count = len(rows) if isinstance(rows, numpy.ndarray) else len(rows[self.fields[0]])
+        self._reserve(self._size + count)
+        for key in self.fields:
+            self._columns[key][self._size : self._size + count] = rows[key]
+        self._size += count
+
+    def clear(self) -> None:
+        """Drop all rows, keeping the allocated memory"""
+        self._size = 0
+
+    def columns(self) -> Dict[str, numpy.ndarray]:
+        """Views on the filled part of each column"""
+        return {key: column[: self._size] for key, column in self._columns.items()}
+
+    def to_dataframe(self) -> pandas.DataFrame:
+        """Build the table. An empty builder gives an empty DataFrame, without columns."""
+        if self._size == 0:
+            return pandas.DataFrame()
+        return pandas.DataFrame({key: column[: self._size].copy() for key, column in self._columns.items()})
@@ -0,0 +1,149 @@
+"""
+Persistent cache of decoded binary captures, so that reopening a capture does not decode it again.
+
+Decoded tables are stored as .npz files in a cache directory (ALPHA_ESC_CACHE_DIR environment
+variable, ~/.cache/AlphaESCTelemetry by default). The least recently used entries are evicted
+when the cache grows above its size limit.
+
+Usage:
+    python decodeCache.py --clear [./file.bin ...]
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import numpy
+import pandas
+
+from AlphaESCTelemetry.captureSession import capture_stat, session_files
+from AlphaESCTelemetry.decodeESCTelemetry import DECODER_VERSION, decode_binary
+
+CACHE_DIR = os.environ.get("ALPHA_ESC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "AlphaESCTelemetry"))
+CACHE_MAX_BYTES = 1 << 30  # 1 GiB
+
+
+def _file_prefix(file_path: str, poles: Optional[int] = None) -> str:
+    """Prefix shared by all the cache entries of a capture, or of a capture decoded with `poles`"""
+    prefix = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16] + "-"
+    return prefix if poles is None else "{}{}-".format(prefix, poles)
+
+
+def cache_key(file_path: str, poles=21, content_hash: bool = False) -> str:
+    """Name of the cache entry of a capture
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        content_hash (bool, optional): Hash the file content (of every segment of a session) instead
+            of using its modification time. Defaults to False.
+
+    Returns:
+        str: Cache entry file name
+    """
+    size, mtime_ns = capture_stat(file_path)
+    key = hashlib.sha1("{}|{}|{}".format(size, poles, DECODER_VERSION).encode())
+    if content_hash:
+        for path in session_files(file_path):
+            with open(path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    key.update(chunk)
+    else:
+        key.update(str(mtime_ns).encode())
+    return "{}{}.npz".format(_file_prefix(file_path, poles), key.hexdigest()[:16])
+
+
+def evict(cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """Remove the least recently used entries until the cache fits in `max_bytes`"""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(".npz")]
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+
+
+def invalidate(file_path: Optional[str] = None, cache_dir: str = CACHE_DIR, poles: Optional[int] = None) -> int:
+    """Remove the cache entries of a capture, or the whole cache
+
+    Args:
+        file_path (str, optional): File path to the binary file. Defaults to None (every entry).
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        poles (int, optional): Only remove the entries of the capture decoded with this number of
+            poles. Defaults to None (every entry of the capture).
+
+    Returns:
+        int: Number of entries removed
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    prefix = "" if file_path is None else _file_prefix(file_path, poles)
+    removed = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith(prefix) and entry.name.endswith(".npz"):
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def decode_binary_cached(
+    file_path: str,
+    poles=21,
+    cache_dir: str = CACHE_DIR,
+    max_bytes: int = CACHE_MAX_BYTES,
+    content_hash: bool = False,
+) -> pandas.DataFrame:
+    """Same as `decode_binary`, loading the result from the cache when the capture has already been decoded
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        max_bytes (int, optional): Size limit of the cache. Defaults to CACHE_MAX_BYTES.
+        content_hash (bool, optional): Identify the capture by its content. Defaults to False.
+
+    Returns:
+        pandas.DataFrame: One row per valid packet
+    """
+    entry = os.path.join(cache_dir, cache_key(file_path, poles, content_hash))
+
+    if os.path.isfile(entry):
+        logging.debug("Loading decoded capture from cache: {}".format(entry))
+        os.utime(entry)  # Mark as recently used
+        with numpy.load(entry) as columns:
+            return pandas.DataFrame({key: columns[key] for key in columns.files})
+
+    df = decode_binary(file_path, poles=poles)
+
+    # Drop stale entries of this capture (the other numbers of poles stay valid), then write the new one atomically
+    invalidate(file_path, cache_dir, poles)
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as f:
+        numpy.savez(f, **{key: df[key].to_numpy() for key in df.columns})
+    os.replace(f.name, entry)
+    evict(cache_dir, max_bytes)
+
+    return df
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Manage the cache of decoded binary captures")
+    ap.add_argument("files", type=str, nargs="*", help="Captures whose entries are removed. All entries by default.")
+    ap.add_argument("--clear", action="store_true", required=True, help="Remove cache entries.")
+    ap.add_argument("--cache-dir", type=str, dest="cache_dir", default=CACHE_DIR, help="Cache directory.")
+    args = ap.parse_args()
+
+    if args.files:
+        removed = sum(invalidate(file_path, args.cache_dir) for file_path in args.files)
+    else:
+        removed = invalidate(cache_dir=args.cache_dir)
+    print("Removed {} cache entries from {}".format(removed, args.cache_dir))
+    sys.exit(0)
@@ -1,27 +1,436 @@
 """
 Decode an existing binary files containing raw telemetry packets capture from an Alpha T-Motor ESC
 
+The command line decodes with the parser of the capture (`FeedDecoder`, the state machine of
+AlphaTelemetry.feed), whatever the container, the number of jobs or --follow, and writes the
+same CSV as captureESCTelemetry.
+
 Usage:
     python decodeESCTelemetry.py ./file.bin
 """
 
 import argparse
+import concurrent.futures
+import glob
+import io
+import logging
+import mmap
 import os
 import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy
 import pandas
 
-from AlphaESCTelemetry.alphaTelemetry import AlphaTelemetry
+from AlphaESCTelemetry.alphaTelemetry import (
+    ALPHA_ESC_B1,
+    ALPHA_ESC_B2,
+    ALPHA_ESC_BAUD,
+    ALPHA_ESC_INITIAL_VALUE,
+    ALPHA_ESC_PACKET_SIZE,
+    AlphaTelemetry,
+    find_feed_frames,
+    find_frames,
+    telemetry_dtype,
+)
+from AlphaESCTelemetry.captureCompression import COMPRESSED_MAGIC, BlockParser, is_compressed, open_file
+from AlphaESCTelemetry.captureFormat import CAPTURE_MAGIC, CaptureParser, CaptureReader, interpolate_times, is_capture
+from AlphaESCTelemetry.captureSession import is_session, load_manifest, open_capture, session_files
+from AlphaESCTelemetry.columnBuilder import ColumnBuilder
+from AlphaESCTelemetry.telemetryTable import TABLE_FORMATS, csv_table, resolve_format, table_format, write_csv, write_table
+
+# Bump when the decoded output changes, to invalidate the cached results (see decodeCache)
+DECODER_VERSION = 2
+
+
+def _decode_packets(buf: numpy.ndarray, offsets: numpy.ndarray, poles) -> Tuple[numpy.ndarray, numpy.ndarray, int]:
+    """Decode the packets found at `offsets` and keep the valid ones
+
+    Returns:
+        tuple: Offsets of the valid packets, the valid packets and the number of packets with a wrong checksum
+    """
+    frames = buf[offsets[:, None] + numpy.arange(ALPHA_ESC_PACKET_SIZE)]
+    checked = offsets[_valid_checksums(frames)]
+
+    decoded = AlphaTelemetry.decodeFrames(frames, poles)
+    initial = decoded["initialValue"] == ALPHA_ESC_INITIAL_VALUE
+    return checked[initial], decoded[initial], offsets.size - checked.size
+
+
+def _valid_checksums(frames: numpy.ndarray) -> numpy.ndarray:
+    """Packets of a (N, ALPHA_ESC_PACKET_SIZE) array with a valid checksum, to keep track of their offsets"""
+    checksums = (frames[:, 23].astype(numpy.int64) << 8) + frames[:, 22]
+    return checksums == frames[:, : ALPHA_ESC_PACKET_SIZE - 2].sum(axis=1, dtype=numpy.int64)
+
+
+def _decode_fed_packets(buf: numpy.ndarray, offsets: numpy.ndarray, first, poles) -> Tuple[numpy.ndarray, numpy.ndarray, int]:
+    """Decode the packets of the state machine found at `offsets`, see `FeedDecoder`
+
+    Args:
+        first: First byte of each packet, as stored by the state machine
+
+    Returns:
+        tuple: Offsets of the valid packets, the valid packets and the number of packets with a wrong checksum
+    """
+    frames = buf[offsets[:, None] + numpy.arange(ALPHA_ESC_PACKET_SIZE)]
+    frames[:, 0] = first
+    valid = offsets[_valid_checksums(frames)]
+    return valid, AlphaTelemetry.decodeFrames(frames, poles, integer_only=False), offsets.size - valid.size
+
+
+def _log_rejected(rejected: int, file_path: str) -> None:
+    """Report the packets dropped by a whole decode, once"""
+    if rejected:
+        logging.warning("Checksum differs for {} packet(s) of {}".format(rejected, file_path))
+
+
+def decode_bytes(data, poles=21) -> pandas.DataFrame:
+    """Decode a whole raw capture buffer with array operations.
+
+    Produces the same table as the per-packet loop of `decode_binary`.
+
+    Args:
+        data: Raw capture (bytes, bytearray, memoryview, mmap or uint8 array)
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+
+    Returns:
+        pandas.DataFrame: One row per valid packet
+    """
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    _, decoded, _ = _decode_packets(buf, find_frames(buf), poles)
+    if len(decoded) == 0:
+        return pandas.DataFrame()
+    return pandas.DataFrame(decoded)
+
+
+def _iter_located(reader, poles, chunk_size: int) -> Iterator[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Scan the stream of a capture (see `open_capture`) chunk by chunk, see `iter_located_packets`"""
+    decoder = StreamDecoder(poles)
+    for block in reader.iter_blocks(chunk_size):
+        offsets, decoded = decoder.decode_located(block)
+        if len(decoded):
+            yield offsets, decoded
+    offsets, decoded = decoder.decode_located(b"", final=True)
+    if len(decoded):
+        yield offsets, decoded
+    _log_rejected(decoder.rejected, reader.file_path)
+
+
+def iter_located_packets(file_path: str, poles=21, chunk_size: int = 1 << 22) -> Iterator[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Same as `iter_packets`, also yielding the offset of each packet in the raw byte stream
+
+    The offsets are file offsets for uncompressed plain captures, see `CaptureReader.read`. The
+    segments of a session are scanned as one stream.
+
+    Yields:
+        tuple: Stream offsets of the valid packets of each chunk and the valid packets
+    """
+    yield from _iter_located(open_capture(file_path), poles, chunk_size)
+
+
+def iter_packets(file_path: str, poles=21, chunk_size: int = 1 << 22) -> Iterator[numpy.ndarray]:
+    """Read a binary file and decode it chunk by chunk.
+
+    Packets straddling two chunks are decoded once, with the chunk they start in. Plain
+    captures, timestamped containers (see captureFormat) and session manifests (see
+    captureSession) are accepted.
+
+    Args:
+        file_path (str): File path to the binary file
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        chunk_size (int, optional): Number of bytes scanned per chunk. Defaults to 4 MiB.
+
+    Yields:
+        numpy.ndarray: Valid packets of each chunk, as a structured array of telemetry_dtype()
+    """
+    for _, decoded in iter_located_packets(file_path, poles, chunk_size):
+        yield decoded
+
+
+def iter_binary(file_path: str, poles=21, chunk_size: int = 1 << 22) -> Iterator[pandas.DataFrame]:
+    """Decode a binary file in bounded memory, see `iter_packets`.
+
+    Args:
+        file_path (str): File path to the binary file
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        chunk_size (int, optional): Number of bytes scanned per chunk. Defaults to 4 MiB.
+
+    Yields:
+        pandas.DataFrame: Valid packets of each chunk, with the host "time" column for timestamped captures
+    """
+    reader = open_capture(file_path)
+    for offsets, decoded in _iter_located(reader, poles, chunk_size):
+        df = pandas.DataFrame(decoded)
+        if reader.timed:
+            df.insert(0, "time", reader.packet_times(offsets))
+        yield df
+
+
+class StreamDecoder:
+    """Incremental bulk decoder: feed raw bytes as they come, get the packets completed so far.
+
+    Keeps the tail of the data (partial packet, pending header) between calls, and decodes
+    the same packets as `decode_binary` on the concatenated data.
+    """
+
+    def __init__(self, poles=21) -> None:
+        """StreamDecoder initialization.
+
+        Args:
+            poles (int, optional): Number of poles of the motor. Defaults to 21.
+        """
+        self.poles = poles
+        self.position = 0  # Stream offset of the first pending byte
+        self.rejected = 0  # Packets dropped for a wrong checksum
+        self._pending = b""
+
+    def decode_located(self, data: bytes, final: bool = False) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Same as `decode`, also returning the offset of each packet in the stream
+
+        Returns:
+            tuple: Stream offsets of the valid packets and the valid packets
+        """
+        buf = numpy.frombuffer(self._pending + bytes(data), dtype=numpy.uint8)
+        # A packet can only be decoded once all its bytes are there
+        stop = buf.size if final else max(0, buf.size - (ALPHA_ESC_PACKET_SIZE - 1))
+        offsets = find_frames(buf, stop)
+
+        resume = buf.size if final else max(stop, offsets[-1] + ALPHA_ESC_PACKET_SIZE) if offsets.size else stop
+        self._pending = buf[resume:].tobytes()
+        valid, decoded, rejected = _decode_packets(buf, offsets, self.poles)
+        self.rejected += rejected
+        valid += self.position
+        self.position += resume
+        return valid, decoded
+
+    def decode(self, data: bytes, final: bool = False) -> numpy.ndarray:
+        """Decode the packets completed by `data`
+
+        Args:
+            data (bytes): Raw bytes following the previous call
+            final (bool, optional): No more data will come, flush the pending bytes. Defaults to False.
+
+        Returns:
+            numpy.ndarray: Valid packets, as a structured array of telemetry_dtype()
+        """
+        return self.decode_located(data, final)[1]
+
+
+class FeedDecoder:
+    """Incremental bulk counterpart of `AlphaTelemetry.feed`, the parser of the capture.
+
+    Decodes the same packets, with the same values (temperatures with their half degrees, no
+    check of the initialValue), as feeding the concatenated data to AlphaTelemetry.feed, with
+    array operations. Keeps the state of the state machine between calls.
+    """
+
+    def __init__(self, poles=21) -> None:
+        """FeedDecoder initialization.
+
+        Args:
+            poles (int, optional): Number of poles of the motor. Defaults to 21.
+        """
+        self.poles = poles
+        self.position = 0  # Stream offset of the first pending byte
+        self.rejected = 0  # Packets dropped for a wrong checksum
+        self._pending = b""
+        self._header = False  # The state machine has stored ALPHA_ESC_B1 as the first byte of a packet
+
+    def decode_located(self, data: bytes, final: bool = False) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Decode the packets completed by `data`
+
+        Args:
+            data (bytes): Raw bytes following the previous call
+            final (bool, optional): No more data will come, drop the partial packet. Defaults to False.
+
+        Returns:
+            tuple: Stream offsets of the valid packets and the valid packets, as a structured array
+                of telemetry_dtype(integer_only=False)
+        """
+        buf = numpy.frombuffer(self._pending + bytes(data), dtype=numpy.uint8)
+        offsets = find_feed_frames(buf)
+
+        # The state machine is idle at the start of the buffer and after each packet. The first byte
+        # of a packet stays 0 until ALPHA_ESC_B1 is received while idle.
+        idle = numpy.concatenate(([0], offsets[:-1] + ALPHA_ESC_PACKET_SIZE))[: offsets.size]
+        header = numpy.logical_or.accumulate(buf[idle] == ALPHA_ESC_B1) | self._header
+        valid, decoded, rejected = _decode_fed_packets(buf, offsets, numpy.where(header, ALPHA_ESC_B1, 0), self.poles)
+        self.rejected += rejected
+        valid += self.position
+
+        end = int(offsets[-1]) + ALPHA_ESC_PACKET_SIZE if offsets.size else 0
+        self._header = bool(header[-1]) if offsets.size else self._header
+        if final or end == buf.size:
+            resume = buf.size
+            self._pending = b""
+        else:
+            # Idle at `end`: that byte is taken as a first byte, then ALPHA_ESC_B2 is looked for
+            self._header |= bool(buf[end] == ALPHA_ESC_B1)
+            found = numpy.flatnonzero(buf[end + 1 :] == ALPHA_ESC_B2)
+            # Resume idle on the byte before the partial packet (or on the last byte), replaced by a
+            # placeholder which is not ALPHA_ESC_B1: the real byte has already been taken into account
+            resume = end + int(found[0]) if found.size else buf.size - 1
+            self._pending = b"\0" + buf[resume + 1 :].tobytes()
+        self.position += resume
+        return valid, decoded
+
+
+def _follow_raw(file_path: str, interval: float) -> Iterator[Tuple[bytes, Optional[List[Tuple[float, int]]], int]]:
+    """Raw bytes appended to a capture, or to the segments of a session in turn, see `follow_binary`
+
+    Yields:
+        tuple: Raw bytes, time and length of the chunks read for timestamped captures (None otherwise), baudrate
+    """
+    index = 0
+    while True:
+        if is_session(file_path):
+            manifest = load_manifest(file_path)
+            segments = session_files(file_path)
+            if index >= len(segments):
+                if manifest["closed"]:
+                    return
+                time.sleep(interval)
+                continue
+
+            def finished() -> bool:
+                # A segment is complete once the next one is listed, or the session closed
+                manifest = load_manifest(file_path)
+                return manifest["closed"] or len(manifest["segments"]) > index + 1
+
+            segment = segments[index]
+        else:
+            segment, finished = file_path, lambda: False
 
+        blocks: Optional[BlockParser] = None
+        parser: Optional[CaptureParser] = None
+        compressed_head = b""  # Start of the file, until its compression is known
+        head = b""  # Start of the (uncompressed) file, until the format is known
+        size = 0
+        with open(segment, "rb") as f:
+            while True:
+                data = f.read(1 << 20)
+                if not data:
+                    if os.fstat(f.fileno()).st_size < size:
+                        logging.error("File truncated, stop following: {}".format(segment))
+                        return
+                    if not finished():
+                        time.sleep(interval)
+                        continue
+                    # The segment is complete: read what was written before, then move on
+                    data = f.read()
+                    if not data:
+                        break
+                size += len(data)
 
-def decode_binary(file_path: str, verbose: bool = False, poles=21) -> pandas.DataFrame:
+                if compressed_head is not None:
+                    compressed_head += data
+                    if len(compressed_head) < len(COMPRESSED_MAGIC):
+                        continue
+                    blocks = BlockParser() if compressed_head.startswith(COMPRESSED_MAGIC) else None
+                    data, compressed_head = compressed_head, None
+                if blocks is not None:
+                    data = blocks.feed(data)
+
+                if head is not None:
+                    head += data
+                    if len(head) < len(CAPTURE_MAGIC):
+                        continue
+                    parser = CaptureParser() if head.startswith(CAPTURE_MAGIC) else None
+                    data, head = head, None
+
+                if parser is None:
+                    yield data, None, ALPHA_ESC_BAUD
+                else:
+                    chunks = parser.feed(data)
+                    lengths = [(timestamp, len(chunk)) for timestamp, chunk in chunks]
+                    yield b"".join(chunk for _, chunk in chunks), lengths, parser.baudrate
+
+        if compressed_head or head:
+            # Segment shorter than a header: plain bytes
+            yield (compressed_head or b"") + (head or b""), None, ALPHA_ESC_BAUD
+        if not is_session(file_path):
+            return
+        index += 1
+
+
+def follow_binary(file_path: str, poles=21, interval: float = 0.1) -> Iterator[pandas.DataFrame]:
+    """Decode a binary file or session while it is being written, e.g. by captureESCTelemetry.
+
+    The file is read from the start, then polled for appended bytes. Only new bytes are
+    read, and a packet is emitted as soon as its last byte is written. The segments of a
+    session are followed in turn, until the session is closed. The packets are those of
+    `decode_capture`, for the whole capture.
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        interval (float, optional): Polling period in seconds when no new bytes are available. Defaults to 0.1.
+
+    Yields:
+        pandas.DataFrame: Packets decoded from the bytes appended since the previous one, with
+            the host "time" column for timestamped captures
+    """
+    decoder = FeedDecoder(poles)
+    received = 0  # Size of the raw stream so far
+    ends, times = numpy.empty(0, dtype=numpy.int64), numpy.empty(0)
+    baudrate = ALPHA_ESC_BAUD
+    for data, chunks, baudrate in _follow_raw(file_path, interval):
+        if chunks is not None:
+            ends = numpy.concatenate((ends, received + numpy.cumsum([length for _, length in chunks], dtype=numpy.int64)))
+            times = numpy.concatenate((times, [timestamp for timestamp, _ in chunks]))
+        received += len(data)
+
+        offsets, decoded = decoder.decode_located(data)
+        if len(decoded):
+            df = pandas.DataFrame(decoded)
+            if chunks is not None:
+                df.insert(0, "time", interpolate_times(offsets, ends, times, baudrate))
+                # Only the chunks of the pending bytes, and the one before, are still needed
+                keep = max(int(numpy.searchsorted(ends, decoder.position, side="right")) - 1, 0)
+                ends, times = ends[keep:], times[keep:]
+            yield df
+
+    # Capture over: decode the remaining bytes
+    offsets, decoded = decoder.decode_located(b"", final=True)
+    if len(decoded):
+        df = pandas.DataFrame(decoded)
+        if len(ends):
+            df.insert(0, "time", interpolate_times(offsets, ends, times, baudrate))
+        yield df
+    _log_rejected(decoder.rejected, file_path)
+
+
+def decode_binary(file_path: str, verbose: bool = False, poles=21, bulk: bool = True) -> pandas.DataFrame:
+    """Decode a binary file containing raw telemetry packets
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        verbose (bool, optional): Print every decoded packet (per-packet decoding). Defaults to False.
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        bulk (bool, optional): Decode the file by chunks with array operations. Defaults to True.
+
+    Returns:
+        pandas.DataFrame: One row per valid packet, with the host "time" column for timestamped captures
+    """
     if not os.path.exists(file_path):
         sys.exit(1)
 
-    escTelemetry = {}
-    output = pandas.DataFrame()
+    reader = open_capture(file_path)
+    output = ColumnBuilder(telemetry_dtype())
+    offsets = []
+
+    if bulk and not verbose:
+        for offset, decoded in _iter_located(reader, poles, 1 << 22):
+            output.extend(decoded)
+            offsets.append(offset)
+        df = output.to_dataframe()
+        if reader.timed and len(df):
+            df.insert(0, "time", reader.packet_times(numpy.concatenate(offsets)))
+        return df
 
-    with open(file_path, "rb") as f:
+    # The per-packet decoder reads plain binary files directly
+    with open_file(file_path) if isinstance(reader, CaptureReader) and not reader.timed else io.BytesIO(reader.read()) as f:
         while byte := f.read(1):
             if byte == b"\x9b":
                 serialArray = b"\x9b" + f.read(23)
@@ -32,39 +441,184 @@ def decode_binary(file_path: str, verbose: bool = False, poles=21) -> pandas.Dat
                 # sys.stdout.flush()
 
                 # Decode
-                raw_data = AlphaTelemetry.decodeBuffer(serialArray, poles)
-                if raw_data is None:
+                frame = AlphaTelemetry.decodeBuffer(serialArray, poles)
+                if frame is None:
                     continue
 
-                escTelemetry = {}
-                escTelemetry["initialValue"] = raw_data[0]
-                escTelemetry["baleNumber"] = raw_data[1]
-                escTelemetry["rxThrottle"] = raw_data[2]
-                escTelemetry["outputThrottle"] = raw_data[3]
-                escTelemetry["rpm"] = raw_data[4]
-                escTelemetry["busbarVoltage"] = raw_data[5]
-                escTelemetry["busbarCurrent"] = raw_data[6]
-                escTelemetry["phaseWireCurrent"] = raw_data[7]
-                escTelemetry["mosfetTemp"] = raw_data[8]
-                escTelemetry["capacitorTemp"] = raw_data[9]
-                escTelemetry["statusCode"] = raw_data[10]
-                escTelemetry["fault"] = escTelemetry["statusCode"] != 0x00
-
-                if escTelemetry["initialValue"] != 18258690:
+                if frame.initialValue != ALPHA_ESC_INITIAL_VALUE:
                     continue
 
                 # Iterate over key/value pairs in dict and print them
                 if verbose:
                     print(serialArray)
-                    for key, value in escTelemetry.items():
+                    for key, value in frame._asdict().items():
                         print(key, " : ", value)
 
                     print("=" * 30)
 
-                df = pandas.DataFrame([escTelemetry])
-                output = pandas.concat([output, df], ignore_index=True)
+                output.append(frame)
+                offsets.append(f.tell() - ALPHA_ESC_PACKET_SIZE)
+
+    df = output.to_dataframe()
+    if reader.timed and len(df):
+        df.insert(0, "time", reader.packet_times(offsets))
+    return df
+
+
+def decode_capture(file_path: str, poles=21, chunk_size: int = 1 << 22) -> pandas.DataFrame:
+    """Decode a capture with the parser of the capture itself, see `FeedDecoder`
+
+    Same packets and values as the CSV written by captureESCTelemetry. Plain captures,
+    timestamped containers (see captureFormat) and session manifests (see captureSession)
+    are accepted.
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        chunk_size (int, optional): Number of bytes decoded at once. Defaults to 4 MiB.
+
+    Returns:
+        pandas.DataFrame: One row per valid packet, with the host "time" column for timestamped captures
+    """
+    reader = open_capture(file_path)
+    decoder = FeedDecoder(poles)
+    output = ColumnBuilder(telemetry_dtype(integer_only=False))
+    offsets = []
+    for block in reader.iter_blocks(chunk_size):
+        valid, decoded = decoder.decode_located(block)
+        output.extend(decoded)
+        offsets.append(valid)
+    valid, decoded = decoder.decode_located(b"", final=True)
+    output.extend(decoded)
+    offsets.append(valid)
+    _log_rejected(decoder.rejected, file_path)
+
+    df = output.to_dataframe()
+    if reader.timed and len(df):
+        df.insert(0, "time", reader.packet_times(numpy.concatenate(offsets)))
+    return df
+
+
+def _decode_shard(file_path: str, start: int, stop: int, poles) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Decode the packets of `FeedDecoder` starting in [start, stop) of a binary file, idle at `start`.
+
+    The first byte of the packets is taken as ALPHA_ESC_B1, as it is after the first packets of a capture.
+
+    Returns:
+        tuple: Offsets of all the packets scanned, offsets of the valid ones and the valid packets
+    """
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        buf = numpy.frombuffer(mm[start : stop + ALPHA_ESC_PACKET_SIZE - 1], dtype=numpy.uint8)
+    offsets = find_feed_frames(buf, stop - start)
+    valid, decoded, _ = _decode_fed_packets(buf, offsets, ALPHA_ESC_B1, poles)
+    return offsets + start, valid + start, decoded
+
+
+def decode_capture_parallel(
+    file_path: str, poles=21, jobs: Optional[int] = None, shard_size: int = 1 << 24
+) -> pandas.DataFrame:
+    """Same as `decode_capture`, on several processes.
+
+    The file is split in shards decoded independently, each one scanning from its first
+    byte. Shards are then stitched in order: when the previous shard's last packet spills
+    over, the shard is trimmed to the scan position it implies (or decoded again from
+    there in the rare case the scans do not meet), and the packets before the first
+    ALPHA_ESC_B1 stored by the state machine are decoded again, so the result is identical
+    to `decode_capture`.
+
+    Args:
+        file_path (str): File path to the binary file
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        jobs (int, optional): Number of processes. Defaults to the number of CPUs.
+        shard_size (int, optional): Number of bytes scanned per shard. Defaults to 16 MiB.
 
-    return output
+    Returns:
+        pandas.DataFrame: One row per valid packet
+    """
+    if is_capture(file_path) or is_session(file_path) or is_compressed(file_path):
+        # The shards would have to be located in the stream of records, of segments or of blocks
+        return decode_capture(file_path, poles=poles)
+
+    size = os.path.getsize(file_path)
+    bounds = [(start, min(start + shard_size, size)) for start in range(0, size, shard_size)]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        shards = list(
+            executor.map(
+                _decode_shard,
+                [file_path] * len(bounds),
+                [start for start, _ in bounds],
+                [stop for _, stop in bounds],
+                [poles] * len(bounds),
+            )
+        )
+
+    output = ColumnBuilder(telemetry_dtype(integer_only=False))
+    if size == 0:
+        return output.to_dataframe()
+
+    scanned, located = [], []
+    position = 0  # Where the serial scan is idle
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for (start, stop), (offsets, valid, decoded) in zip(bounds, shards):
+            if position >= stop:
+                continue
+            if position > start:
+                # The next packet ends with the first ALPHA_ESC_B2 after the idle byte
+                header = mm.find(bytes((ALPHA_ESC_B2,)), position + 1, stop + 1) - 1
+                if header < 0:  # No packet left in this shard
+                    offsets = valid = offsets[:0]
+                    decoded = decoded[:0]
+                elif header in offsets:
+                    decoded = decoded[valid >= header]
+                    valid = valid[valid >= header]
+                    offsets = offsets[offsets >= header]
+                else:
+                    offsets, valid, decoded = _decode_shard(file_path, position, stop, poles)
+
+            scanned.append(offsets)
+            located.append(valid)
+            output.extend(decoded)
+            position = offsets[-1] + ALPHA_ESC_PACKET_SIZE if offsets.size else position
+
+        # The first byte stays 0 until ALPHA_ESC_B1 is received while idle: decode those packets again
+        offsets = numpy.concatenate(scanned)
+        idle = numpy.concatenate(([0], offsets[:-1] + ALPHA_ESC_PACKET_SIZE))[: offsets.size]
+        header = numpy.frombuffer(mm, dtype=numpy.uint8)[idle] == ALPHA_ESC_B1
+        first = int(numpy.argmax(header)) if header.any() else offsets.size
+        if first == 0:
+            df = output.to_dataframe()
+        else:
+            end = int(offsets[first - 1]) + ALPHA_ESC_PACKET_SIZE
+            _, decoded = FeedDecoder(poles).decode_located(mm[:end], final=True)
+            df = pandas.concat(
+                (pandas.DataFrame(decoded), output.to_dataframe()[numpy.concatenate(located) >= end]), ignore_index=True
+            )
+
+    # Every packet scanned and not decoded has a wrong checksum
+    _log_rejected(offsets.size - len(df), file_path)
+    return df
+
+
+def decode_directory(directory: str, poles=21, jobs: Optional[int] = None) -> Dict[str, pandas.DataFrame]:
+    """Decode every binary file and session of a directory on several processes, see `decode_capture`
+
+    The segments of a session are decoded together, as the session.
+
+    Args:
+        directory (str): Directory containing the binary files
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        jobs (int, optional): Number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: Decoded table of each file or session manifest, sorted by file path
+    """
+    sessions = [path for path in glob.glob(os.path.join(directory, "*.json")) if is_session(path)]
+    segments = {os.path.abspath(path) for session in sessions for path in session_files(session)}
+    files = [path for path in glob.glob(os.path.join(directory, "*.bin")) if os.path.abspath(path) not in segments]
+    files = sorted(files + sessions)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(files, executor.map(decode_capture, files, [poles] * len(files))))
 
 
 if __name__ == "__main__":
@@ -93,7 +647,16 @@ if __name__ == "__main__":
         dest="out_file",
         required=False,
         default="",
-        help="Save processed data to file (CSV).",
+        help="Save processed data to file (CSV, or the format given by --format or the file extension).",
+    )
+    ap.add_argument(
+        "--format",
+        type=str,
+        choices=TABLE_FORMATS,
+        dest="format",
+        required=False,
+        default=None,
+        help="Format of the processed data. Parquet and Feather need pyarrow, npz is used otherwise. Defaults to CSV.",
     )
     ap.add_argument(
         "-p",
@@ -104,54 +667,81 @@ if __name__ == "__main__":
         default=21,
         help="Number of poles of the motor.",
     )
+    ap.add_argument(
+        "-f",
+        "--follow",
+        action="store_true",
+        dest="follow",
+        required=False,
+        default=False,
+        help="Keep decoding the bytes appended to `bin_file` while it is being captured, until interrupted.",
+    )
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        required=False,
+        default=0,
+        help="Decode with the bulk decoder on this number of processes. "
+        + "`bin_file` may then be a directory, each binary file is saved next to it as CSV (or --format).",
+    )
     args = ap.parse_args()
 
     if not os.path.exists(args.bin_file):
         print("Error: file `{}` does not exist")
         sys.exit(1)
 
-    ae = AlphaTelemetry(POLES_N=args.poles)
+    # Decoded output next to the capture by default
+    requested = args.format or table_format(args.out_file) or "csv"
+    out_format = resolve_format(requested)
+    out_file = args.out_file if args.out_file else os.path.splitext(args.bin_file)[0] + "." + out_format
+    if table_format(out_file) not in (None, out_format):
+        out_file = os.path.splitext(out_file)[0] + "." + out_format
 
-    _init = True
-    _escTelem = {}
-    with open(args.bin_file, "rb") as f_bin, open(
-        args.bin_file.replace(".bin", ".csv") if not args.out_file else args.out_file,
-        "w+",
-    ) as f_csv:
-        try:
-            while byte := f_bin.read(1):
-                ae.capture(int(byte.hex(), 16))
-
-                if ae.ready:
+    if args.follow:
+        if out_format != "csv":
+            print("Error: --follow only writes CSV output")
+            sys.exit(1)
+        with open(out_file, "w+") as f_csv:
+            header = True
+            try:
+                for df in follow_binary(args.bin_file, poles=args.poles):
                     if args.verbose:
-                        print("baleNumber       : {}".format(ae.baleNumber))
-                        print("rxThrottle       : {} %".format(ae.rxThrottle))
-                        print("outputThrottle   : {} %".format(ae.outputThrottle))
-                        print("rpm              : {} RPM".format(ae.rpm))
-                        print("busbarVoltage    : {} V".format(ae.busbarVoltage))
-                        print("busbarCurrent    : {} A".format(ae.busbarCurrent))
-                        print("phaseWireCurrent : {} A".format(ae.phaseWireCurrent))
-                        print("mosfetTemp       : {} °C".format(ae.mosfetTemp))
-                        print("capacitorTemp    : {} °C".format(ae.capacitorTemp))
-                        print("statusCode       : {}".format(ae.statusCode))
-                        print("fault            : {}".format(ae.fault))
-                        print("_____________________________")
-
-                    _escTelem["baleNumber"] = ae.baleNumber
-                    _escTelem["rxThrottle"] = ae.rxThrottle
-                    _escTelem["outputThrottle"] = ae.outputThrottle
-                    _escTelem["rpm"] = ae.rpm
-                    _escTelem["busbarVoltage"] = ae.busbarVoltage
-                    _escTelem["busbarCurrent"] = ae.busbarCurrent
-                    _escTelem["phaseWireCurrent"] = ae.phaseWireCurrent
-                    _escTelem["mosfetTemp"] = ae.mosfetTemp
-                    _escTelem["capacitorTemp"] = ae.capacitorTemp
-                    _escTelem["statusCode"] = ae.statusCode
-                    _escTelem["fault"] = int(ae.fault)
-
-                    if _init:
-                        f_csv.write(",".join(_escTelem.keys()) + "\n")
-                        _init = False
-                    f_csv.write(",".join([str(_escTelem[k]) for k in _escTelem.keys()]) + "\n")
-        except KeyboardInterrupt:
-            sys.exit(0)
+                        print(csv_table(df).to_string(header=header, index=False))
+                    write_csv(df, f_csv, header)
+                    f_csv.flush()
+                    header = False
+            except KeyboardInterrupt:
+                pass
+        sys.exit(0)
+
+    if os.path.isdir(args.bin_file):
+        if args.jobs <= 0:
+            print("Error: decoding a directory needs --jobs")
+            sys.exit(1)
+        for file_path, df in decode_directory(args.bin_file, poles=args.poles, jobs=args.jobs).items():
+            write_table(df, os.path.splitext(file_path)[0] + "." + out_format, out_format)
+        sys.exit(0)
+
+    if args.jobs > 0:
+        df = decode_capture_parallel(args.bin_file, poles=args.poles, jobs=args.jobs)
+    else:
+        df = decode_capture(args.bin_file, poles=args.poles)
+
+    if args.verbose:
+        for row in csv_table(df).itertuples(index=False):
+            print("baleNumber       : {}".format(row.baleNumber))
+            print("rxThrottle       : {} %".format(row.rxThrottle))
+            print("outputThrottle   : {} %".format(row.outputThrottle))
+            print("rpm              : {} RPM".format(row.rpm))
+            print("busbarVoltage    : {} V".format(row.busbarVoltage))
+            print("busbarCurrent    : {} A".format(row.busbarCurrent))
+            print("phaseWireCurrent : {} A".format(row.phaseWireCurrent))
+            print("mosfetTemp       : {} °C".format(row.mosfetTemp))
+            print("capacitorTemp    : {} °C".format(row.capacitorTemp))
+            print("statusCode       : {}".format(row.statusCode))
+            print("fault            : {}".format(bool(row.fault)))
+            print("_____________________________")
+
+    write_table(df, out_file, out_format)
@@ -0,0 +1,181 @@
+"""
+Loopback test of the capture pipeline, without hardware: a capture is replayed as fast as possible
+through a virtual serial link (see virtualSerial) into a CaptureEngine, which decodes it and writes
+its raw and CSV outputs, and the throughput, losses and latency of the whole chain are measured.
+
+The latency of a packet runs from its write to the link by the replay to its delivery, decoded, to
+the listeners of the engine. The packets are matched by content, so that a lost packet does not
+shift the matches of the next ones.
+
+Usage:
+    python loopbackTelemetry.py ./file.bin [--transport pty] [--out-dir DIR]
+"""
+
+import argparse
+import collections
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy
+import serial
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, AlphaTelemetry, TelemetryFrame
+from AlphaESCTelemetry.captureEngine import CaptureEngine
+from AlphaESCTelemetry.captureFormat import CaptureWriter
+from AlphaESCTelemetry.captureSession import open_capture
+from AlphaESCTelemetry.replay_telemetry import iter_frames, replay
+from AlphaESCTelemetry.virtualSerial import BytePipe, PtyPair
+
+LOOPBACK_TRANSPORTS = ("pipe", "pty")
+
+
+class _Probe:
+    """Send time of the packets written to the link, and latency of the packets decoded by the engine"""
+
+    def __init__(self, write: Callable[[bytes], object], poles: int) -> None:
+        self._write = write
+        self.parser = AlphaTelemetry(POLES_N=poles)  # Same parser as the engine
+        self.frames_sent = 0
+        self.latencies: List[float] = []
+        self._sent: Dict[TelemetryFrame, collections.deque] = collections.defaultdict(collections.deque)
+        self._last = 0.0  # Send time of the last packet matched
+        self._lock = threading.Lock()
+
+    def write(self, data: bytes) -> None:
+        frames = self.parser.feed(data)
+        with self._lock:
+            now = time.perf_counter()
+            for frame in frames:
+                self._sent[frame].append(now)
+            self.frames_sent += len(frames)
+        self._write(data)
+
+    def __call__(self, times: List[float], frames: List[TelemetryFrame]) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            for frame in frames:
+                sent = self._sent.get(frame)
+                # Packets arrive in order: the copies sent before the last match were lost
+                while sent and sent[0] < self._last:
+                    sent.popleft()
+                if sent:
+                    self._last = sent.popleft()
+                    self.latencies.append(now - self._last)
+
+
+def loopback(
+    file_path: str,
+    transport: str = "pipe",
+    poles: int = 21,
+    out_dir: Optional[str] = None,
+    max_batch: int = 1 << 12,
+    queue_size: int = 1024,
+    block: bool = False,
+) -> dict:
+    """Push a capture through replay, virtual link, capture, decoding and outputs, as fast as possible
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        transport (str, optional): "pipe" (virtualSerial.BytePipe) or "pty" (virtualSerial.PtyPair, read
+            through its device with serial.Serial). Defaults to "pipe".
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+        out_dir (str, optional): Directory of the raw and CSV outputs of the capture. Defaults to a
+            temporary directory, deleted afterwards.
+        max_batch (int, optional): Maximum bytes per write of the replay. Defaults to 4 KiB.
+        queue_size (int, optional): Queue size of the CaptureEngine. Defaults to 1024.
+        block (bool, optional): Backpressure of the CaptureEngine instead of dropping chunks. Defaults to False.
+
+    Returns:
+        dict: Bytes sent, read and dropped, packets sent and decoded, duration (s), packets and bytes
+            per second, and latency of the packets (s): median, 90th and 99th percentiles, maximum
+    """
+    if transport not in LOOPBACK_TRANSPORTS:
+        raise ValueError("Unknown transport: {}".format(transport))
+    reader = open_capture(file_path)
+
+    with contextlib.ExitStack() as stack:
+        if out_dir is None:
+            out_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        if transport == "pty":
+            link = stack.enter_context(PtyPair())
+            port = stack.enter_context(serial.Serial(link.device, ALPHA_ESC_BAUD, timeout=0.1))
+        else:
+            link = port = stack.enter_context(BytePipe())
+
+        f_bin = stack.enter_context(open(os.path.join(out_dir, "loopback.bin"), "wb"))
+        f_csv = stack.enter_context(open(os.path.join(out_dir, "loopback.csv"), "w+"))
+        engine = CaptureEngine(
+            port, poles=poles, bin_file=CaptureWriter(f_bin), csv_file=f_csv, queue_size=queue_size, block=block
+        )
+        probe = _Probe(link.write, poles)
+        engine.add_listener(probe)
+
+        start = time.perf_counter()
+        engine.start()
+        sent = replay(((0.0, data) for _, data in iter_frames(reader)), probe.write, max_batch=max_batch)
+        # Wait for the engine to read everything that went through the link
+        expected = sent["bytes"] - getattr(link, "bytes_dropped", 0)
+        last, idle = engine.bytes_read, time.perf_counter()
+        while engine.bytes_read < expected and time.perf_counter() - idle < 1.0:
+            time.sleep(0.001)
+            if engine.bytes_read != last:
+                last, idle = engine.bytes_read, time.perf_counter()
+        engine.stop()
+        duration = time.perf_counter() - start
+
+    stats = engine.stats
+    latencies = numpy.array(probe.latencies) if probe.latencies else numpy.full(1, numpy.nan)
+    return {
+        "bytes_sent": sent["bytes"],
+        "bytes_read": stats["bytes_read"],
+        # Dropped by the link or by the engine, or never read
+        "bytes_dropped": sent["bytes"] - stats["bytes_read"] + stats["bytes_dropped"],
+        "frames_sent": probe.frames_sent,
+        "frames_decoded": stats["frames_decoded"],
+        "duration": duration,
+        "frames_per_second": stats["frames_decoded"] / duration,
+        "bytes_per_second": stats["bytes_read"] / duration,
+        "latency_median": float(numpy.median(latencies)),
+        "latency_p90": float(numpy.percentile(latencies, 90)),
+        "latency_p99": float(numpy.percentile(latencies, 99)),
+        "latency_max": float(latencies.max()),
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Replay a capture through a virtual serial link into the capture pipeline, at full speed"
+    )
+    ap.add_argument("file", type=str, help="Binary capture or session manifest.")
+    ap.add_argument("-t", "--transport", type=str, choices=LOOPBACK_TRANSPORTS, default="pipe", help="Virtual serial link.")
+    ap.add_argument("-p", "--poles", type=int, dest="poles", default=21, help="Number of poles of the motor.")
+    ap.add_argument("-o", "--out-dir", type=str, default=None, help="Keep the outputs of the capture in this directory.")
+    ap.add_argument("--block", action="store_true", help="Backpressure in the capture engine instead of dropping chunks.")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.file):
+        print("Error: file `{}` does not exist".format(args.file))
+        sys.exit(1)
+
+    # The invalid packets of the capture are decoded twice (sender and engine), do not log them
+    logging.getLogger("AlphaTelemetry").setLevel(logging.CRITICAL)
+
+    result = loopback(args.file, args.transport, args.poles, args.out_dir, block=args.block)
+    print("Bytes: {} sent, {} read, {} dropped".format(result["bytes_sent"], result["bytes_read"], result["bytes_dropped"]))
+    print("Packets: {} sent, {} decoded".format(result["frames_sent"], result["frames_decoded"]))
+    print(
+        "Throughput: {:.0f} packets/s, {:.2f} MB/s in {:.2f} s".format(
+            result["frames_per_second"], result["bytes_per_second"] / 1e6, result["duration"]
+        )
+    )
+    print(
+        "Latency: median {:.2f} ms, p90 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms".format(
+            *(result[key] * 1e3 for key in ("latency_median", "latency_p90", "latency_p99", "latency_max"))
+        )
+    )
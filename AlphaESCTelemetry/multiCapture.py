@@ -0,0 +1,110 @@
+"""
+Capture of several Alpha T-Motor ESCs in one process, e.g. all the motors of a test stand.
+
+Each serial port has its own CaptureEngine, and so its own AlphaTelemetry parser and raw output.
+The reader threads spend their time blocked in the serial driver, so the CPU use stays that of
+the decoding. Every packet is tagged with the motor it comes from and the host time of its chunk,
+taken from one clock origin shared by all the ports. The decoded packets are written per ESC by
+the engines, or all together in one merged CSV file with a `motor` column.
+"""
+
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, TextIO
+
+from AlphaESCTelemetry.alphaTelemetry import TelemetryFrame
+from AlphaESCTelemetry.captureEngine import CSV_HEADER, CaptureEngine, csv_row
+
+# Header of the merged CSV output
+MERGED_CSV_HEADER = "motor," + CSV_HEADER
+
+
+class MultiCapture:
+    """One CaptureEngine per ESC, with a shared clock and an optional merged decoded output"""
+
+    def __init__(
+        self,
+        ports: Sequence,
+        motors: Optional[Sequence] = None,
+        poles: int = 21,
+        bin_files: Optional[Sequence] = None,
+        csv_files: Optional[Sequence[Optional[TextIO]]] = None,
+        merged_file: Optional[TextIO] = None,
+        origin: Optional[float] = None,
+        **kwargs,
+    ) -> None:
+        """MultiCapture initialization.
+
+        Args:
+            ports (list): Serial ports, one per ESC, see CaptureEngine
+            motors (list, optional): Identifier of the motor of each port. Defaults to 0, 1, ...
+            poles (int, optional): Number of poles of the motors. Defaults to 21.
+            bin_files (list, optional): Raw output of each port, see CaptureEngine. Defaults to None.
+            csv_files (list, optional): Decoded output of each port. Defaults to None.
+            merged_file (TextIO, optional): Decoded output of all the ports, with the motor of each packet.
+                Defaults to None.
+            origin (float, optional): Wall-clock time of the origin of the monotonic clock. Defaults to the
+                origin of the first raw output, or to now.
+            **kwargs: Other arguments of the CaptureEngines (queue_size, block, ...)
+        """
+        self.motors = list(range(len(ports))) if motors is None else list(motors)
+        bin_files = bin_files or [None] * len(ports)
+        csv_files = csv_files or [None] * len(ports)
+        if origin is None:
+            origin = getattr(bin_files[0], "origin", time.time() - time.monotonic()) if ports else 0.0
+        self.merged_file = merged_file
+        self.flush_interval = kwargs.get("flush_interval", 1.0)
+        self.listeners: List[Callable[[object, List[float], List[TelemetryFrame]], None]] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+        self.engines: Dict[object, CaptureEngine] = {}
+        for motor, port, bin_file, csv_file in zip(self.motors, ports, bin_files, csv_files):
+            engine = CaptureEngine(port, poles=poles, bin_file=bin_file, csv_file=csv_file, **kwargs)
+            engine.origin = origin  # Packet times of all the ports on the same clock
+            engine.add_listener(functools.partial(self._dispatch, motor))
+            self.engines[motor] = engine
+
+    def add_listener(self, callback: Callable[[object, List[float], List[TelemetryFrame]], None]) -> None:
+        """Call `callback(motor, times, frames)` for every chunk holding packets, from the writer thread of the port"""
+        self.listeners.append(callback)
+
+    def _dispatch(self, motor, times: List[float], frames: List[TelemetryFrame]) -> None:
+        with self._lock:
+            if self.merged_file is not None:
+                rows = ("{},{}".format(motor, csv_row(timestamp, frame)) for timestamp, frame in zip(times, frames))
+                self.merged_file.write("".join(rows))
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.merged_file.flush()
+                    self._last_flush = time.monotonic()
+            for callback in self.listeners:
+                callback(motor, times, frames)
+
+    def start(self) -> "MultiCapture":
+        """Start the engine of every port"""
+        if self.merged_file is not None:
+            self.merged_file.write(MERGED_CSV_HEADER)
+        for engine in self.engines.values():
+            engine.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop every engine, writing everything already read"""
+        for engine in self.engines.values():
+            engine.halt()  # Stop reading all the ports at once
+        for engine in self.engines.values():
+            engine.stop()
+        if self.merged_file is not None:
+            self.merged_file.flush()
+
+    def __enter__(self) -> "MultiCapture":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def stats(self) -> dict:
+        """Counters of the engine of each motor"""
+        return {motor: engine.stats for motor, engine in self.engines.items()}
@@ -17,11 +17,29 @@ import argparse
 
 import matplotlib.pyplot as plt
 
+from AlphaESCTelemetry.captureIndex import decode_window
+from AlphaESCTelemetry.captureSession import is_session
+from AlphaESCTelemetry.decodeCache import decode_binary_cached
 from AlphaESCTelemetry.decodeESCTelemetry import decode_binary
+from AlphaESCTelemetry.telemetryCodec import load_encoded
+from AlphaESCTelemetry.telemetryTable import read_table, table_format
 
-parser = argparse.ArgumentParser(description="Plot telemetry data from a CSV or BIN file using matplotlib.")
+parser = argparse.ArgumentParser(
+    description="Plot telemetry data from a CSV or BIN file, or a capture session (JSON manifest), using matplotlib."
+)
 parser.add_argument("file", metavar="file", type=str, help="file to plot")
 parser.add_argument("--poles", metavar="poles", type=int, nargs="?", default=21, help="number of poles")
+parser.add_argument("--no-cache", action="store_true", help="decode binary files again instead of using the cache")
+parser.add_argument("--start", type=float, default=None, help="only plot the packets of a binary file from this value")
+parser.add_argument("--stop", type=float, default=None, help="only plot the packets of a binary file before this value")
+parser.add_argument(
+    "--by",
+    type=str,
+    choices=["elapsed", "time", "bale", "frame"],
+    default=None,
+    help="unit of --start/--stop: seconds since the first packet, host time, baleNumber or packet number"
+    " (default: elapsed, or frame for captures without host time)",
+)
 parser.add_argument(
     "--decorrupt",
     metavar="decorrupt",
@@ -46,10 +64,26 @@ if args.file.endswith(".csv"):
         encoding="latin-1",
         parse_dates=False,
     )
-elif args.file.endswith(".bin"):
-    logging.info("File is a binary file, decoding...")
+elif args.file.endswith(".bin") or is_session(args.file):
+    logging.info("File is a binary file or session, decoding...")
     # Decode binary file
-    df = decode_binary(args.file, poles=args.poles)
+    if args.start is not None or args.stop is not None:
+        # Seek directly to the requested packets with the capture index
+        try:
+            df = decode_window(args.file, args.start, args.stop, by=args.by, poles=args.poles)
+        except ValueError as e:
+            logging.error(f"Error: {e}")
+            sys.exit(1)
+    elif args.no_cache:
+        df = decode_binary(args.file, poles=args.poles)
+    else:
+        df = decode_binary_cached(args.file, poles=args.poles)
+elif args.file.endswith(".atc"):
+    # Packets encoded by telemetryCodec
+    df = load_encoded(args.file, poles=args.poles)
+elif table_format(args.file) in ("parquet", "feather", "npz"):
+    # Typed table (see telemetryTable)
+    df = read_table(args.file)
 else:
     logging.error("File format not supported")
     sys.exit(1)
@@ -3,39 +3,268 @@ Script to load a binary file and transmit it over a serial port to simulate a te
 
 Usage:
     python replay_telemetry.py ./file.bin
+    python replay_telemetry.py M0.bin M1.bin --parallel --port /dev/ttyUSB0 /dev/ttyUSB1
 """
 
 import argparse
+import itertools
 import logging
 import os
 import sys
+import threading
 import time
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+import numpy
+import pandas
 import serial
 import serial.tools.list_ports as port_list
 from tqdm import tqdm
 
-from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_B1, ALPHA_ESC_BAUD
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, ALPHA_ESC_PACKET_SIZE, AlphaTelemetry, find_frames
+from AlphaESCTelemetry.captureFormat import interpolate_times
+from AlphaESCTelemetry.captureSession import is_session, load_manifest, open_capture
 
+REPLAY_TIMINGS = ("fixed", "recorded")
 
-def replay_log_file(file_path: str, port: str, rate: float = 1 / 20, debug: bool = False) -> None:
-    """Replay the log file to the ESC
+
+def iter_frames(reader, block_size: int = 1 << 16) -> Iterator[Tuple[int, bytes]]:
+    """Split the raw stream of a capture at the packet starts found by `find_frames`
 
     Args:
-        file_path (str): File path to the binary file
-        port (str): Port to use to transmit the data
-        rate (float, optional): Rate of transmission of each bale. Defaults to 1/20.
-        debug (bool, optional): _description_. Defaults to False.
+        reader: CaptureReader or SessionReader of the capture (see captureSession.open_capture)
+        block_size (int, optional): Bytes read at once. Defaults to 64 KiB.
+
+    Yields:
+        tuple: Stream offset and bytes of each packet, with the bytes following it up to the next
+            packet. The bytes before the first packet, if any, come alone.
     """
+    pending = b""
+    offset = 0  # Stream offset of pending
+    for block in reader.iter_blocks(block_size):
+        buf = pending + block
+        starts = find_frames(buf)
+        if starts.size == 0:
+            # No complete packet: only the last bytes may start one
+            keep = max(len(buf) - (ALPHA_ESC_PACKET_SIZE - 1), 0)
+            if keep:
+                yield offset, buf[:keep]
+            pending, offset = buf[keep:], offset + keep
+            continue
+        bounds = starts.tolist()
+        if bounds[0] > 0:
+            yield offset, buf[: bounds[0]]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            yield offset + start, buf[start:stop]
+        # The last packet is sent with the bytes up to the next one, found with the next block
+        pending, offset = buf[bounds[-1] :], offset + bounds[-1]
+    if pending:
+        yield offset, pending
+
+
+def companion_csv(file_path: str) -> List[str]:
+    """Decoded CSV outputs written along with a capture by captureESCTelemetry, in stream order
+
+    Args:
+        file_path (str): Binary capture or session manifest
+
+    Returns:
+        list: The CSV file of the same name, or the CSV segments of a session. Empty when missing.
+    """
+    if is_session(file_path):
+        directory = os.path.dirname(file_path)
+        paths = [
+            os.path.join(directory, segment["csv"]) for segment in load_manifest(file_path)["segments"] if "csv" in segment
+        ]
+    else:
+        paths = [os.path.splitext(file_path)[0] + ".csv"]
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def _iter_csv_times(csv_paths: Sequence[str], chunk_rows: int = 1 << 16) -> Iterator[float]:
+    for path in csv_paths:
+        for chunk in pandas.read_csv(path, usecols=["time"], chunksize=chunk_rows):
+            yield from chunk["time"].tolist()
+
+
+def _iter_host_frames(reader, csv_paths: Optional[Sequence[str]], block_size: int) -> Iterator[Tuple[float, bytes]]:
+    """Packets of a capture with their recorded host time, see `iter_recorded_frames`"""
+    frames = iter_frames(reader, block_size)
+    if reader.timed:
+        ends, times = reader.chunk_times()
+
+        def timed() -> Iterator[Tuple[float, bytes]]:
+            while True:
+                batch = list(itertools.islice(frames, 4096))
+                if not batch:
+                    return
+                offsets = [offset for offset, _ in batch]
+                yield from zip(interpolate_times(offsets, ends, times, reader.baudrate).tolist(), (data for _, data in batch))
+
+    elif csv_paths:
+        parser = AlphaTelemetry()
+        csv_times = _iter_csv_times(csv_paths)
+
+        def timed() -> Iterator[Tuple[float, bytes]]:
+            timestamp = numpy.nan  # Before the first decoded packet
+            for _, data in frames:
+                for _ in parser.feed(data):
+                    timestamp = next(csv_times, timestamp)
+                yield timestamp, data
+
+    else:
+        raise ValueError("No recorded times: neither a timestamped capture nor a CSV output")
+
+    waiting = []  # Bytes before the first known time, sent with it
+    for timestamp, data in timed():
+        if waiting is not None:
+            if numpy.isnan(timestamp):
+                waiting.append(data)
+                continue
+            data = b"".join(waiting + [data])
+            waiting = None
+        yield timestamp, data
+    if waiting:
+        yield numpy.nan, b"".join(waiting)
+
+
+def _scale(frames: Iterable[Tuple[float, bytes]], origin: float, speed: float) -> Iterator[Tuple[float, bytes]]:
+    for timestamp, data in frames:
+        yield (0.0 if speed == 0 or numpy.isnan(timestamp) else (timestamp - origin) / speed), data
+
+
+def iter_recorded_frames(
+    reader,
+    csv_paths: Optional[Sequence[str]] = None,
+    speed: float = 1.0,
+    block_size: int = 1 << 16,
+    origin: Optional[float] = None,
+) -> Iterator[Tuple[float, bytes]]:
+    """Packets of a capture (see `iter_frames`) scheduled at their recorded host times
+
+    The host times come from the timestamped container (see captureFormat.interpolate_times), or
+    else from the `time` column of the CSV output of the capture: its rows are the packets decoded
+    while capturing (AlphaTelemetry.feed), matched by decoding the stream again with the same parser.
+
+    Args:
+        reader: CaptureReader or SessionReader of the capture (see captureSession.open_capture)
+        csv_paths (list, optional): CSV outputs of the capture, for captures without timestamps
+        speed (float, optional): Speed factor, 0 for no delay. Defaults to 1.0 (recorded timing).
+        block_size (int, optional): Bytes read at once. Defaults to 64 KiB.
+        origin (float, optional): Host time of the start of the replay. Defaults to the time of the
+            first packet.
+
+    Yields:
+        tuple: Time in seconds from `origin`, divided by `speed`, and bytes of each packet
+    """
+    frames = _iter_host_frames(reader, csv_paths, block_size)
+    first = next(frames, None)
+    if first is None:
+        return
+    yield from _scale(itertools.chain([first], frames), first[0] if origin is None else origin, speed)
+
+
+def replay(
+    frames: Iterable[Tuple[float, bytes]],
+    write: Callable[[bytes], object],
+    max_batch: int = 1 << 16,
+    progress: Optional[tqdm] = None,
+    start: Optional[float] = None,
+) -> dict:
+    """Send data on a schedule, without drift
+
+    Every write is scheduled on an absolute deadline (start time + time of the frame), so that
+    sleep errors do not build up. The frames already due are sent together in one write.
+
+    Args:
+        frames (iterable): (time in seconds from the start of the replay, bytes), in time order
+        write (callable): Sends bytes, e.g. serial.Serial.write
+        max_batch (int, optional): Maximum bytes per write. Defaults to 64 KiB.
+        progress (tqdm, optional): Progress bar updated with the bytes sent. Defaults to None.
+        start (float, optional): time.perf_counter() of the start of the replay, shared by replays
+            running in parallel. Defaults to now.
+
+    Returns:
+        dict: Frames and bytes sent, writes, duration (s), achieved rate (frames/s), and lateness of
+            the writes relative to their deadlines (s): mean, median, 99th percentile and maximum
+    """
+    start = time.perf_counter() if start is None else start
+    lateness = []
+    count = 0
+    sent = 0
+    batch = []
+    batch_size = 0
+    deadline = 0.0
+
+    def flush() -> None:
+        nonlocal batch_size
+        data = b"".join(batch)
+        lateness.append(time.perf_counter() - start - deadline)
+        write(data)
+        if progress is not None:
+            progress.update(len(data))
+        batch.clear()
+        batch_size = 0
+
+    for frame_time, data in frames:
+        if batch and (frame_time > time.perf_counter() - start or batch_size + len(data) > max_batch):
+            flush()
+        if not batch:
+            delay = frame_time - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            deadline = frame_time
+        batch.append(data)
+        batch_size += len(data)
+        count += 1
+        sent += len(data)
+    if batch:
+        flush()
+
+    duration = time.perf_counter() - start
+    writes = len(lateness)
+    lateness = numpy.array(lateness) if lateness else numpy.zeros(1)
+    return {
+        "frames": count,
+        "bytes": sent,
+        "writes": writes,
+        "duration": duration,
+        "rate": count / duration if duration > 0 else 0.0,
+        "lateness_mean": float(lateness.mean()),
+        "lateness_median": float(numpy.median(lateness)),
+        "lateness_p99": float(numpy.percentile(lateness, 99)),
+        "lateness_max": float(lateness.max()),
+    }
+
+
+def _open_capture(file_path: str, speed: Optional[float], csv_paths: Optional[Sequence[str]]):
+    """Reader of a capture to replay, with the CSV outputs holding its host times. None when it cannot be replayed."""
     if not os.path.isfile(file_path):
         logging.error("File not found: {}".format(file_path))
-        return
+        return None, None
 
-    if not file_path.endswith(".bin"):
+    if not file_path.endswith(".bin") and not is_session(file_path):
         logging.error("File is not a binary file: {}".format(file_path))
-        return
+        return None, None
+
+    reader = open_capture(file_path)
+    if reader.size == 0:
+        logging.error("File is empty: {}".format(file_path))
+        return None, None
 
-    serialPort = serial.Serial(
+    if speed is not None:
+        csv_paths = companion_csv(file_path) if csv_paths is None else csv_paths
+        if not reader.timed and not csv_paths:
+            logging.error("No recorded times for {}: not timestamped and no CSV output".format(file_path))
+            return None, None
+    return reader, csv_paths
+
+
+def _open_port(port):
+    """Serial port at the ESC baudrate for a device name, otherwise the sink itself (any object with write())"""
+    if not isinstance(port, str):
+        return port
+    return serial.Serial(
         port=port,
         baudrate=ALPHA_ESC_BAUD,
         bytesize=8,
@@ -43,39 +272,144 @@ def replay_log_file(file_path: str, port: str, rate: float = 1 / 20, debug: bool
         stopbits=serial.STOPBITS_ONE,
     )
 
-    logging.info("Transmitting file: {}".format(file_path))
-    if rate != 0:
-        logging.info("Transmitting at {} Hz".format(1 / rate))
-    else:
-        logging.info("Transmitting without rate limitation")
 
-    _time = time.perf_counter()
+def _log_stats(file_path: str, stats: dict, debug: bool) -> None:
+    logging.info(
+        "{}: sent {} frames in {:.1f} s: {:.1f} frames/s, lateness median {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms".format(
+            file_path,
+            stats["frames"],
+            stats["duration"],
+            stats["rate"],
+            stats["lateness_median"] * 1e3,
+            stats["lateness_p99"] * 1e3,
+            stats["lateness_max"] * 1e3,
+        )
+    )
+    if debug:
+        logging.info("Replay: {}".format(stats))
+
+
+def replay_log_file(
+    file_path: str,
+    port,
+    rate: float = 1 / 20,
+    debug: bool = False,
+    speed: Optional[float] = None,
+    csv_paths: Optional[Sequence[str]] = None,
+) -> Optional[dict]:
+    """Replay the log file to the ESC
+
+    The capture is split in packets (see `iter_frames`), sent one every `rate` seconds, or at their
+    recorded host times when `speed` is given (see `iter_recorded_frames`).
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        port: Port to use to transmit the data, or sink (any object with write())
+        rate (float, optional): Rate of transmission of each bale. Defaults to 1/20.
+        debug (bool, optional): Log the statistics of the replay. Defaults to False.
+        speed (float, optional): Replay at the recorded timing, sped up by this factor (0 for no delay).
+            Defaults to None (fixed rate).
+        csv_paths (list, optional): CSV outputs holding the host times, for captures without timestamps.
+            Defaults to the CSV written along with the capture (see `companion_csv`).
+
+    Returns:
+        dict: Statistics of the replay (see `replay`), None when the file cannot be replayed
+    """
+    stats = replay_log_files([file_path], [port], rate, debug, speed, None if csv_paths is None else [csv_paths])
+    return stats[0]
+
+
+def replay_log_files(
+    file_paths: Sequence[str],
+    ports: Sequence,
+    rate: float = 1 / 20,
+    debug: bool = False,
+    speed: Optional[float] = None,
+    csv_paths: Optional[Sequence[Optional[Sequence[str]]]] = None,
+) -> List[Optional[dict]]:
+    """Replay several log files at once, one per port, e.g. the captures of every motor of a vehicle
 
-    track_time = 0
-    counter = 0
+    Every file is replayed by its own thread, all scheduled from the same start time. At the recorded
+    timing, the times of all the files are taken from the same origin (the earliest first packet), so
+    that the timing between the streams is kept: the files should come from the same capture (see
+    multiCapture). The files are streamed from disk.
 
-    with open(file_path, "rb") as f_bin:
-        data = f_bin.read()
-        for b in tqdm(data, unit="B", unit_scale=True, smoothing=0):
-            if b is ALPHA_ESC_B1:
-                # If the byte is the start of a frame, wait for the rate limitation
-                if rate != 0:
-                    if time.perf_counter() - _time < rate:
-                        time.sleep(rate - (time.perf_counter() - _time))
-                    _time = time.perf_counter()
+    Args:
+        file_paths (list): File paths to the binary files or session manifests
+        ports (list): Port (or sink, any object with write()) of each file
+        rate (float, optional): Rate of transmission of each bale. Defaults to 1/20.
+        debug (bool, optional): Log the statistics of the replays. Defaults to False.
+        speed (float, optional): Replay at the recorded timing, sped up by this factor (0 for no delay).
+            Defaults to None (fixed rate).
+        csv_paths (list, optional): CSV outputs holding the host times of each file, see `replay_log_file`
+
+    Returns:
+        list: Statistics of the replay of each file (see `replay`), None for the files not replayed
+    """
+    if len(ports) != len(file_paths):
+        raise ValueError("One port per file is required")
+    csv_paths = csv_paths or [None] * len(file_paths)
+    results: List[Optional[dict]] = [None] * len(file_paths)
+
+    readers = {}
+    for index, (file_path, paths) in enumerate(zip(file_paths, csv_paths)):
+        reader, paths = _open_capture(file_path, speed, paths)
+        if reader is not None:
+            readers[index] = (reader, paths)
+    if not readers:
+        return results
 
-                counter += 1
+    frames = {}
+    if speed is not None:
+        logging.info("Transmitting at the recorded timing, x{}".format(speed))
+        streams = {index: _iter_host_frames(reader, paths, 1 << 16) for index, (reader, paths) in readers.items()}
+        firsts = {index: next(stream, None) for index, stream in streams.items()}
+        origin = min((first[0] for first in firsts.values() if first is not None and not numpy.isnan(first[0])), default=0.0)
+        for index, stream in streams.items():
+            head = [] if firsts[index] is None else [firsts[index]]
+            frames[index] = _scale(itertools.chain(head, stream), origin, speed)
+    else:
+        if rate != 0:
+            logging.info("Transmitting at {} Hz".format(1 / rate))
+        else:
+            logging.info("Transmitting without rate limitation")
+        for index, (reader, _) in readers.items():
+            # Stream the raw bytes instead of loading the file, captures can be larger than the available memory
+            frames[index] = ((number * rate, data) for number, (_, data) in enumerate(iter_frames(reader)))
+
+    opened = {index: _open_port(ports[index]) for index in readers}
+    for index in readers:
+        logging.info("Transmitting file: {} to {}".format(file_paths[index], ports[index]))
 
-            # print(b, end=' ')
-            serialPort.write(b.to_bytes(1, byteorder="little"))
+    def run(index: int, start: float, progress: tqdm) -> None:
+        try:
+            results[index] = replay(frames[index], opened[index].write, progress=progress, start=start)
+        except OSError as e:
+            logging.error("Replay of {} failed: {}".format(file_paths[index], e))
 
-            if debug and time.perf_counter() - track_time > 1:
-                # display how many messages we have sent
-                logging.info(f"Messages sent: {counter}")
-                counter = 0
-                track_time = time.perf_counter()
+    total = sum(reader.size for reader, _ in readers.values())
+    with tqdm(total=total, unit="B", unit_scale=True, smoothing=0) as progress:
+        if len(readers) == 1:
+            index = next(iter(readers))
+            run(index, time.perf_counter(), progress)
+        else:
+            start = time.perf_counter() + 0.1  # Once every thread is running
+            threads = [
+                threading.Thread(target=run, args=(index, start, progress), name="AlphaReplay{}".format(index), daemon=True)
+                for index in readers
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
 
-    serialPort.close()
+    for index, port in opened.items():
+        if isinstance(ports[index], str):
+            port.close()
+    for index in readers:
+        if results[index] is not None:
+            _log_stats(file_paths[index], results[index], debug)
+    return results
 
 
 if __name__ == "__main__":
@@ -93,35 +427,70 @@ if __name__ == "__main__":
         default=1.0,
         help="Rate multiplier to transmit the file at. Default is 1.0 (20Hz). "
         + "Example if set to 2.0, the script will transmit at 40Hz, etc."
-        + "If set to 0, the script will transmit as fast as possible",
+        + "If set to 0, the script will transmit as fast as possible. "
+        + "With --timing recorded, speed factor of the recorded timing",
+    )
+    parser.add_argument(
+        "--timing",
+        type=str,
+        choices=REPLAY_TIMINGS,
+        default="fixed",
+        help="fixed: one packet every 1/(20*rate) s. recorded: packets at their recorded host times, "
+        + "from the timestamped capture or from its CSV output",
+    )
+    parser.add_argument(
+        "--times",
+        metavar="csv",
+        type=str,
+        nargs="+",
+        default=None,
+        help="CSV output(s) holding the host times of a capture without timestamps, with --timing recorded. "
+        + "Defaults to the CSV file of the same name",
     )
     parser.add_argument(
         "--port",
         metavar="port",
         type=str,
-        nargs="?",
+        nargs="+",
         default=None,
-        help="Serial port to use. If not provided, the script will try to auto-detect the FTDI cable",
+        help="Serial port to use, one per file with --parallel. "
+        + "If not provided, the script will try to auto-detect the FTDI cable(s)",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Replay all the files at once from a shared clock, each to its own port (in the order of --port)",
     )
     args = parser.parse_args()
 
+    if args.parallel and args.times is not None:
+        parser.error("--times holds the times of a single capture, use the CSV file of the same name of each file")
+
     # Auto detect FTDI cable
     if args.port is None:
-        ports = list(port_list.comports())
-        port = None
-        for p in ports:
+        ftdi = []
+        for p in port_list.comports():
             logging.info(f"Device: {p.device}, {p.name}, {p.product}, {p.serial_number}, {p.manufacturer}")
             if p.manufacturer == "FTDI":
-                port = p.device
-        if port is None:
+                ftdi.append(p.device)
+        if not ftdi:
             logging.error("No FTDI adapter found")
             sys.exit(1)
+        ports = sorted(ftdi)[: len(args.file)] if args.parallel else ftdi[-1:]
     else:
-        port = args.port
+        ports = args.port
 
-    logging.info(f"Using port: {port}")
+    if len(ports) != (len(args.file) if args.parallel else 1):
+        logging.error("{} files for {} ports".format(len(args.file), len(ports)))
+        sys.exit(1)
+
+    logging.info(f"Using port: {', '.join(ports)}")
 
     rate = 0 if args.rate == 0 else 1 / (20 * args.rate)
+    speed = args.rate if args.timing == "recorded" else None
 
-    for log_file in args.file:
-        replay_log_file(log_file, port, rate)
+    if args.parallel:
+        replay_log_files(args.file, ports, rate, speed=speed)
+    else:
+        for log_file in args.file:
+            replay_log_file(log_file, ports[0], rate, speed=speed, csv_paths=args.times)
@@ -0,0 +1,228 @@
+"""
+Compact binary codec for decoded telemetry, several times smaller than the CSV output.
+
+Only the raw integer fields of the valid packets are stored, the scaling of decodeFrames (and the
+number of poles) being applied on read. Each field is delta encoded (modulo its width, so that
+the wrap of `baleNumber` costs one byte), zigzag encoded and written as LEB128 varints: a packet
+whose fields did not change takes one byte per field. The host time, when known, is stored to
+the microsecond the same way.
+
+Layout (little-endian):
+    header:  CODEC_MAGIC (8 bytes), version (u16), flags (u16, bit 0: time stored), packets (u64)
+    columns: size (u64) and varints of each entry of CODEC_FIELDS, then of the time
+
+Usage:
+    python telemetryCodec.py ./file.bin [-o ./file.atc]
+"""
+
+import argparse
+import os
+import struct
+import sys
+from typing import Optional, Tuple
+
+import numpy
+import pandas
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_B1, ALPHA_ESC_B2, ALPHA_ESC_PACKET_SIZE, AlphaTelemetry
+from AlphaESCTelemetry.captureSession import open_capture
+from AlphaESCTelemetry.decodeESCTelemetry import iter_located_packets
+
+CODEC_MAGIC = b"\x89AETC\r\n\x1a"
+CODEC_VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sHHQ")
+SIZE_STRUCT = struct.Struct("<Q")
+
+# Raw fields of a packet: name, byte offset and size
+CODEC_FIELDS = (
+    ("baleNumber", 4, 2),
+    ("rxThrottle", 6, 2),
+    ("outputThrottle", 8, 2),
+    ("rpm", 10, 2),
+    ("busbarVoltage", 12, 2),
+    ("busbarCurrent", 14, 2),
+    ("phaseWireCurrent", 16, 2),
+    ("mosfetTemp", 18, 1),
+    ("capacitorTemp", 19, 1),
+    ("statusCode", 20, 2),
+)
+# Header of the valid packets, whose initialValue is ALPHA_ESC_INITIAL_VALUE
+_HEADER = numpy.array([ALPHA_ESC_B1, ALPHA_ESC_B2, 0x01, 0x02], dtype=numpy.uint8)
+
+
+def varint_encode(values: numpy.ndarray) -> bytes:
+    """LEB128 encoding of unsigned integers, 7 bits per byte"""
+    values = numpy.asarray(values, dtype=numpy.uint64)
+    sizes = numpy.ones(len(values), dtype=numpy.int64)
+    for k in range(1, 10):
+        sizes += values >= numpy.uint64(1 << (7 * k))
+    starts = numpy.cumsum(sizes) - sizes
+    out = numpy.empty(int(sizes.sum()), dtype=numpy.uint8)
+    for k in range(int(sizes.max(initial=0))):
+        selected = sizes > k
+        byte = (values[selected] >> numpy.uint64(7 * k)) & numpy.uint64(0x7F)
+        out[starts[selected] + k] = byte | numpy.where(sizes[selected] > k + 1, 0x80, 0).astype(numpy.uint64)
+    return out.tobytes()
+
+
+def varint_decode(data) -> numpy.ndarray:
+    """Inverse of `varint_encode`"""
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(buf < 0x80)
+    starts = numpy.concatenate(([0], ends[:-1] + 1)).astype(numpy.int64)
+    sizes = ends - starts + 1
+    values = numpy.zeros(len(ends), dtype=numpy.uint64)
+    for k in range(int(sizes.max(initial=0))):
+        selected = sizes > k
+        values[selected] |= (buf[starts[selected] + k] & numpy.uint64(0x7F)).astype(numpy.uint64) << numpy.uint64(7 * k)
+    return values
+
+
+def _delta_encode(values: numpy.ndarray, bits: Optional[int] = None) -> bytes:
+    """Zigzag varints of the differences between consecutive values, modulo 2**bits"""
+    delta = numpy.diff(values.astype(numpy.int64), prepend=0)
+    if bits is not None:
+        half = 1 << (bits - 1)
+        delta = ((delta + half) & ((1 << bits) - 1)) - half
+    return varint_encode(((delta << 1) ^ (delta >> 63)).view(numpy.uint64))
+
+
+def _delta_decode(data, bits: Optional[int] = None) -> numpy.ndarray:
+    """Inverse of `_delta_encode`"""
+    zigzag = varint_decode(data)
+    delta = (zigzag >> numpy.uint64(1)).view(numpy.int64) ^ -(zigzag & numpy.uint64(1)).view(numpy.int64)
+    values = numpy.cumsum(delta)
+    return values if bits is None else values & ((1 << bits) - 1)
+
+
+def encode_frames(frames: numpy.ndarray, times: Optional[numpy.ndarray] = None) -> bytes:
+    """Encode valid packets
+
+    Args:
+        frames (numpy.ndarray): (N, ALPHA_ESC_PACKET_SIZE) uint8 array of packets with a valid checksum and header
+        times (numpy.ndarray, optional): Host time of each packet. Defaults to None.
+
+    Returns:
+        bytes: Encoded packets
+    """
+    frames = numpy.asarray(frames, dtype=numpy.uint8).reshape(-1, ALPHA_ESC_PACKET_SIZE)
+    columns = []
+    for _, offset, size in CODEC_FIELDS:
+        values = frames[:, offset].astype(numpy.int64)
+        if size == 2:
+            values = (values << 8) + frames[:, offset + 1]
+        columns.append(_delta_encode(values, 8 * size))
+    if times is not None:
+        columns.append(_delta_encode(numpy.round(numpy.asarray(times, dtype=numpy.float64) * 1e6).astype(numpy.int64)))
+
+    header = HEADER_STRUCT.pack(CODEC_MAGIC, CODEC_VERSION, int(times is not None), len(frames))
+    return header + b"".join(SIZE_STRUCT.pack(len(column)) + column for column in columns)
+
+
+def decode_frames(data) -> Tuple[numpy.ndarray, Optional[numpy.ndarray]]:
+    """Inverse of `encode_frames`
+
+    Returns:
+        tuple: (N, ALPHA_ESC_PACKET_SIZE) uint8 array of packets, and host times (None when not stored)
+    """
+    magic, version, flags, count = HEADER_STRUCT.unpack_from(data)
+    if magic != CODEC_MAGIC:
+        raise ValueError("Not an encoded telemetry file")
+    if version > CODEC_VERSION:
+        raise ValueError("Unsupported telemetry codec version: {}".format(version))
+
+    view = memoryview(data)
+    pos = HEADER_STRUCT.size
+
+    def column() -> memoryview:
+        nonlocal pos
+        (size,) = SIZE_STRUCT.unpack_from(view, pos)
+        pos += SIZE_STRUCT.size + size
+        return view[pos - size : pos]
+
+    frames = numpy.zeros((count, ALPHA_ESC_PACKET_SIZE), dtype=numpy.uint8)
+    frames[:, :4] = _HEADER
+    for _, offset, size in CODEC_FIELDS:
+        values = _delta_decode(column(), 8 * size)
+        if size == 2:
+            frames[:, offset] = values >> 8
+            frames[:, offset + 1] = values & 0xFF
+        else:
+            frames[:, offset] = values
+    checksum = frames[:, : ALPHA_ESC_PACKET_SIZE - 2].sum(axis=1, dtype=numpy.int64)
+    frames[:, 22] = checksum & 0xFF
+    frames[:, 23] = (checksum >> 8) & 0xFF
+
+    times = _delta_decode(column()) / 1e6 if flags & 1 else None
+    return frames, times
+
+
+def read_frames(file_path: str) -> Tuple[numpy.ndarray, Optional[numpy.ndarray]]:
+    """Raw valid packets of a binary capture (or session), the rows of `decode_binary`
+
+    Returns:
+        tuple: (N, ALPHA_ESC_PACKET_SIZE) uint8 array of packets, and host times (None when not known)
+    """
+    reader = open_capture(file_path)
+    frames, offsets = [], []
+    for offset, _ in iter_located_packets(file_path):
+        # Read the span of the chunk once, then pick its packets
+        span = numpy.frombuffer(reader.read(offset[0], offset[-1] + ALPHA_ESC_PACKET_SIZE), dtype=numpy.uint8)
+        frames.append(span[(offset - offset[0])[:, None] + numpy.arange(ALPHA_ESC_PACKET_SIZE)])
+        offsets.append(offset)
+    frames = numpy.concatenate(frames) if frames else numpy.empty((0, ALPHA_ESC_PACKET_SIZE), dtype=numpy.uint8)
+    times = reader.packet_times(numpy.concatenate(offsets)) if reader.timed and offsets else None
+    return frames, times
+
+
+def encode_capture(file_path: str, out_path: str) -> int:
+    """Encode the valid packets of a binary capture (or session), with their host time when known
+
+    Args:
+        file_path (str): File path to the binary file or session manifest
+        out_path (str): File path to the encoded file
+
+    Returns:
+        int: Number of packets encoded
+    """
+    frames, times = read_frames(file_path)
+    with open(out_path, "wb") as f:
+        f.write(encode_frames(frames, times))
+    return len(frames)
+
+
+def load_encoded(file_path: str, poles=21) -> pandas.DataFrame:
+    """Load an encoded file
+
+    Args:
+        file_path (str): File path to the encoded file
+        poles (int, optional): Number of poles of the motor. Defaults to 21.
+
+    Returns:
+        pandas.DataFrame: Same table as `decode_binary` on the original capture
+    """
+    with open(file_path, "rb") as f:
+        frames, times = decode_frames(f.read())
+    if len(frames) == 0:
+        return pandas.DataFrame()
+    df = pandas.DataFrame(AlphaTelemetry.decodeFrames(frames, poles))
+    if times is not None:
+        df.insert(0, "time", times)
+    return df
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Encode the telemetry packets of a binary capture with the compact codec")
+    ap.add_argument("bin_file", type=str, help="Binary file or session manifest to encode.")
+    ap.add_argument(
+        "-o", "--out", type=str, dest="out_file", default="", help="Encoded file. Defaults to `bin_file` with .atc"
+    )
+    args = ap.parse_args()
+
+    if not os.path.exists(args.bin_file):
+        print("Error: file `{}` does not exist".format(args.bin_file))
+        sys.exit(1)
+
+    out_file = args.out_file if args.out_file else os.path.splitext(args.bin_file)[0] + ".atc"
+    count = encode_capture(args.bin_file, out_file)
+    print("{}: {} packets encoded in {} bytes".format(out_file, count, os.path.getsize(out_file)))
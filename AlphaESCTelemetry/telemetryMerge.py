@@ -0,0 +1,203 @@
+"""
+Align the decoded telemetry of several ESCs on one time axis, as a wide table with the columns of
+every motor, e.g. after a multi-motor capture (see multiCapture).
+
+The packets of a base capture give the time axis, and each row holds, for every other motor, its
+packet at or before that time ("backward", as-of) or the closest one ("nearest"), within a
+tolerance. The captures are read and merged chunk by chunk, keeping only a small window of each
+in memory, so that long captures of many motors never have to be loaded at once.
+
+Accepted captures: CSV outputs, binary captures and sessions with host timestamps, and typed
+tables (see telemetryTable, read chunk by chunk with `iter_table` whatever their format).
+
+Usage:
+    python telemetryMerge.py M0.csv M1.bin M2.npz [-o merged.csv] [--direction nearest] [--tolerance 0.05]
+"""
+
+import argparse
+import os
+import sys
+from typing import Iterator, Optional, Sequence
+
+import numpy
+import pandas
+
+from AlphaESCTelemetry.captureSession import is_session
+from AlphaESCTelemetry.decodeESCTelemetry import iter_binary
+from AlphaESCTelemetry.telemetryTable import iter_table, table_format, write_table
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+MERGE_DIRECTIONS = ("backward", "nearest")
+
+
+def iter_capture(file_path: str, chunk_rows: int = 1 << 16, poles=21) -> Iterator[pandas.DataFrame]:
+    """Decoded packets of a capture, in chunks sorted by host time
+
+    Args:
+        file_path (str): CSV output, binary capture, session manifest or typed table
+        chunk_rows (int, optional): Maximum rows per chunk of the tables. Defaults to 65536.
+        poles (int, optional): Number of poles of the motor, for binary captures. Defaults to 21.
+
+    Yields:
+        pandas.DataFrame: Packets with their host "time", without the initialValue column
+    """
+    if table_format(file_path) is not None:
+        chunks = iter_table(file_path, chunk_rows)
+    elif file_path.endswith(".bin") or is_session(file_path):
+        chunks = iter_binary(file_path, poles=poles)
+    else:
+        raise ValueError("Unsupported capture: {}".format(file_path))
+
+    for df in chunks:
+        if "time" not in df:
+            raise ValueError("No host time in {}".format(file_path))
+        if len(df):
+            yield df.drop(columns="initialValue", errors="ignore").sort_values("time", kind="stable")
+
+
+class _Window:
+    """Packets of one capture around the current chunk of the time axis"""
+
+    def __init__(self, chunks: Iterator[pandas.DataFrame]) -> None:
+        self.chunks = chunks
+        self.df: Optional[pandas.DataFrame] = None
+        self.exhausted = False
+
+    def extend(self, until: float) -> None:
+        """Read the packets up to `until` (and the first one after it)"""
+        frames = [] if self.df is None else [self.df]
+        while not self.exhausted and (not frames or frames[-1]["time"].iloc[-1] <= until):
+            try:
+                frames.append(next(self.chunks))
+            except StopIteration:
+                self.exhausted = True
+        if len(frames) > 1:
+            self.df = pandas.concat(frames, ignore_index=True).sort_values("time", kind="stable")
+        elif frames:
+            self.df = frames[0]
+
+    def trim(self, since: float) -> None:
+        """Drop the packets before `since`, keeping the last one of them for the as-of matches"""
+        if self.df is not None:
+            start = max(int(numpy.searchsorted(self.df["time"].to_numpy(), since, side="left")) - 1, 0)
+            self.df = self.df.iloc[start:]
+
+
+def iter_merged(
+    file_paths: Sequence[str],
+    names: Optional[Sequence[str]] = None,
+    direction: str = "backward",
+    tolerance: Optional[float] = None,
+    chunk_rows: int = 1 << 16,
+    poles=21,
+) -> Iterator[pandas.DataFrame]:
+    """Merge the packets of several captures on the time axis of the first one
+
+    Args:
+        file_paths (list): Captures, see `iter_capture`. The first one gives the time axis.
+        names (list, optional): Suffix of the columns of each capture. Defaults to M0, M1, ...
+        direction (str, optional): "backward" for the last packet at or before each time, "nearest"
+            for the closest packet. Defaults to "backward".
+        tolerance (float, optional): Largest time difference in seconds of a match, missing values
+            otherwise. Defaults to None (no limit).
+        chunk_rows (int, optional): Rows of the first capture per chunk. Defaults to 65536.
+        poles (int, optional): Number of poles of the motors, for binary captures. Defaults to 21.
+
+    Yields:
+        pandas.DataFrame: Chunk of the wide table: "time", then the columns of each capture suffixed
+            with its name ("time_M1" holding the time of the matched packet)
+    """
+    if direction not in MERGE_DIRECTIONS:
+        raise ValueError("Unknown merge direction: {}".format(direction))
+    names = ["M{}".format(i) for i in range(len(file_paths))] if names is None else list(names)
+    if len(names) != len(file_paths):
+        raise ValueError("One name per capture is required")
+    margin = 0.0 if tolerance is None else tolerance
+    windows = [_Window(iter_capture(path, chunk_rows, poles)) for path in file_paths[1:]]
+
+    for base in iter_capture(file_paths[0], chunk_rows, poles):
+        merged = base.add_suffix("_" + names[0])
+        merged.insert(0, "time", base["time"].to_numpy())
+        last = merged["time"].iloc[-1]
+        for name, window in zip(names[1:], windows):
+            window.extend(last + margin)
+            if window.df is None:
+                continue
+            other = window.df.add_suffix("_" + name)
+            # Flags as 0/1 values, missing when not matched
+            other = other.astype({key: float for key, dtype in other.dtypes.items() if dtype == bool})
+            other["time"] = window.df["time"].to_numpy()
+            merged = pandas.merge_asof(merged, other, on="time", direction=direction, tolerance=tolerance)
+            # Later chunks of the base start after `last`
+            window.trim(last - margin)
+        yield merged
+
+
+def merge_captures(file_paths: Sequence[str], out_path: str, **kwargs) -> int:
+    """Write the merged table of several captures, see `iter_merged`
+
+    The CSV and Parquet outputs are written chunk by chunk, other formats are built in memory.
+
+    Args:
+        file_paths (list): Captures, the first one gives the time axis
+        out_path (str): Output file, whose extension gives the format (see telemetryTable)
+        **kwargs: Options of `iter_merged`
+
+    Returns:
+        int: Number of rows written
+    """
+    out_format = table_format(out_path) or "csv"
+    rows = 0
+    if out_format == "csv":
+        with open(out_path, "w+") as f:
+            for chunk in iter_merged(file_paths, **kwargs):
+                chunk.to_csv(f, header=rows == 0, index=False, lineterminator="\n")
+                rows += len(chunk)
+    elif out_format == "parquet" and pyarrow is not None:
+        writer = None
+        for chunk in iter_merged(file_paths, **kwargs):
+            table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(out_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+        if writer is not None:
+            writer.close()
+    else:
+        df = pandas.concat(list(iter_merged(file_paths, **kwargs)), ignore_index=True)
+        write_table(df, out_path, out_format)
+        rows = len(df)
+    return rows
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Merge the telemetry of several ESCs in one table, aligned by host time")
+    ap.add_argument(
+        "files", type=str, nargs="+", help="Captures (CSV, BIN, session or table), the first one gives the time axis."
+    )
+    ap.add_argument(
+        "-o", "--out", type=str, dest="out_file", default="merged.csv", help="Merged table (CSV, parquet, feather or npz)."
+    )
+    ap.add_argument(
+        "-n", "--names", type=str, nargs="+", default=None, help="Column suffix of each capture. Defaults to M0, M1, ..."
+    )
+    ap.add_argument(
+        "-d", "--direction", type=str, choices=MERGE_DIRECTIONS, default="backward", help="Packet matched at each time."
+    )
+    ap.add_argument("-t", "--tolerance", type=float, default=None, help="Largest time difference of a match, in seconds.")
+    ap.add_argument("-p", "--poles", type=int, dest="poles", default=21, help="Number of poles of the motors.")
+    args = ap.parse_args()
+
+    for file_path in args.files:
+        if not os.path.exists(file_path):
+            print("Error: file `{}` does not exist".format(file_path))
+            sys.exit(1)
+
+    rows = merge_captures(
+        args.files, args.out_file, names=args.names, direction=args.direction, tolerance=args.tolerance, poles=args.poles
+    )
+    print("{}: {} rows".format(args.out_file, rows))
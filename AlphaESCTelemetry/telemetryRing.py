@@ -0,0 +1,222 @@
+"""
+Live decoded telemetry shared with other processes on the same host, through a ring buffer in
+shared memory (multiprocessing.shared_memory), without going through the disk.
+
+The capture process publishes the packets (see RingPublisher, a CaptureEngine listener), and any
+number of processes read them with a RingReader. Each slot of the ring has a stamp acting as a
+sequence lock: 2 * n + 1 while packet n is being written to it, 2 * n + 2 once written. A reader
+copies the slots holding new packets and keeps those whose stamp did not change meanwhile, so it
+never sees a partially written packet, and counts the packets overwritten before it read them.
+
+Layout (native byte order):
+    header:  RING_MAGIC (8 bytes), version (u16), flags (u16, bit 0: publisher closed),
+             capacity (u32), packets published (u64), padded to HEADER_SIZE
+    stamps:  capacity u64
+    records: capacity records of RECORD_DTYPE (the columns of telemetryTable)
+
+Usage:
+    python telemetryRing.py NAME
+"""
+
+import argparse
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator, List, Optional
+
+import numpy
+
+from AlphaESCTelemetry.alphaTelemetry import TelemetryFrame
+from AlphaESCTelemetry.telemetryTable import TABLE_DTYPES
+
+RING_MAGIC = b"\x89AETR\r\n\x1a"
+RING_VERSION = 1
+RING_CLOSED = 1
+HEADER_DTYPE = numpy.dtype([("magic", "S8"), ("version", "u2"), ("flags", "u2"), ("capacity", "u4"), ("count", "u8")])
+HEADER_SIZE = 64
+RECORD_DTYPE = numpy.dtype(list(TABLE_DTYPES.items()))
+
+# Rings published by this process
+_published = set()
+
+
+def ring_size(capacity: int) -> int:
+    """Size in bytes of a ring holding `capacity` packets"""
+    return HEADER_SIZE + capacity * (8 + RECORD_DTYPE.itemsize)
+
+
+def _views(buf, capacity: int):
+    """Header, stamps and records of a ring, mapped on the shared memory"""
+    header = numpy.ndarray((), dtype=HEADER_DTYPE, buffer=buf)
+    stamps = numpy.ndarray(capacity, dtype=numpy.uint64, buffer=buf, offset=HEADER_SIZE)
+    records = numpy.ndarray(capacity, dtype=RECORD_DTYPE, buffer=buf, offset=HEADER_SIZE + 8 * capacity)
+    return header, stamps, records
+
+
+class RingPublisher:
+    """Writer of a telemetry ring, called as a CaptureEngine listener"""
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 1 << 16) -> None:
+        """RingPublisher initialization, creates the shared memory block.
+
+        Args:
+            name (str, optional): Name of the shared memory block. Defaults to a random name.
+            capacity (int, optional): Number of packets kept. Defaults to 65536 (about 15 min at 70 Hz).
+        """
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=ring_size(capacity))
+        self.name = self.shm.name
+        _published.add(self.name)
+        self.capacity = capacity
+        self.header, self.stamps, self.records = _views(self.shm.buf, capacity)
+        self.stamps[:] = 0
+        self.header["version"] = RING_VERSION
+        self.header["capacity"] = capacity
+        self.header["count"] = 0
+        self.header["magic"] = RING_MAGIC  # Last, the ring is ready
+
+    def publish(self, records: numpy.ndarray) -> None:
+        """Append packets to the ring
+
+        Args:
+            records (numpy.ndarray): Structured array of RECORD_DTYPE
+        """
+        count = int(self.header["count"])
+        index = numpy.arange(count, count + len(records), dtype=numpy.uint64)[-self.capacity :]
+        slots = index % numpy.uint64(self.capacity)
+        self.stamps[slots] = 2 * index + 1
+        self.records[slots] = records[-self.capacity :]
+        self.stamps[slots] = 2 * index + 2
+        self.header["count"] = count + len(records)
+
+    def __call__(self, times: List[float], frames: List[TelemetryFrame]) -> None:
+        self.publish(numpy.array([(timestamp,) + frame[1:] for timestamp, frame in zip(times, frames)], dtype=RECORD_DTYPE))
+
+    def close(self) -> None:
+        """Mark the ring as closed for the readers, and release the shared memory block"""
+        if self.shm is None:
+            return
+        self.header["flags"] |= RING_CLOSED
+        del self.header, self.stamps, self.records
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        _published.discard(self.name)
+
+    def __enter__(self) -> "RingPublisher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class RingReader:
+    """Reader of a telemetry ring published by another process"""
+
+    def __init__(self, name: str, oldest: bool = False) -> None:
+        """RingReader initialization, attaches to the shared memory block.
+
+        Args:
+            name (str): Name of the shared memory block
+            oldest (bool, optional): Start from the oldest packet still in the ring, instead of
+                the next one published. Defaults to False.
+        """
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+        except TypeError:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the publisher may unlink the block
+            if self.shm.name not in _published:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        header = numpy.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if header["magic"] != RING_MAGIC:
+            raise ValueError("Not a telemetry ring: {}".format(name))
+        if header["version"] > RING_VERSION:
+            raise ValueError("Unsupported telemetry ring version: {}".format(int(header["version"])))
+        self.capacity = int(header["capacity"])
+        self.header, self.stamps, self.records = _views(self.shm.buf, self.capacity)
+        count = int(self.header["count"])
+        self.next = max(0, count - self.capacity) if oldest else count  # Sequence number of the next packet to read
+        self.missed = 0  # Packets overwritten before being read
+
+    @property
+    def closed(self) -> bool:
+        """Whether the publisher is closed"""
+        return bool(self.header["flags"] & RING_CLOSED)
+
+    def read(self) -> numpy.ndarray:
+        """Packets published since the last read
+
+        Returns:
+            numpy.ndarray: Structured array of RECORD_DTYPE, copied out of the ring
+        """
+        count = int(self.header["count"])
+        if self.next < count - self.capacity:
+            self.missed += count - self.capacity - self.next
+            self.next = count - self.capacity
+        index = numpy.arange(self.next, count, dtype=numpy.uint64)
+        slots = index % numpy.uint64(self.capacity)
+        before = self.stamps[slots]
+        records = self.records[slots]
+        after = self.stamps[slots]
+        # Packets overwritten while being copied
+        valid = (before == 2 * index + 2) & (after == before)
+        self.missed += int(len(index) - valid.sum())
+        self.next = count
+        return records[valid]
+
+    def latest(self, count: int = 1) -> numpy.ndarray:
+        """Last `count` packets published, without changing the read position"""
+        position, missed = self.next, self.missed
+        self.next = max(0, int(self.header["count"]) - count)
+        records = self.read()
+        self.next, self.missed = position, missed
+        return records
+
+    def follow(self, interval: float = 0.05) -> Iterator[numpy.ndarray]:
+        """Yield the new packets as they are published, until the publisher is closed
+
+        Args:
+            interval (float, optional): Polling interval in seconds. Defaults to 0.05.
+        """
+        while True:
+            closed = self.closed
+            records = self.read()
+            if len(records):
+                yield records
+            if closed:
+                break
+            time.sleep(interval)
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        del self.header, self.stamps, self.records
+        self.shm.close()
+        self.shm = None
+
+    def __enter__(self) -> "RingReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Print the packets published in a telemetry ring (see --shm of captureESCTelemetry)"
+    )
+    ap.add_argument("name", type=str, help="Name of the shared memory block.")
+    args = ap.parse_args()
+
+    try:
+        with RingReader(args.name) as reader:
+            for records in reader.follow():
+                for record in records:
+                    print(", ".join("{}: {}".format(key, record[key]) for key in RECORD_DTYPE.names))
+            print("Publisher closed, {} packets missed".format(reader.missed))
+    except FileNotFoundError:
+        print("Error: no telemetry ring `{}`".format(args.name))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
@@ -0,0 +1,341 @@
+"""
+Fan-out of live decoded telemetry to local subscribers over a Unix domain socket (or a TCP socket
+on localhost), so that several tools can follow one ESC stream. The telemetry is never served to
+other hosts: TCP addresses are limited to loopback hosts ("localhost", 127.0.0.0/8 or [::1]).
+
+The server (TelemetryServer, a CaptureEngine listener) runs its own thread and never blocks the
+capture: every subscriber has a bounded queue of messages, and when a subscriber is too slow to
+empty it, its oldest messages are dropped. Subscribers detect the drops from the sequence numbers.
+
+Protocol (little-endian), from the server to each subscriber:
+    hello:   SERVER_MAGIC (8 bytes), version (u16), record size (u16), sequence number of the next packet (u64)
+    batches: sequence number of the first packet (u64), packets (u32), records of WIRE_DTYPE
+
+Usage:
+    python telemetryServer.py /tmp/alpha.sock
+    python telemetryServer.py localhost:7000
+"""
+
+import argparse
+import collections
+import ipaddress
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import numpy
+
+from AlphaESCTelemetry.alphaTelemetry import TelemetryFrame
+from AlphaESCTelemetry.telemetryTable import TABLE_DTYPES
+
+SERVER_MAGIC = b"\x89AETS\r\n\x1a"
+SERVER_VERSION = 1
+HELLO_STRUCT = struct.Struct("<8sHHQ")
+BATCH_STRUCT = struct.Struct("<QI")
+WIRE_DTYPE = numpy.dtype(list(TABLE_DTYPES.items())).newbyteorder("<")
+
+
+def parse_address(address: str) -> Tuple[int, object]:
+    """Socket family and address: "host:port" for TCP, otherwise the path of a Unix domain socket
+
+    Raises:
+        ValueError: TCP host other than a loopback one
+    """
+    host, _, port = address.rpartition(":")
+    if not (host and port.isdigit() and "/" not in address):
+        return socket.AF_UNIX, address
+    host = host.strip("[]")
+    if host == "localhost":
+        return socket.AF_INET, (host, int(port))
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        ip = None
+    if ip is None or not ip.is_loopback:
+        raise ValueError("Not a loopback address, the telemetry is served to local subscribers only: {}".format(address))
+    return (socket.AF_INET6 if ip.version == 6 else socket.AF_INET), (host, int(port))
+
+
+class _Subscriber:
+    """Connection to a subscriber, with its queue of messages"""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.current = memoryview(b"")  # Unsent part of the message being sent
+        self.pending = collections.deque()  # Messages not started, with their number of packets
+        self.size = 0  # Bytes in `pending`
+        self.dropped = 0  # Packets dropped
+        self.events = selectors.EVENT_READ
+
+    def queue(self, message: bytes, count: int, max_buffer: int) -> None:
+        self.pending.append((message, count))
+        self.size += len(message)
+        while self.size > max_buffer and len(self.pending) > 1:
+            message, count = self.pending.popleft()
+            self.size -= len(message)
+            self.dropped += count
+
+    def send(self) -> None:
+        """Send as much as possible without blocking"""
+        while True:
+            if not self.current:
+                if not self.pending:
+                    return
+                message, _ = self.pending.popleft()
+                self.size -= len(message)
+                self.current = memoryview(message)
+            try:
+                sent = self.sock.send(self.current)
+            except BlockingIOError:
+                return
+            self.current = self.current[sent:]
+
+
+class TelemetryServer:
+    """Publish decoded packets to every connected subscriber"""
+
+    def __init__(self, address: str, max_buffer: int = 1 << 20) -> None:
+        """TelemetryServer initialization, listens on `address`.
+
+        Args:
+            address (str): Path of the Unix domain socket, or "host:port" on a loopback host
+                (e.g. "127.0.0.1:7000", "localhost:7000" or "[::1]:7000")
+            max_buffer (int, optional): Bytes queued per subscriber before dropping its oldest messages.
+                Defaults to 1 MiB.
+        """
+        self.family, self.address = parse_address(address)  # Loopback only
+        self.max_buffer = max_buffer
+        self.sequence = 0  # Sequence number of the next packet
+        self.subscribers: List[_Subscriber] = []
+
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)  # Left by a previous server
+        self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family != socket.AF_UNIX:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.address)
+        self.sock.listen()
+        self.sock.setblocking(False)
+
+        self._lock = threading.RLock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="AlphaTelemetryServer", daemon=True)
+
+    @property
+    def stats(self) -> dict:
+        """Counters of the server"""
+        with self._lock:
+            return {
+                "subscribers": len(self.subscribers),
+                "packets_published": self.sequence,
+                "packets_dropped": [subscriber.dropped for subscriber in self.subscribers],
+            }
+
+    def start(self) -> "TelemetryServer":
+        self._thread.start()
+        return self
+
+    def publish(self, records: numpy.ndarray) -> None:
+        """Queue packets for every subscriber
+
+        Args:
+            records (numpy.ndarray): Structured array with the fields of WIRE_DTYPE
+        """
+        with self._lock:
+            message = BATCH_STRUCT.pack(self.sequence, len(records)) + records.astype(WIRE_DTYPE).tobytes()
+            self.sequence += len(records)
+            for subscriber in self.subscribers:
+                subscriber.queue(message, len(records), self.max_buffer)
+        self._wake()
+
+    def __call__(self, times: List[float], frames: List[TelemetryFrame]) -> None:
+        self.publish(numpy.array([(timestamp,) + frame[1:] for timestamp, frame in zip(times, frames)], dtype=WIRE_DTYPE))
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass  # Already woken up
+
+    def _serve(self) -> None:
+        """Server thread: accept subscribers and send their queued messages"""
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self.sock:
+                    self._accept()
+                elif key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    # Subscribers send nothing: readable means closed
+                    try:
+                        closed = not key.data.sock.recv(4096)
+                    except BlockingIOError:
+                        closed = False
+                    except OSError:
+                        closed = True
+                    if closed:
+                        self._remove(key.data)
+
+            with self._lock:
+                for subscriber in list(self.subscribers):
+                    try:
+                        subscriber.send()
+                    except OSError:
+                        self._remove(subscriber)
+                        continue
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if subscriber.current or subscriber.pending else 0)
+                    if events != subscriber.events:
+                        self._selector.modify(subscriber.sock, events, subscriber)
+                        subscriber.events = events
+
+    def _accept(self) -> None:
+        try:
+            sock, _ = self.sock.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        subscriber = _Subscriber(sock)
+        with self._lock:
+            # Sent first, never dropped
+            subscriber.current = memoryview(
+                HELLO_STRUCT.pack(SERVER_MAGIC, SERVER_VERSION, WIRE_DTYPE.itemsize, self.sequence)
+            )
+            self.subscribers.append(subscriber)
+        self._selector.register(sock, subscriber.events, subscriber)
+
+    def _remove(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if subscriber not in self.subscribers:
+                return
+            self.subscribers.remove(subscriber)
+        self._selector.unregister(subscriber.sock)
+        subscriber.sock.close()
+
+    def close(self) -> None:
+        """Stop the server thread, and disconnect the subscribers once their queued messages are sent"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake()
+        if self._thread.is_alive():
+            self._thread.join()
+        for subscriber in list(self.subscribers):
+            subscriber.sock.setblocking(True)
+            subscriber.sock.settimeout(1.0)
+            try:
+                subscriber.send()
+            except OSError:
+                pass
+            self._remove(subscriber)
+        self._selector.close()
+        for sock in (self.sock, self._wake_r, self._wake_w):
+            sock.close()
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __enter__(self) -> "TelemetryServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TelemetryClient:
+    """Subscriber of a TelemetryServer"""
+
+    def __init__(self, address: str, timeout: Optional[float] = None) -> None:
+        """TelemetryClient initialization, connects to the server.
+
+        Args:
+            address (str): Address of the server, see TelemetryServer
+            timeout (float, optional): Socket timeout in seconds. Defaults to None (blocking).
+        """
+        family, address = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self._f = self.sock.makefile("rb")
+        self.missed = 0  # Packets dropped by the server
+
+        # self.next: sequence number of the next packet
+        magic, version, record_size, self.next = HELLO_STRUCT.unpack(self._read(HELLO_STRUCT.size))
+        if magic != SERVER_MAGIC:
+            raise ValueError("Not a telemetry server: {}".format(address))
+        if version > SERVER_VERSION or record_size != WIRE_DTYPE.itemsize:
+            raise ValueError("Unsupported telemetry server version: {}".format(version))
+
+    def _read(self, size: int) -> bytes:
+        data = self._f.read(size)
+        if len(data) < size:
+            raise EOFError("Connection closed by the telemetry server")
+        return data
+
+    def recv(self) -> Optional[numpy.ndarray]:
+        """Next batch of packets
+
+        Returns:
+            numpy.ndarray: Structured array of WIRE_DTYPE, None when the server is closed
+        """
+        try:
+            sequence, count = BATCH_STRUCT.unpack(self._read(BATCH_STRUCT.size))
+            records = numpy.frombuffer(self._read(count * WIRE_DTYPE.itemsize), dtype=WIRE_DTYPE)
+        except EOFError:
+            return None
+        self.missed += sequence - self.next
+        self.next = sequence + count
+        return records
+
+    def __iter__(self) -> Iterator[numpy.ndarray]:
+        while True:
+            records = self.recv()
+            if records is None:
+                break
+            yield records
+
+    def close(self) -> None:
+        self._f.close()
+        self.sock.close()
+
+    def __enter__(self) -> "TelemetryClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Print the packets published by a telemetry server (see --serve of captureESCTelemetry)"
+    )
+    ap.add_argument("address", type=str, help="Path of the Unix domain socket, or localhost:port.")
+    args = ap.parse_args()
+
+    try:
+        with TelemetryClient(args.address) as client:
+            for records in client:
+                for record in records:
+                    print(", ".join("{}: {}".format(key, record[key]) for key in WIRE_DTYPE.names))
+            print("Server closed, {} packets missed".format(client.missed))
+    except (ConnectionRefusedError, FileNotFoundError):
+        print("Error: no telemetry server on `{}`".format(args.address))
+        sys.exit(1)
+    except ValueError as e:
+        print("Error: {}".format(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
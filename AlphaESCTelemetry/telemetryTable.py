@@ -0,0 +1,251 @@
+"""
+Columnar output of decoded telemetry, with typed columns and fast to load.
+
+Tables are written as Parquet or Feather when pyarrow is installed, and otherwise as a numpy .npz
+archive. Each column is stored with the type of TABLE_DTYPES: bale numbers and status codes as
+uint16, measurements as float32 and the fault flag as bool. The host time is kept as float64.
+
+The format follows the file extension: .parquet, .feather, .npz or .csv (the CSV output of the scripts,
+with the values written as by the capture, see `csv_table`). Tables are loaded at once with
+`read_table`, or chunk by chunk, in bounded memory, with `iter_table`.
+"""
+
+import contextlib
+import logging
+import os
+import zipfile
+from typing import Dict, Iterator, List, Optional, TextIO
+
+import numpy
+import pandas
+
+from AlphaESCTelemetry.alphaTelemetry import TelemetryFrame
+from AlphaESCTelemetry.columnBuilder import ColumnBuilder
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+TABLE_FORMATS = ("csv", "parquet", "feather", "npz")
+
+# Storage type of each column (temperatures have half-degree steps)
+TABLE_DTYPES: Dict[str, numpy.dtype] = {
+    "time": numpy.dtype(numpy.float64),
+    "baleNumber": numpy.dtype(numpy.uint16),
+    "rxThrottle": numpy.dtype(numpy.float32),
+    "outputThrottle": numpy.dtype(numpy.float32),
+    "rpm": numpy.dtype(numpy.float32),
+    "busbarVoltage": numpy.dtype(numpy.float32),
+    "busbarCurrent": numpy.dtype(numpy.float32),
+    "phaseWireCurrent": numpy.dtype(numpy.float32),
+    "mosfetTemp": numpy.dtype(numpy.float32),
+    "capacitorTemp": numpy.dtype(numpy.float32),
+    "statusCode": numpy.dtype(numpy.uint16),
+    "fault": numpy.dtype(numpy.bool_),
+}
+
+# Temperatures are written as the values of the temperature table, e.g. 54 or 54.5
+TEMPERATURE_FIELDS = ("mosfetTemp", "capacitorTemp")
+
+
+def table_formats() -> List[str]:
+    """Output formats available with the installed packages"""
+    return [name for name in TABLE_FORMATS if pyarrow is not None or name not in ("parquet", "feather")]
+
+
+def table_format(file_path: str) -> Optional[str]:
+    """Format of a table file from its extension, None when not a table"""
+    name = os.path.splitext(file_path)[1].lstrip(".").lower()
+    return name if name in TABLE_FORMATS else None
+
+
+def resolve_format(name: str) -> str:
+    """Requested output format, or npz when it needs pyarrow and pyarrow is not installed"""
+    if name not in TABLE_FORMATS:
+        raise ValueError("Unknown table format: {}".format(name))
+    if name not in table_formats():
+        logging.warning("pyarrow is not installed, writing {} output as npz instead".format(name))
+        return "npz"
+    return name
+
+
+def to_table(df: pandas.DataFrame) -> pandas.DataFrame:
+    """Columns of the output, with the types of TABLE_DTYPES
+
+    Args:
+        df (pandas.DataFrame): Decoded packets, e.g. from `decode_binary`
+
+    Returns:
+        pandas.DataFrame: Same rows, without the constant initialValue column
+    """
+    columns = {}
+    for key in df.columns:
+        if key == "initialValue":
+            continue
+        values = df[key].to_numpy()
+        columns[key] = values.astype(TABLE_DTYPES.get(key, values.dtype), copy=False)
+    return pandas.DataFrame(columns)
+
+
+def csv_table(df: pandas.DataFrame) -> pandas.DataFrame:
+    """Columns of the CSV output, with the values written by the capture (see captureEngine.csv_row)
+
+    Args:
+        df (pandas.DataFrame): Decoded packets, e.g. from `decode_binary`
+
+    Returns:
+        pandas.DataFrame: Same rows, without the constant initialValue column, the fault flag as 0 or 1
+            and the whole temperatures without decimals
+    """
+    df = df.drop(columns="initialValue", errors="ignore")
+    if "fault" in df:
+        df = df.astype({"fault": int})
+    for key in TEMPERATURE_FIELDS:
+        if key in df and df[key].dtype.kind == "f":
+            values = df[key].to_numpy()
+            text = values.astype(str).astype(object)
+            whole = numpy.floor(values) == values
+            text[whole] = values[whole].astype(numpy.int64).astype(str)
+            text[numpy.isnan(values)] = None
+            df = df.assign(**{key: text})
+    return df
+
+
+def write_csv(df: pandas.DataFrame, f: TextIO, header: bool = True) -> None:
+    """Append decoded packets to a CSV output, see `csv_table`
+
+    Args:
+        df (pandas.DataFrame): Decoded packets, e.g. from `decode_binary`
+        f (TextIO): Text file object
+        header (bool, optional): Write the header line first. Defaults to True.
+    """
+    if len(df):
+        csv_table(df).to_csv(f, header=header, index=False, lineterminator="\n")
+
+
+def write_table(df: pandas.DataFrame, file_path: str, format: Optional[str] = None) -> None:
+    """Save decoded packets
+
+    Args:
+        df (pandas.DataFrame): Decoded packets, e.g. from `decode_binary`
+        file_path (str): File path to the table
+        format (str, optional): One of TABLE_FORMATS. Defaults to the format of the file extension.
+    """
+    format = format or table_format(file_path) or "csv"
+    if format == "csv":
+        # Text output of the scripts, with the full precision of the decoder
+        with open(file_path, "w+") as f:
+            write_csv(df, f)
+        return
+
+    table = to_table(df)
+    if format == "npz":
+        with open(file_path, "wb") as f:
+            numpy.savez(f, **{key: table[key].to_numpy() for key in table.columns})
+    elif pyarrow is None:
+        raise ImportError("pyarrow is required to write {} files".format(format))
+    elif format == "parquet":
+        pyarrow.parquet.write_table(pyarrow.Table.from_pandas(table, preserve_index=False), file_path)
+    elif format == "feather":
+        pyarrow.feather.write_feather(table, file_path)
+    else:
+        raise ValueError("Unknown table format: {}".format(format))
+
+
+def read_table(file_path: str) -> pandas.DataFrame:
+    """Load a table written by `write_table` (or a CSV output)"""
+    format = table_format(file_path)
+    if format == "npz":
+        with numpy.load(file_path) as columns:
+            return pandas.DataFrame({key: columns[key] for key in columns.files})
+    if format == "csv":
+        return pandas.read_csv(file_path)
+    if format not in TABLE_FORMATS:
+        raise ValueError("Not a table file: {}".format(file_path))
+    if pyarrow is None:
+        raise ImportError("pyarrow is required to read {} files".format(format))
+    if format == "parquet":
+        return pyarrow.parquet.read_table(file_path).to_pandas()
+    return pyarrow.feather.read_feather(file_path)
+
+
+def _iter_npz(file_path: str, chunk_rows: int) -> Iterator[pandas.DataFrame]:
+    """Rows of a .npz table, reading the arrays of the archive in step (numpy.load reads whole arrays)"""
+    with zipfile.ZipFile(file_path) as archive, contextlib.ExitStack() as stack:
+        columns = {}
+        for name in archive.namelist():
+            f = stack.enter_context(archive.open(name))
+            version = numpy.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(f)
+            if len(shape) != 1 or dtype.hasobject:
+                raise ValueError("Not a table column: {} in {}".format(name, file_path))
+            columns[name[: -len(".npy")]] = (f, dtype, shape[0])
+
+        rows = min((length for _, _, length in columns.values()), default=0)
+        for start in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - start)
+            yield pandas.DataFrame(
+                {key: numpy.frombuffer(f.read(count * dtype.itemsize), dtype=dtype) for key, (f, dtype, _) in columns.items()}
+            )
+
+
+def _iter_feather(file_path: str, chunk_rows: int) -> Iterator[pandas.DataFrame]:
+    """Rows of a Feather table, one record batch of the memory-mapped file at a time"""
+    with pyarrow.memory_map(file_path) as source:
+        reader = pyarrow.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows).to_pandas()
+
+
+def iter_table(file_path: str, chunk_rows: int = 1 << 16) -> Iterator[pandas.DataFrame]:
+    """Load a table written by `write_table` (or a CSV output) chunk by chunk, see `read_table`
+
+    Only one chunk of the table is held in memory at a time.
+
+    Args:
+        file_path (str): File path to the table
+        chunk_rows (int, optional): Maximum rows per chunk. Defaults to 65536.
+
+    Yields:
+        pandas.DataFrame: Consecutive rows of the table
+    """
+    format = table_format(file_path)
+    if format == "npz":
+        yield from _iter_npz(file_path, chunk_rows)
+        return
+    if format == "csv":
+        yield from pandas.read_csv(file_path, chunksize=chunk_rows)
+        return
+    if format not in TABLE_FORMATS:
+        raise ValueError("Not a table file: {}".format(file_path))
+    if pyarrow is None:
+        raise ImportError("pyarrow is required to read {} files".format(format))
+    if format == "parquet":
+        for batch in pyarrow.parquet.ParquetFile(file_path).iter_batches(chunk_rows):
+            yield batch.to_pandas()
+        return
+    yield from _iter_feather(file_path, chunk_rows)
+
+
+class TableRecorder:
+    """CaptureEngine listener accumulating the decoded packets in typed columns, saved at the end of the capture"""
+
+    def __init__(self) -> None:
+        self.columns = ColumnBuilder([(key, dtype) for key, dtype in TABLE_DTYPES.items()])
+
+    def __call__(self, times: List[float], frames: List[TelemetryFrame]) -> None:
+        for timestamp, frame in zip(times, frames):
+            self.columns.append((timestamp,) + frame[1:])
+
+    def save(self, file_path: str, format: Optional[str] = None) -> None:
+        """Write the packets recorded so far, see `write_table`"""
+        write_table(self.columns.to_dataframe(), file_path, format)
@@ -0,0 +1,148 @@
+"""
+Virtual serial links, to run the replay and the capture without an ESC or an FTDI cable.
+
+BytePipe is an in-process link: the replay writes to it, and a CaptureEngine (or anything
+reading a serial.Serial) reads from it. PtyPair is a pseudo-terminal (POSIX only): its device
+path can be opened as a serial port by another process (e.g. captureESCTelemetry.py --port),
+while the other end is used in-process, so that the capture path is the real one.
+
+Both ends have the subset of the serial.Serial interface used here: write(), read(size)
+with a read timeout, in_waiting and close().
+"""
+
+import fcntl
+import os
+import select
+import struct
+import termios
+import threading
+import tty
+from typing import Optional
+
+
+class BytePipe:
+    """In-process byte link with a bounded buffer, like the receive buffer of a serial driver"""
+
+    def __init__(self, capacity: int = 1 << 12, timeout: Optional[float] = 0.1, block: bool = True) -> None:
+        """BytePipe initialization.
+
+        Args:
+            capacity (int, optional): Bytes buffered before the writer waits, or the bytes are dropped.
+                Defaults to 4 KiB.
+            timeout (float, optional): Read timeout in seconds, None to wait forever. Defaults to 0.1.
+            block (bool, optional): When the buffer is full, wait for the reader. Otherwise the bytes
+                that do not fit are dropped, as in an overrun of a serial driver. Defaults to True.
+        """
+        self.capacity = capacity
+        self.timeout = timeout
+        self.block = block
+        self.bytes_written = 0
+        self.bytes_dropped = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+
+    @property
+    def in_waiting(self) -> int:
+        """Bytes ready to be read"""
+        return len(self._buffer)
+
+    def write(self, data: bytes) -> int:
+        """Append data to the link, see `block`
+
+        Returns:
+            int: Bytes accepted
+        """
+        view = memoryview(data)
+        accepted = 0
+        with self._cond:
+            while view and not self.closed:
+                room = self.capacity - len(self._buffer)
+                if room <= 0:
+                    if self.block:
+                        self._cond.wait()
+                        continue
+                    break
+                self._buffer += view[:room]
+                accepted += min(room, len(view))
+                view = view[room:]
+                self._cond.notify_all()
+            self.bytes_written += accepted
+            self.bytes_dropped += len(data) - accepted
+        return accepted
+
+    def read(self, size: int = 1) -> bytes:
+        """Up to `size` bytes, waiting up to the timeout for the first one
+
+        Returns:
+            bytes: Data read, empty on timeout or once closed and drained
+        """
+        with self._cond:
+            if not self._buffer and not self.closed:
+                self._cond.wait_for(lambda: self._buffer or self.closed, self.timeout)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._cond.notify_all()
+        return data
+
+    def close(self) -> None:
+        """Close the link: the reader gets the bytes still buffered, the writer stops waiting"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __enter__(self) -> "BytePipe":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PtyPair:
+    """Pseudo-terminal in raw mode: `device` for the other end, read and write on this one"""
+
+    def __init__(self, timeout: Optional[float] = 0.1) -> None:
+        """PtyPair initialization, opens the pseudo-terminal.
+
+        Args:
+            timeout (float, optional): Read timeout in seconds, None to wait forever. Defaults to 0.1.
+        """
+        self.timeout = timeout
+        self.fd, self._slave = os.openpty()
+        # Bytes passed as is, as on a serial link
+        tty.setraw(self.fd)
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+
+    @property
+    def in_waiting(self) -> int:
+        """Bytes ready to be read"""
+        return struct.unpack("i", fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def write(self, data: bytes) -> int:
+        """Send data to the other end, waiting while its buffer is full"""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view) :]
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        """Up to `size` bytes from the other end, waiting up to the timeout for the first one"""
+        if self.fd is None:
+            return b""
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        # The other end stays open here, closing its device does not end the link
+        return os.read(self.fd, size) if ready else b""
+
+    def close(self) -> None:
+        if self.fd is None:
+            return
+        os.close(self.fd)
+        os.close(self._slave)
+        self.fd = None
+
+    def __enter__(self) -> "PtyPair":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,48 @@
+import io
+import os
+import sys
+import time
+
+import pandas
+
+from AlphaESCTelemetry.decodeESCTelemetry import decode_binary
+from AlphaESCTelemetry.telemetryCodec import decode_frames, encode_frames, load_encoded, read_frames
+
+# Compare the compact telemetry codec with the CSV output, in size and speed
+file = sys.argv[1]
+if not os.path.exists(file):
+    print(f"File {file} does not exist")
+    sys.exit(1)
+
+df = decode_binary(file)
+frames, times = read_frames(file)
+print(f"{len(df)} packets, raw packets: {frames.nbytes} bytes")
+
+
+def bench(name, function, repeat=3):
+    best = min(_timed(function) for _ in range(repeat))
+    print(f"{name:<20} {best * 1e3:10.1f} ms")
+
+
+def _timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+# CSV, as written by decodeESCTelemetry
+csv = df.drop(columns="initialValue").astype({"fault": int}).to_csv(index=False, lineterminator="\n")
+print(f"CSV size:   {len(csv):>12} bytes")
+bench("CSV write", lambda: df.drop(columns="initialValue").astype({"fault": int}).to_csv(index=False))
+bench("CSV read", lambda: pandas.read_csv(io.StringIO(csv), dtype=float))
+
+# Codec
+encoded = encode_frames(frames, times)
+print(f"Codec size: {len(encoded):>12} bytes ({len(csv) / len(encoded):.1f}x smaller than CSV)")
+bench("Codec encode", lambda: encode_frames(frames, times))
+bench("Codec decode", lambda: decode_frames(encoded))
+
+with open(file + ".atc", "wb") as f:
+    f.write(encoded)
+bench("Codec load (table)", lambda: load_encoded(file + ".atc"))
+os.remove(file + ".atc")
@@ -0,0 +1,8 @@
+import pytest
+
+from .helpers import make_capture
+
+
+@pytest.fixture
+def capture_bytes() -> bytes:
+    return make_capture(600)
@@ -0,0 +1,50 @@
+import random
+import time
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, PACKET_STRUCT, AlphaTelemetry
+
+
+def make_packet(bale: int, rng: random.Random) -> bytes:
+    """Valid packet with random measurements, temperature codes from the whole table"""
+    body = PACKET_STRUCT.pack(
+        0x9B,
+        0x16,
+        0x01,
+        0x02,
+        bale & 0xFFFF,
+        rng.randrange(1024),
+        rng.randrange(1024),
+        rng.randrange(4000),
+        rng.randrange(200, 600),
+        rng.randrange(2000),
+        rng.randrange(2000),
+        rng.randrange(256),
+        rng.randrange(256),
+        rng.choice((0, 0, 0, 1, 4)),
+        0,
+        0,
+    )
+    checksum = AlphaTelemetry.calc_checksum(body)
+    return body[:-2] + bytes((checksum & 0xFF, checksum >> 8))
+
+
+def make_capture(count: int, seed: int = 0) -> bytes:
+    """Raw capture of `count` packets, with some junk and corrupted packets in between"""
+    rng = random.Random(seed)
+    data = bytearray()
+    for bale in range(count):
+        packet = bytearray(make_packet(bale, rng))
+        if rng.random() < 0.03:
+            packet[rng.randrange(2, len(packet))] ^= 0xFF
+        data += packet
+        if rng.random() < 0.03:
+            data += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 30)))
+    return bytes(data)
+
+
+def paced_write(link, data: bytes, step: int = 4) -> None:
+    """Write `data` to a virtual serial link a few bytes at a time, at the pace of the serial link"""
+    start = time.perf_counter()
+    for i in range(0, len(data), step):
+        time.sleep(max(0.0, start + (i + step) * 10 / ALPHA_ESC_BAUD - time.perf_counter()))
+        link.write(data[i : i + step])
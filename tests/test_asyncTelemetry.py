@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from AlphaESCTelemetry.alphaTelemetry import AlphaTelemetry
+from AlphaESCTelemetry.asyncTelemetry import AsyncTelemetryReader
+from AlphaESCTelemetry.virtualSerial import PtyPair
+
+from .helpers import make_capture
+
+
+async def read_all(pair: PtyPair, data: bytes):
+    loop = asyncio.get_running_loop()
+
+    def write():
+        # Pieces cutting through packets, then the link is closed to end the iteration, once read
+        # (closing the pty discards the bytes not read yet)
+        for i in range(0, len(data), 100):
+            pair.write(data[i : i + 100])
+        deadline = time.monotonic() + 5
+        while reader.bytes_read < len(data) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        pair.close()
+
+    reader = AsyncTelemetryReader(pair.device)
+    async with reader:
+        writer = loop.run_in_executor(None, write)
+        frames = [frame async for frame in reader]
+        await writer
+    return reader, frames
+
+
+def test_frames_over_pty(capture_bytes):
+    with PtyPair() as pair:
+        reader, frames = asyncio.run(read_all(pair, capture_bytes))
+
+    assert reader.bytes_read == len(capture_bytes)
+    assert reader.frames_dropped == 0
+    assert frames == AlphaTelemetry(POLES_N=21).feed(capture_bytes)
+
+
+def test_several_ports_on_one_loop():
+    captures = [make_capture(200, seed=seed) for seed in (3, 4)]
+
+    async def read_both(pairs):
+        return await asyncio.gather(*(read_all(pair, data) for pair, data in zip(pairs, captures)))
+
+    with PtyPair() as first, PtyPair() as second:
+        results = asyncio.run(read_both([first, second]))
+
+    for (_, frames), data in zip(results, captures):
+        assert frames == AlphaTelemetry(POLES_N=21).feed(data)
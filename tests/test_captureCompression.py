@@ -0,0 +1,28 @@
+import pytest
+
+from AlphaESCTelemetry.captureCompression import BlockParser, BlockReader, CompressedWriter
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_flush_writes_the_current_block(tmp_path, codec):
+    path = tmp_path / "capture.bin"
+    data = bytes(range(256)) * 40
+    with open(path, "wb") as f:
+        writer = CompressedWriter(f, codec, block_size=4096)
+        writer.write(data[:5000])
+        writer.flush()
+        writer.write(data[5000:])
+        writer.flush()
+
+        # Not closed: no index, the blocks are walked
+        reader = BlockReader(str(path))
+        assert reader.size == len(data)
+        assert reader.read() == data
+        reader.close()
+        assert BlockParser().feed(path.read_bytes()) == data
+
+        writer.close()
+
+    reader = BlockReader(str(path))
+    assert reader.read() == data
+    reader.close()
@@ -0,0 +1,74 @@
+import io
+import time
+
+import numpy
+import pandas
+import pytest
+import serial
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, ALPHA_ESC_PACKET_SIZE, AlphaTelemetry
+from AlphaESCTelemetry.captureEngine import CaptureEngine
+from AlphaESCTelemetry.captureFormat import CaptureParser, CaptureWriter
+from AlphaESCTelemetry.virtualSerial import BytePipe, PtyPair
+
+from .helpers import make_capture, paced_write
+
+
+def test_reads_are_coalesced_at_line_rate():
+    data = make_capture(60, seed=1)
+    f = io.BytesIO()
+    frames = []
+    with BytePipe() as pipe:
+        engine = CaptureEngine(pipe, bin_file=CaptureWriter(f))
+        engine.add_listener(lambda times, chunk: frames.extend(chunk))
+        with engine:
+            paced_write(pipe, data)
+            time.sleep(0.1)
+
+    chunks = CaptureParser().feed(f.getvalue())
+    assert b"".join(chunk for _, chunk in chunks) == data
+    # One chunk per read_interval, not one per read
+    duration = len(data) * 10 / ALPHA_ESC_BAUD
+    assert len(chunks) <= duration / engine.read_interval + 2
+    assert frames == AlphaTelemetry(POLES_N=21).feed(data)
+
+
+def test_capture_through_pty():
+    # Read by serial.Serial from the device of the pty, as captureESCTelemetry --port does
+    data = make_capture(100, seed=3)
+    f = io.BytesIO()
+    frames = []
+    with PtyPair() as pair, serial.Serial(pair.device, ALPHA_ESC_BAUD, timeout=0.1) as port:
+        engine = CaptureEngine(port, bin_file=CaptureWriter(f))
+        engine.add_listener(lambda times, chunk: frames.extend(chunk))
+        with engine:
+            paced_write(pair, data, step=64)
+            time.sleep(0.2)
+
+    assert b"".join(chunk for _, chunk in CaptureParser().feed(f.getvalue())) == data
+    assert frames == AlphaTelemetry(POLES_N=21).feed(data)
+
+
+def test_packets_have_their_own_time():
+    data = make_capture(80, seed=4)
+    f_csv = io.StringIO()
+    times = []
+    with BytePipe() as pipe:
+        engine = CaptureEngine(pipe, csv_file=f_csv)
+        engine.add_listener(lambda chunk_times, chunk: times.extend(chunk_times))
+        with engine:
+            # Never faster than the line rate: the packets of a burst would all get the time of the
+            # previous read (see interpolate_times)
+            for i in range(0, len(data), 4):
+                pipe.write(data[i : i + 4])
+                time.sleep(4 * 10 / ALPHA_ESC_BAUD)
+            time.sleep(0.1)
+
+    f_csv.seek(0)
+    df = pandas.read_csv(f_csv)
+    assert len(df) == len(AlphaTelemetry(POLES_N=21).feed(data))
+    # Several packets per chunk, each one at the time its last byte was received
+    assert (numpy.diff(df["time"].to_numpy()) > 0).all()
+    assert df["time"].tolist() == pytest.approx(times, abs=1e-6)
+    packet_time = ALPHA_ESC_PACKET_SIZE * 10 / ALPHA_ESC_BAUD
+    assert numpy.median(numpy.diff(times)) == pytest.approx(packet_time, rel=0.2)
@@ -0,0 +1,48 @@
+import time
+
+import numpy
+import pytest
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, ALPHA_ESC_PACKET_SIZE
+from AlphaESCTelemetry.captureEngine import CaptureEngine
+from AlphaESCTelemetry.captureFormat import CaptureReader, CaptureWriter, interpolate_times
+from AlphaESCTelemetry.virtualSerial import BytePipe
+
+from .helpers import make_capture, paced_write
+
+BYTE_TIME = 10.0 / ALPHA_ESC_BAUD
+
+
+def test_interpolate_times_first_chunk_of_several_packets():
+    # Three packets in the first read, one in the second
+    offsets = numpy.arange(4) * ALPHA_ESC_PACKET_SIZE
+    times = interpolate_times(offsets, [72, 96], [10.0, 10.1])
+    expected = [10.0 - 2 * ALPHA_ESC_PACKET_SIZE * BYTE_TIME, 10.0 - ALPHA_ESC_PACKET_SIZE * BYTE_TIME, 10.0, 10.1]
+    assert times == pytest.approx(expected)
+
+
+def test_interpolate_times_not_before_previous_read():
+    # Both packets of the second chunk were received after the first read
+    offsets = numpy.arange(3) * ALPHA_ESC_PACKET_SIZE
+    times = interpolate_times(offsets, [24, 72], [10.0, 10.001])
+    assert times == pytest.approx([10.0, 10.0, 10.001])
+    assert numpy.all(numpy.diff(times) >= 0)
+
+
+def test_interpolate_times_without_reads():
+    assert numpy.isnan(interpolate_times([0, 24], [], [])).all()
+
+
+def test_capture_size_close_to_raw_size(tmp_path):
+    # 60 packets received at line rate, a few bytes per read
+    data = make_capture(60, seed=2)
+    path = tmp_path / "capture.bin"
+    with open(path, "wb") as f, BytePipe() as pipe:
+        with CaptureEngine(pipe, bin_file=CaptureWriter(f)):
+            paced_write(pipe, data)
+            time.sleep(0.1)
+
+    reader = CaptureReader(str(path))
+    assert reader.timed
+    assert reader.read(0, reader.size) == data
+    assert path.stat().st_size <= 1.2 * len(data)
@@ -0,0 +1,49 @@
+import pandas
+import pytest
+
+from AlphaESCTelemetry.captureFormat import CaptureWriter
+from AlphaESCTelemetry.captureIndex import CaptureIndex, decode_window
+from AlphaESCTelemetry.decodeESCTelemetry import decode_binary
+
+from .helpers import make_capture
+
+
+@pytest.fixture
+def timed_capture(tmp_path):
+    """Container of 400 packets, read by chunks of 100 bytes every 50 ms"""
+    data = make_capture(400, seed=6)
+    path = tmp_path / "capture.bin"
+    with open(path, "wb") as f:
+        writer = CaptureWriter(f, origin=1000.0)
+        for i in range(0, len(data), 100):
+            writer.write(data[i : i + 100], timestamp_ns=(i // 100 + 1) * 50_000_000)
+        writer.flush()
+    return str(path)
+
+
+def window(full: pandas.DataFrame, by: str, start: float, stop: float) -> pandas.DataFrame:
+    """Rows of the whole decode within [start, stop)"""
+    if by == "frame":
+        rows = full.iloc[int(start) : int(stop)]
+    elif by == "bale":
+        rows = full[(full["baleNumber"] >= start) & (full["baleNumber"] < stop)]
+    else:
+        elapsed = full["time"] - full["time"].iloc[0]
+        rows = full[(elapsed >= start) & (elapsed < stop)]
+    return rows.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("by, start, stop", [("frame", 100, 250), ("bale", 120, 260), ("elapsed", 0.3, 1.2)])
+def test_window_same_as_full_decode(timed_capture, by, start, stop):
+    full = decode_binary(timed_capture)
+    assert "time" in full
+    expected = window(full, by, start, stop)
+    assert 50 < len(expected) < len(full)
+    pandas.testing.assert_frame_equal(decode_window(timed_capture, start, stop, by=by), expected)
+
+
+def test_index_rebuilt_when_capture_changes(timed_capture):
+    assert len(CaptureIndex.load(timed_capture)) == len(decode_binary(timed_capture))
+    with open(timed_capture, "wb") as f:
+        f.write(make_capture(50, seed=7))
+    assert len(CaptureIndex.load(timed_capture)) == len(decode_binary(timed_capture)) == 50
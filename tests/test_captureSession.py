@@ -0,0 +1,40 @@
+import time
+
+import numpy
+import pandas
+
+from AlphaESCTelemetry.alphaTelemetry import AlphaTelemetry
+from AlphaESCTelemetry.captureEngine import CaptureEngine
+from AlphaESCTelemetry.captureFormat import CaptureReader
+from AlphaESCTelemetry.captureSession import SessionWriter, load_manifest, open_capture
+from AlphaESCTelemetry.virtualSerial import BytePipe
+
+
+def test_csv_rows_in_the_segment_of_their_chunk(tmp_path, capture_bytes):
+    manifest_path = tmp_path / "session.json"
+    session = SessionWriter(str(manifest_path), max_bytes=2000)
+    with BytePipe(capacity=1 << 16) as pipe:
+        engine = CaptureEngine(pipe, bin_file=session, csv_file=session.csv_file, flush_bytes=500, read_interval=0.001)
+        with engine:
+            for i in range(0, len(capture_bytes), 100):
+                pipe.write(capture_bytes[i : i + 100])
+                time.sleep(0.001)
+            time.sleep(0.1)
+    session.close()
+
+    segments = load_manifest(str(manifest_path))["segments"]
+    assert len(segments) > 3
+    rows = 0
+    previous = -numpy.inf  # Time of the last chunk of the previous segment
+    for segment in segments:
+        reader = CaptureReader(str(tmp_path / segment["bin"]))
+        _, times = reader.chunk_times()
+        df = pandas.read_csv(tmp_path / segment["csv"])
+        # Every row is timestamped within the chunks of its own segment
+        assert (df["time"] >= previous - 1e-6).all()
+        assert (df["time"] <= times[-1] + 1e-6).all()
+        previous = times[-1]
+        rows += len(df)
+
+    assert open_capture(str(manifest_path)).read(0, len(capture_bytes)) == capture_bytes
+    assert rows == len(AlphaTelemetry(POLES_N=21).feed(capture_bytes))
@@ -0,0 +1,70 @@
+import os
+
+import pandas
+import pytest
+
+from AlphaESCTelemetry import decodeCache
+from AlphaESCTelemetry.decodeCache import decode_binary_cached, invalidate
+from AlphaESCTelemetry.decodeESCTelemetry import decode_binary
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Captures actually decoded by decode_binary_cached"""
+    calls = []
+
+    def counted(file_path, poles=21):
+        calls.append((file_path, poles))
+        return decode_binary(file_path, poles=poles)
+
+    monkeypatch.setattr(decodeCache, "decode_binary", counted)
+    return calls
+
+
+@pytest.fixture
+def capture(tmp_path, capture_bytes):
+    path = tmp_path / "capture.bin"
+    path.write_bytes(capture_bytes)
+    return str(path)
+
+
+def test_hit(tmp_path, capture, decodes):
+    cache_dir = str(tmp_path / "cache")
+    first = decode_binary_cached(capture, cache_dir=cache_dir)
+    second = decode_binary_cached(capture, cache_dir=cache_dir)
+    assert len(decodes) == 1
+    pandas.testing.assert_frame_equal(second, first)
+    pandas.testing.assert_frame_equal(second, decode_binary(capture))
+
+
+def test_miss_after_decoder_change(tmp_path, capture, decodes, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    decode_binary_cached(capture, cache_dir=cache_dir)
+    monkeypatch.setattr(decodeCache, "DECODER_VERSION", decodeCache.DECODER_VERSION + 1)
+    decode_binary_cached(capture, cache_dir=cache_dir)
+    assert len(decodes) == 2
+    # The stale entry is replaced
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_miss_after_poles_change(tmp_path, capture, decodes):
+    cache_dir = str(tmp_path / "cache")
+    decode_binary_cached(capture, poles=21, cache_dir=cache_dir)
+    rpm = decode_binary_cached(capture, poles=14, cache_dir=cache_dir)["rpm"]
+    assert decodes == [(capture, 21), (capture, 14)]
+    pandas.testing.assert_series_equal(rpm, decode_binary(capture, poles=14)["rpm"])
+    # Both numbers of poles stay cached
+    decode_binary_cached(capture, poles=21, cache_dir=cache_dir)
+    assert len(decodes) == 2
+
+
+def test_invalidate(tmp_path, capture, decodes):
+    cache_dir = str(tmp_path / "cache")
+    decode_binary_cached(capture, poles=21, cache_dir=cache_dir)
+    decode_binary_cached(capture, poles=14, cache_dir=cache_dir)
+    assert invalidate(capture, cache_dir, poles=14) == 1
+    decode_binary_cached(capture, poles=21, cache_dir=cache_dir)
+    assert len(decodes) == 2
+    assert invalidate(capture, cache_dir) == 1
+    decode_binary_cached(capture, poles=21, cache_dir=cache_dir)
+    assert len(decodes) == 3
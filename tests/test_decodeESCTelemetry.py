@@ -0,0 +1,110 @@
+import io
+import logging
+import threading
+import time
+
+import pandas
+import pytest
+
+from AlphaESCTelemetry.alphaTelemetry import AlphaTelemetry
+from AlphaESCTelemetry.captureSession import SessionWriter
+from AlphaESCTelemetry.decodeESCTelemetry import (
+    decode_binary,
+    decode_capture,
+    decode_capture_parallel,
+    follow_binary,
+    iter_binary,
+)
+from AlphaESCTelemetry.telemetryTable import write_csv
+
+from .helpers import make_capture
+
+COLUMNS = "baleNumber,rxThrottle,outputThrottle,rpm,busbarVoltage,busbarCurrent,phaseWireCurrent,mosfetTemp,capacitorTemp,statusCode,fault"
+
+
+def feed_csv(data: bytes) -> str:
+    """CSV rows of the packets of AlphaTelemetry.feed, as written by the original command line"""
+    rows = [
+        ",".join(str(value) for value in frame[1:-1] + (int(frame.fault),)) for frame in AlphaTelemetry(POLES_N=21).feed(data)
+    ]
+    return "".join(line + "\n" for line in [COLUMNS] + rows)
+
+
+def to_csv(df) -> str:
+    f = io.StringIO()
+    write_csv(df, f)
+    return f.getvalue()
+
+
+@pytest.fixture(params=[b"", b"\x01\x02\x16", b"\x16" * 30], ids=["aligned", "junk", "headers"])
+def capture_file(request, tmp_path):
+    """Capture starting with some bytes before the first packet"""
+    data = request.param + make_capture(300, seed=5)
+    path = tmp_path / "capture.bin"
+    path.write_bytes(data)
+    return str(path), data
+
+
+def test_csv_same_as_feed(capture_file):
+    file_path, data = capture_file
+    assert to_csv(decode_capture(file_path)) == feed_csv(data)
+
+
+@pytest.mark.parametrize("shard_size", [64, 100, 1000])
+def test_parallel_csv_same_as_serial(capture_file, shard_size):
+    file_path, _ = capture_file
+    # Shards much smaller than the file, cutting through packets
+    assert to_csv(decode_capture_parallel(file_path, jobs=2, shard_size=shard_size)) == to_csv(decode_capture(file_path))
+
+
+@pytest.mark.parametrize("timed", [False, True])
+def test_follow_csv_same_as_one_shot(capture_file, tmp_path, timed):
+    _, data = capture_file
+    manifest_path = str(tmp_path / "session.json")
+    session = SessionWriter(manifest_path, max_bytes=2000, timed=timed, csv=False)
+
+    def write():
+        # Pieces cutting through packets, in several segments
+        for i in range(0, len(data), 37):
+            session.write(data[i : i + 37])
+            session.flush()
+            time.sleep(0.0005)
+        session.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    followed = pandas.concat(list(follow_binary(manifest_path, interval=0.005)), ignore_index=True)
+    writer.join()
+
+    assert to_csv(followed) == to_csv(decode_capture(manifest_path))
+    if not timed:
+        assert to_csv(followed) == feed_csv(data)
+
+
+def test_bulk_decode_same_as_per_packet(capture_file):
+    file_path, _ = capture_file
+    bulk = decode_binary(file_path, bulk=True)
+    assert len(bulk) > 250
+    # Same rows, values and dtypes
+    pandas.testing.assert_frame_equal(bulk, decode_binary(file_path, bulk=False))
+
+
+@pytest.mark.parametrize(
+    "decode",
+    [
+        lambda file_path: list(iter_binary(file_path, chunk_size=1000)),
+        lambda file_path: decode_capture(file_path, chunk_size=1000),
+        lambda file_path: decode_capture_parallel(file_path, jobs=2, shard_size=1000),
+    ],
+    ids=["iter_binary", "decode_capture", "decode_capture_parallel"],
+)
+def test_checksum_errors_reported_once(tmp_path, caplog, decode):
+    # Corrupted packets spread over many chunks
+    data = b"".join(make_capture(20, seed=seed) for seed in range(50))
+    path = tmp_path / "capture.bin"
+    path.write_bytes(data)
+    with caplog.at_level(logging.DEBUG):
+        decode(str(path))
+    reports = [record for record in caplog.records if record.levelno >= logging.WARNING]
+    assert len(reports) == 1
+    assert "Checksum differs" in reports[0].getMessage()
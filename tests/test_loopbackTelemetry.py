@@ -0,0 +1,24 @@
+import pytest
+
+from AlphaESCTelemetry.alphaTelemetry import AlphaTelemetry
+from AlphaESCTelemetry.loopbackTelemetry import LOOPBACK_TRANSPORTS, loopback
+
+
+@pytest.mark.parametrize("transport", LOOPBACK_TRANSPORTS)
+def test_loopback_decodes_every_packet(tmp_path, capture_bytes, transport):
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(capture_bytes)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    result = loopback(str(capture), transport, out_dir=str(out_dir), block=True)
+
+    frames = AlphaTelemetry(POLES_N=21).feed(capture_bytes)
+    assert result["bytes_sent"] == result["bytes_read"] == len(capture_bytes)
+    assert result["bytes_dropped"] == 0
+    assert result["frames_sent"] == result["frames_decoded"] == len(frames)
+    assert result["latency_median"] <= result["latency_p99"] <= result["latency_max"]
+
+    # CSV output of the engine, without its header and time column
+    rows = [line.split(",", 1)[1] for line in (out_dir / "loopback.csv").read_text().splitlines()[1:]]
+    assert rows == [",".join(map(str, frame[1:-1] + (int(frame.fault),))) for frame in frames]
@@ -0,0 +1,171 @@
+import random
+import time
+
+import pandas
+import pytest
+
+from AlphaESCTelemetry.alphaTelemetry import ALPHA_ESC_BAUD, ALPHA_ESC_PACKET_SIZE, AlphaTelemetry
+from AlphaESCTelemetry.captureFormat import CaptureWriter
+from AlphaESCTelemetry.captureSession import open_capture
+from AlphaESCTelemetry.replay_telemetry import (
+    companion_csv,
+    iter_frames,
+    iter_recorded_frames,
+    replay,
+    replay_log_file,
+    replay_log_files,
+)
+
+from .helpers import make_capture, make_packet
+
+PACKET_TIME = ALPHA_ESC_PACKET_SIZE * 10 / ALPHA_ESC_BAUD
+
+
+class Sink:
+    """Port recording the time of each write"""
+
+    def __init__(self) -> None:
+        self.writes = []
+
+    def write(self, data: bytes) -> None:
+        self.writes.append((time.perf_counter(), data))
+
+    @property
+    def data(self) -> bytes:
+        return b"".join(data for _, data in self.writes)
+
+
+def write_timed(path, count: int = 40, origin: float = 1000.0) -> list:
+    """Container of `count` packets read 4 at a time every 50 ms
+
+    Returns:
+        list: Recorded host time of each packet, when its last byte was received
+    """
+    rng = random.Random(12)
+    packets = [make_packet(bale, rng) for bale in range(count)]
+    with open(path, "wb") as f:
+        writer = CaptureWriter(f, origin=origin)
+        for i in range(0, count, 4):
+            writer.write(b"".join(packets[i : i + 4]), timestamp_ns=(i // 4 + 1) * 50_000_000)
+        writer.flush()
+    return [origin + 0.05 * (i // 4 + 1) - (3 - i % 4) * PACKET_TIME for i in range(count)]
+
+
+def test_writes_on_deadlines_without_drift():
+    frames = [(0.01 * i, bytes([i])) for i in range(30)]
+    sink = Sink()
+    start = time.perf_counter()
+    stats = replay(frames, sink.write, start=start)
+
+    assert sink.data == bytes(range(30))
+    assert stats["frames"] == 30 and stats["bytes"] == 30 and stats["writes"] == len(sink.writes)
+    # Never early, and the sleep errors do not build up
+    for written, data in sink.writes:
+        assert written - start >= 0.01 * data[0]
+    assert sink.writes[-1][0] - start == pytest.approx(0.29, abs=0.05)
+    assert 0 <= stats["lateness_median"] <= stats["lateness_p99"] <= stats["lateness_max"]
+
+
+def test_due_frames_sent_together():
+    sink = Sink()
+    stats = replay([(0.0, bytes(10))] * 10, sink.write, max_batch=25)
+    assert [len(data) for _, data in sink.writes] == [20] * 5
+    assert stats["writes"] == 5
+
+
+def test_frames_cover_the_capture(tmp_path):
+    data = b"\x01\x02" + make_capture(200, seed=10)
+    path = tmp_path / "capture.bin"
+    path.write_bytes(data)
+    frames = list(iter_frames(open_capture(str(path)), block_size=1000))
+    assert b"".join(frame for _, frame in frames) == data
+    assert [offset for offset, _ in frames] == [sum(len(frame) for _, frame in frames[:i]) for i in range(len(frames))]
+    assert frames[0][1] == b"\x01\x02"
+
+
+def test_fixed_rate(tmp_path):
+    data = make_capture(30, seed=11)
+    path = tmp_path / "capture.bin"
+    path.write_bytes(data)
+    sink = Sink()
+    stats = replay_log_file(str(path), sink, rate=0.005)
+
+    assert sink.data == data
+    assert stats["frames"] == len(list(iter_frames(open_capture(str(path)))))
+    assert stats["duration"] >= (stats["frames"] - 1) * 0.005
+    assert stats["rate"] == pytest.approx(200, rel=0.3)
+
+
+@pytest.mark.parametrize("speed", [1.0, 2.0, 0])
+def test_recorded_times_from_container(tmp_path, speed):
+    path = str(tmp_path / "capture.bin")
+    times = write_timed(path)
+    frames = list(iter_recorded_frames(open_capture(path), speed=speed))
+
+    assert len(frames) == len(times)
+    expected = [0.0 if speed == 0 else (t - times[0]) / speed for t in times]
+    assert [frame_time for frame_time, _ in frames] == pytest.approx(expected, abs=1e-6)
+
+
+def test_recorded_times_from_csv(tmp_path):
+    data = make_capture(100, seed=13)
+    path = tmp_path / "capture.bin"
+    path.write_bytes(data)
+    # CSV output of the capture: one row per packet of AlphaTelemetry.feed
+    frames = AlphaTelemetry(POLES_N=21).feed(data)
+    times = [500.0 + 0.0125 * i for i in range(len(frames))]
+    pandas.DataFrame({"time": times, "baleNumber": [frame.baleNumber for frame in frames]}).to_csv(
+        tmp_path / "capture.csv", index=False
+    )
+    assert companion_csv(str(path)) == [str(tmp_path / "capture.csv")]
+
+    recorded = list(iter_recorded_frames(open_capture(str(path)), companion_csv(str(path))))
+    assert b"".join(frame for _, frame in recorded) == data
+    # Each decoded packet at the time of its row, the corrupted ones at the time of the previous one
+    frame_times = sorted(set(frame_time for frame_time, _ in recorded))
+    assert frame_times == pytest.approx([t - times[0] for t in times], abs=1e-9)
+
+
+def test_replay_at_recorded_timing(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    times = write_timed(path)
+    sink = Sink()
+    start = time.perf_counter()
+    stats = replay_log_file(path, sink, speed=2.0)
+
+    assert sink.data == open_capture(path).read(0, len(times) * ALPHA_ESC_PACKET_SIZE)
+    assert stats["frames"] == len(times)
+    assert sink.writes[-1][0] - start >= (times[-1] - times[0]) / 2
+    assert stats["duration"] == pytest.approx((times[-1] - times[0]) / 2, abs=0.05)
+
+
+def test_parallel_replay_keeps_timing_between_ports(tmp_path):
+    # Second motor captured 0.2 s after the first one, with the same clock
+    paths = [str(tmp_path / "M0.bin"), str(tmp_path / "M1.bin")]
+    times = [write_timed(paths[0]), write_timed(paths[1], origin=1000.2)]
+    sinks = [Sink(), Sink()]
+    start = time.perf_counter()
+    results = replay_log_files(paths, sinks, speed=1.0)
+
+    for path, sink, result in zip(paths, sinks, results):
+        assert sink.data == open_capture(path).read(0, open_capture(path).size)
+        assert result["frames"] == 40
+    assert sinks[1].writes[0][0] - sinks[0].writes[0][0] == pytest.approx(0.2, abs=0.03)
+    # Both at once, not one after the other
+    assert time.perf_counter() - start < 2 * (times[0][-1] - times[0][0])
+
+
+def test_parallel_replay_at_fixed_rate(tmp_path):
+    paths = [str(tmp_path / "M{}.bin".format(motor)) for motor in range(3)]
+    data = [make_capture(20, seed=14 + motor) for motor in range(3)]
+    for path, capture in zip(paths, data):
+        with open(path, "wb") as f:
+            f.write(capture)
+    sinks = [Sink() for _ in paths]
+    start = time.perf_counter()
+    results = replay_log_files(paths, sinks, rate=0.01)
+
+    assert [sink.data for sink in sinks] == data
+    assert time.perf_counter() - start < 2 * max(result["duration"] for result in results)
+    with pytest.raises(ValueError):
+        replay_log_files(paths, sinks[:2])
@@ -0,0 +1,77 @@
+import numpy
+import pandas
+import pytest
+
+from AlphaESCTelemetry.alphaTelemetry import PACKET_STRUCT, AlphaTelemetry
+from AlphaESCTelemetry.captureFormat import CaptureWriter
+from AlphaESCTelemetry.decodeESCTelemetry import decode_binary
+from AlphaESCTelemetry.telemetryCodec import (
+    _delta_decode,
+    _delta_encode,
+    encode_capture,
+    load_encoded,
+    varint_decode,
+    varint_encode,
+)
+
+from .helpers import make_capture
+
+# Jumps of the whole width of the fields, both ways, and around the middle of their range
+EDGES_16 = [0, 0xFFFF, 0, 0x8000, 0x7FFF, 0x8000, 1, 0xFFFF, 0xFFFE]
+EDGES_8 = [0, 0xFF, 0, 0x80, 0x7F, 0x80, 1, 0xFF, 0xFE]
+
+
+def edge_packet(value16: int, value8: int) -> bytes:
+    body = PACKET_STRUCT.pack(0x9B, 0x16, 0x01, 0x02, *[value16] * 7, value8, value8, value16, 0, 0)
+    checksum = AlphaTelemetry.calc_checksum(body)
+    return body[:-2] + bytes((checksum & 0xFF, checksum >> 8))
+
+
+def encode(tmp_path, data: bytes, timed: bool = False) -> str:
+    path = tmp_path / "capture.bin"
+    with open(path, "wb") as f:
+        if timed:
+            writer = CaptureWriter(f, origin=1000.0)
+            for i in range(0, len(data), 100):
+                writer.write(data[i : i + 100], timestamp_ns=i * 1_000_000)
+            writer.flush()
+        else:
+            f.write(data)
+    encode_capture(str(path), str(tmp_path / "capture.atc"))
+    return str(path)
+
+
+@pytest.mark.parametrize("timed", [False, True])
+def test_load_same_as_decode(tmp_path, timed):
+    file_path = encode(tmp_path, make_capture(300, seed=8), timed)
+    df = load_encoded(str(tmp_path / "capture.atc"))
+    expected = decode_binary(file_path)
+    assert ("time" in df) == timed
+    if timed:
+        # Times stored to the microsecond
+        assert df.pop("time").to_numpy() == pytest.approx(expected.pop("time").to_numpy(), abs=1e-6)
+    pandas.testing.assert_frame_equal(df, expected)
+
+
+def test_load_edge_values(tmp_path):
+    data = b"".join(edge_packet(value16, value8) for value16, value8 in zip(EDGES_16, EDGES_8))
+    file_path = encode(tmp_path, data)
+    df = load_encoded(str(tmp_path / "capture.atc"))
+    assert df["baleNumber"].tolist() == EDGES_16
+    pandas.testing.assert_frame_equal(df, decode_binary(file_path))
+
+
+def test_varint_edge_values():
+    values = numpy.array([0, 0x7F, 0x80, 0x3FFF, 0x4000, 1 << 63, (1 << 64) - 1], dtype=numpy.uint64)
+    assert varint_decode(varint_encode(values)).tolist() == values.tolist()
+    assert len(varint_encode(values[:2])) == 2
+
+
+def test_zigzag_edge_values():
+    values = numpy.array([0, -1, 1, -(1 << 40), 1 << 40, 0], dtype=numpy.int64)
+    assert _delta_decode(_delta_encode(values)).tolist() == values.tolist()
+    # Wrap of a 16-bit field: one byte per value
+    wrapping = numpy.array([0xFFFE, 0xFFFF, 0, 1], dtype=numpy.int64)
+    encoded = _delta_encode(wrapping, 16)
+    assert _delta_decode(encoded, 16).tolist() == wrapping.tolist()
+    assert len(encoded) == len(wrapping)
@@ -0,0 +1,62 @@
+import numpy
+import pandas
+import pytest
+
+from AlphaESCTelemetry.telemetryMerge import iter_merged
+from AlphaESCTelemetry.telemetryTable import write_table
+
+GAP = slice(40, 60)  # Packets missing from the second capture
+
+
+@pytest.fixture
+def captures(tmp_path):
+    """Base capture (CSV) every 0.1 s, and a capture (npz) 30 ms earlier with a gap"""
+    times = numpy.arange(100) * 0.1
+    base = pandas.DataFrame({"time": times, "baleNumber": numpy.arange(100), "rpm": numpy.full(100, 1000.0)})
+    other = pandas.DataFrame({"time": times - 0.03, "baleNumber": numpy.arange(100) + 500, "rpm": numpy.full(100, 2000.0)})
+    other = other.drop(index=range(GAP.start, GAP.stop))
+    paths = [str(tmp_path / "M0.csv"), str(tmp_path / "M1.npz")]
+    write_table(base, paths[0])
+    write_table(other, paths[1])
+    return paths, times
+
+
+def merge(paths, **kwargs):
+    # Chunks much smaller than the captures
+    return pandas.concat(list(iter_merged(paths, chunk_rows=7, **kwargs)), ignore_index=True)
+
+
+def test_rows_follow_the_base_capture(captures):
+    paths, times = captures
+    merged = merge(paths)
+    assert merged["time"].to_numpy() == pytest.approx(times)
+    assert (merged["baleNumber_M0"] == numpy.arange(100)).all()
+    assert list(merged.columns[:4]) == ["time", "time_M0", "baleNumber_M0", "rpm_M0"]
+
+
+def test_backward_match_within_tolerance(captures):
+    paths, times = captures
+    merged = merge(paths, tolerance=0.05)
+    matched = numpy.ones(100, dtype=bool)
+    matched[GAP] = False
+    assert merged["baleNumber_M1"][matched].to_numpy() == pytest.approx(numpy.arange(100)[matched] + 500)
+    assert merged["time_M1"][matched].to_numpy() == pytest.approx(times[matched] - 0.03)
+    # The last packet before the gap is too old
+    assert merged["baleNumber_M1"][~matched].isna().all()
+    assert merged["rpm_M1"][~matched].isna().all()
+
+
+def test_backward_match_without_tolerance(captures):
+    paths, _ = captures
+    merged = merge(paths)
+    assert (merged["baleNumber_M1"][GAP] == GAP.start - 1 + 500).all()
+
+
+def test_nearest_match(captures):
+    paths, times = captures
+    merged = merge(paths, direction="nearest", tolerance=0.08)
+    # Before the gap, the packet 30 ms earlier is closer than the one 70 ms later
+    assert merged["time_M1"][: GAP.start].to_numpy() == pytest.approx(times[: GAP.start] - 0.03)
+    # In the gap, only the first packet after it is close enough, 70 ms later
+    assert merged["baleNumber_M1"][GAP.stop - 1] == GAP.stop + 500
+    assert merged["baleNumber_M1"][GAP.start : GAP.stop - 1].isna().all()
@@ -0,0 +1,57 @@
+import numpy
+
+from AlphaESCTelemetry.telemetryRing import RECORD_DTYPE, RingPublisher, RingReader
+
+
+def records(start: int, count: int) -> numpy.ndarray:
+    """Packets numbered by their baleNumber"""
+    out = numpy.zeros(count, dtype=RECORD_DTYPE)
+    out["baleNumber"] = numpy.arange(start, start + count)
+    out["time"] = 1000.0 + out["baleNumber"] * 0.0125
+    return out
+
+
+def test_read_new_packets():
+    with RingPublisher(capacity=16) as publisher, RingReader(publisher.name) as reader:
+        assert len(reader.read()) == 0
+        publisher.publish(records(0, 10))
+        assert reader.read()["baleNumber"].tolist() == list(range(10))
+        publisher.publish(records(10, 3))
+        assert reader.read()["baleNumber"].tolist() == [10, 11, 12]
+        assert reader.missed == 0
+
+
+def test_lap_counts_missed_packets():
+    with RingPublisher(capacity=16) as publisher, RingReader(publisher.name) as reader:
+        publisher.publish(records(0, 4))
+        assert len(reader.read()) == 4
+        # 40 more packets, 24 of them overwritten before the next read
+        for start in range(4, 44, 5):
+            publisher.publish(records(start, 5))
+        assert reader.read()["baleNumber"].tolist() == list(range(28, 44))
+        assert reader.missed == 24
+        # A batch larger than the ring
+        publisher.publish(records(44, 20))
+        assert reader.read()["baleNumber"].tolist() == list(range(48, 64))
+        assert reader.missed == 24 + 4
+
+
+def test_latest_keeps_read_position():
+    with RingPublisher(capacity=16) as publisher, RingReader(publisher.name) as reader:
+        publisher.publish(records(0, 10))
+        assert reader.latest(3)["baleNumber"].tolist() == [7, 8, 9]
+        assert reader.latest()["baleNumber"].tolist() == [9]
+        assert reader.read()["baleNumber"].tolist() == list(range(10))
+        assert reader.missed == 0
+
+
+def test_oldest_and_follow_until_closed():
+    publisher = RingPublisher(capacity=16)
+    publisher.publish(records(0, 20))
+    with RingReader(publisher.name, oldest=True) as reader:
+        publisher.publish(records(20, 2))
+        publisher.close()
+        followed = numpy.concatenate(list(reader.follow(interval=0.001)))
+        assert followed["baleNumber"].tolist() == list(range(6, 22))
+        assert reader.missed == 2
+        assert reader.closed
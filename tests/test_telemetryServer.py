@@ -0,0 +1,79 @@
+import socket
+import time
+
+import numpy
+import pytest
+
+from AlphaESCTelemetry.telemetryServer import WIRE_DTYPE, TelemetryClient, TelemetryServer, parse_address
+
+
+def records(start: int, count: int) -> numpy.ndarray:
+    """Packets numbered by their time"""
+    out = numpy.zeros(count, dtype=WIRE_DTYPE)
+    out["time"] = numpy.arange(start, start + count)
+    return out
+
+
+def connect(server: TelemetryServer, address: str) -> TelemetryClient:
+    client = TelemetryClient(address, timeout=5)
+    deadline = time.monotonic() + 5
+    while server.stats["subscribers"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return client
+
+
+@pytest.mark.parametrize(
+    "address, family, expected",
+    [
+        ("localhost:7000", socket.AF_INET, ("localhost", 7000)),
+        ("127.0.0.1:7000", socket.AF_INET, ("127.0.0.1", 7000)),
+        ("127.1.2.3:7000", socket.AF_INET, ("127.1.2.3", 7000)),
+        ("[::1]:7000", socket.AF_INET6, ("::1", 7000)),
+        ("/tmp/alpha.sock", socket.AF_UNIX, "/tmp/alpha.sock"),
+    ],
+)
+def test_local_addresses(address, family, expected):
+    assert parse_address(address) == (family, expected)
+
+
+@pytest.mark.parametrize("address", ["0.0.0.0:7000", "192.168.1.10:7000", "[::]:7000", "example.com:7000"])
+def test_other_hosts_rejected(address):
+    with pytest.raises(ValueError, match="loopback"):
+        TelemetryServer(address)
+
+
+def test_subscriber_receives_every_batch(tmp_path):
+    address = str(tmp_path / "alpha.sock")
+    with TelemetryServer(address) as server, connect(server, address) as client:
+        for start in range(0, 100, 10):
+            server.publish(records(start, 10))
+        received = [client.recv() for _ in range(10)]
+        server.close()
+        assert client.recv() is None
+
+    assert numpy.concatenate(received)["time"].tolist() == list(range(100))
+    assert client.missed == 0
+
+
+def test_slow_subscriber_drops_oldest_batches(tmp_path):
+    address = str(tmp_path / "alpha.sock")
+    published = 4000 * 100
+    with TelemetryServer(address, max_buffer=1 << 16) as server, connect(server, address) as client:
+        # Far more than the socket buffers and the queue, while the subscriber does not read
+        for start in range(0, published, 100):
+            server.publish(records(start, 100))
+        received = []
+        while client.next < published:
+            received.append(client.recv())
+        dropped = server.stats["packets_dropped"]
+        server.close()
+        assert client.recv() is None
+
+    assert dropped == [client.missed]
+    assert client.missed > 0
+    assert sum(len(batch) for batch in received) + client.missed == published
+    # Whole batches dropped, the newest ones kept
+    firsts = [int(batch["time"][0]) for batch in received]
+    assert all(len(batch) == 100 and first % 100 == 0 for batch, first in zip(received, firsts))
+    assert firsts == sorted(firsts)
+    assert firsts[-1] == published - 100
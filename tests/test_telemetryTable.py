@@ -0,0 +1,91 @@
+import io
+
+import numpy
+import pandas
+import pytest
+
+from AlphaESCTelemetry import telemetryTable
+from AlphaESCTelemetry.alphaTelemetry import AlphaTelemetry
+from AlphaESCTelemetry.decodeESCTelemetry import decode_binary
+from AlphaESCTelemetry.telemetryTable import (
+    TABLE_DTYPES,
+    TableRecorder,
+    csv_table,
+    iter_table,
+    read_table,
+    resolve_format,
+    to_table,
+    write_csv,
+    write_table,
+)
+
+from .helpers import make_capture
+
+
+def test_csv_temperatures_as_written_by_the_capture():
+    df = pandas.DataFrame(
+        {
+            "initialValue": [0x0201] * 3,
+            "mosfetTemp": numpy.array([65.0, 54.5, -2.0], dtype=numpy.float32),
+            "capacitorTemp": [130.0, 0.5, numpy.nan],
+            "fault": [False, True, False],
+        }
+    )
+    f = io.StringIO()
+    write_csv(df, f)
+    assert f.getvalue() == "mosfetTemp,capacitorTemp,fault\n65,130,0\n54.5,0.5,1\n-2,,0\n"
+
+
+def test_csv_integer_temperatures_unchanged():
+    df = pandas.DataFrame({"mosfetTemp": numpy.array([65, 54], dtype=numpy.int16)})
+    assert csv_table(df)["mosfetTemp"].dtype == numpy.int16
+
+
+def test_npz_read_in_chunks(tmp_path):
+    df = pandas.DataFrame({"time": numpy.arange(50) * 0.1, "baleNumber": numpy.arange(50), "mosfetTemp": numpy.arange(50) / 2})
+    path = str(tmp_path / "table.npz")
+    write_table(df, path)
+    chunks = list(iter_table(path, chunk_rows=7))
+    assert [len(chunk) for chunk in chunks] == [7] * 7 + [1]
+    pandas.testing.assert_frame_equal(pandas.concat(chunks, ignore_index=True), read_table(path))
+
+
+@pytest.mark.parametrize("format", ["npz", "parquet", "feather"])
+def test_typed_columns_round_trip(tmp_path, capture_bytes, format):
+    if format != "npz":
+        pytest.importorskip("pyarrow")
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(capture_bytes)
+    df = decode_binary(str(capture))
+    path = str(tmp_path / "table.{}".format(format))
+    write_table(df, path)
+
+    table = read_table(path)
+    assert "initialValue" not in table
+    assert dict(table.dtypes) == {key: TABLE_DTYPES[key] for key in table.columns}
+    pandas.testing.assert_frame_equal(table, to_table(df))
+
+
+def test_npz_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(telemetryTable, "pyarrow", None)
+    assert resolve_format("parquet") == "npz"
+    assert resolve_format("csv") == "csv"
+    with pytest.raises(ValueError):
+        resolve_format("xlsx")
+
+
+def test_recorder_same_as_decode(tmp_path):
+    data = make_capture(200, seed=9)
+    frames = AlphaTelemetry(POLES_N=21).feed(data)
+    times = [1000.0 + 0.0125 * i for i in range(len(frames))]
+    recorder = TableRecorder()
+    # Listener calls of several packets
+    for i in range(0, len(frames), 7):
+        recorder(times[i : i + 7], frames[i : i + 7])
+    path = str(tmp_path / "table.npz")
+    recorder.save(path)
+
+    table = read_table(path)
+    assert table["time"].tolist() == times
+    expected = to_table(pandas.DataFrame(frames, columns=list(frames[0]._fields)))
+    pandas.testing.assert_frame_equal(table.drop(columns="time"), expected)